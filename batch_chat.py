@@ -0,0 +1,248 @@
+import contextlib
+import io
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from model_backends import parse_response
+from prompts import Prompts
+from response_cache import Response_Cache
+from result_renderer import Result_Renderer
+
+
+class Rate_Limiter:
+    """Space calls at least 60 / requests_per_minute seconds apart, across threads"""
+
+    def __init__(self, requests_per_minute: float) -> None:
+        self._interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self) -> float:
+        """Block until the caller's turn, returns the seconds waited"""
+        with self._lock:
+            now = time.monotonic()
+            turn = max(now, self._next)
+            self._next = turn + self._interval
+        if turn > now:
+            time.sleep(turn - now)
+        return turn - now
+
+
+class Batch_Chat:
+    """
+    Answer a list of questions in one process.
+
+    The schema description is pruned to each question's tables up front,
+    as chat-with-os does, and cached answers are looked up with it. The
+    other questions go to the model on a pool of
+    `concurrency` threads, rate limited to `requests_per_minute`. Each
+    worker then runs its SQL on a read-only Query_Guard borrowed from a
+    pool of at most `concurrency` connections. Answers are written in
+    input order as soon as they and every answer before them are ready,
+    as Markdown sections or one JSON object per line, with their timings
+    and prompt sizes.
+    """
+
+    OUTPUTS = ("markdown", "jsonl")
+
+    def __init__(
+        self,
+        model,
+        schema_cache,
+        guard_factory,
+        response_cache=None,
+        concurrency: int = 4,
+        requests_per_minute: float = 60.0,
+        max_rows: int = 100,
+        time_budget: float = 10.0,
+        output: str = "markdown",
+        profiler=None,
+    ) -> None:
+        if output not in self.OUTPUTS:
+            raise ValueError(f"Output must be one of {', '.join(self.OUTPUTS)}")
+        self._model = model
+        self._schema_cache = schema_cache
+        self._full_schema = None
+        self._selector = None
+        self._guard_factory = guard_factory
+        self._guards = queue.LifoQueue()
+        self._response_cache = response_cache
+        self._concurrency = max(1, concurrency)
+        self._rate_limiter = Rate_Limiter(requests_per_minute)
+        self._max_rows = max_rows
+        self._time_budget = time_budget
+        self._output = output
+        self._profiler = profiler
+
+    def _borrow_guard(self):
+        try:
+            return self._guards.get_nowait()
+        except queue.Empty:
+            # At most one guard per worker is ever built
+            return self._guard_factory()
+
+    def _ask(self, question: str, schemas: str, stage: str, answer, timing: dict):
+        prompt = Prompts.DB_PROMPT.format(schemas=schemas, user_query=question)
+        answer.setdefault("prompt_chars", {})[stage] = len(prompt)
+        waited = self._rate_limiter.wait()
+        timing["rate_limit"] = timing.get("rate_limit", 0.0) + waited * 1000
+        start = time.perf_counter()
+        response_text = self._model.generate(prompt, question)
+        timing[stage] = (time.perf_counter() - start) * 1000
+        return parse_response(response_text), response_text
+
+    def _generate(self, question: str, selection, answer: dict, timing: dict):
+        schemas, tables = selection
+        json_data, response_text = self._ask(question, schemas, "model", answer, timing)
+        if (
+            json_data is not None
+            and tables is not None
+            and self._selector.referenced(json_data.get("sql_query", "")) - set(tables)
+        ):
+            # A table the pruned schema left out, ask again with all of them
+            json_data, response_text = self._ask(
+                question, self._full_schema, "model_full_schema", answer, timing
+            )
+        return json_data, response_text
+
+    def _query(self, json_data: dict, answer: dict, timing: dict):
+        start = time.perf_counter()
+        guard = self._borrow_guard()
+        try:
+            cursor, answer["warnings"] = guard.execute(
+                json_data["sql_query"],
+                limit=self._max_rows + 1 if self._max_rows else 0,
+                time_budget=self._time_budget,
+            )
+            headers = Result_Renderer.headers(cursor, json_data.get("column_headers"))
+            if self._output == "markdown":
+                stream = io.StringIO()
+                renderer = Result_Renderer(
+                    output="table",
+                    page_size=self._max_rows or 1000,
+                    max_rows=self._max_rows,
+                    stream=stream,
+                    truncation_note=False,
+                )
+                renderer.render(cursor, headers)
+                answer["table"] = stream.getvalue()
+                answer["truncated"] = renderer.truncated
+            else:
+                rows = []
+                while not self._max_rows or len(rows) <= self._max_rows:
+                    page = cursor.fetchmany(1000)
+                    if not page:
+                        break
+                    rows.extend(page)
+                answer["truncated"] = bool(self._max_rows) and len(rows) > self._max_rows
+                answer["columns"] = headers
+                answer["rows"] = [list(row) for row in rows[: self._max_rows or None]]
+            if cursor.interrupted:
+                answer["interrupted"] = guard.exceeded
+        finally:
+            self._guards.put(guard)
+        timing["sql"] = (time.perf_counter() - start) * 1000
+
+    def _answer(self, question: str, selection, cached):
+        """Runs on a worker thread, returns the answer and a response to cache"""
+        start = time.perf_counter()
+        answer = {"question": question, "cached": cached is not None}
+        timing = {}
+        to_cache = None
+        try:
+            json_data, response_text = (cached, None)
+            if cached is None:
+                json_data, response_text = self._generate(
+                    question, selection, answer, timing
+                )
+                if json_data is not None and "sql_query" in json_data:
+                    to_cache = json_data
+            if json_data is None:
+                answer["text"] = response_text
+            else:
+                answer["sql"] = json_data["sql_query"]
+                self._query(json_data, answer, timing)
+        except Exception as e:
+            answer["error"] = f"{type(e).__name__}: {e}"
+        timing["total"] = (time.perf_counter() - start) * 1000
+        answer["timing_ms"] = {stage: round(ms, 2) for stage, ms in timing.items()}
+        return answer, to_cache
+
+    def _write_markdown(self, stream, number: int, answer: dict):
+        parts = [f"## {number}. {answer['question']}\n"]
+        if "error" in answer:
+            parts.append(f"Failed: {answer['error']}\n")
+        elif "text" in answer:
+            parts.append(f"{answer['text'].strip()}\n")
+        else:
+            parts.append(f"```sql\n{answer['sql']}\n```\n\n{answer['table']}")
+            if answer["truncated"]:
+                parts.append(f"\nOnly the first {self._max_rows} rows are shown\n")
+            if answer.get("interrupted"):
+                parts.append(f"\nStopped after {answer['interrupted']}\n")
+        timing = ", ".join(
+            f"{stage} {ms:.1f} ms" for stage, ms in answer["timing_ms"].items()
+        )
+        cached = ", cached" if answer["cached"] else ""
+        parts.append(f"\n_{timing}{cached}_\n\n")
+        stream.write("".join(parts))
+
+    def run(self, questions, stream) -> dict:
+        """Answer every question, writing the answers to `stream` in order"""
+        start = time.perf_counter()
+        schema_span = (
+            self._profiler.span("schema")
+            if self._profiler is not None
+            else contextlib.nullcontext({})
+        )
+        # The schema and its index are read on this thread, workers only read them
+        with schema_span as measured:
+            self._full_schema = self._schema_cache.describe()
+            self._selector = self._schema_cache.selector()
+            selections = [
+                self._schema_cache.select(question) for question in questions
+            ]
+            # Characters of the pruned descriptions, summed over the questions
+            measured["size"] = sum(len(schemas) for schemas, _ in selections)
+        schema_hashes = [
+            Response_Cache.schema_hash(schemas) for schemas, _ in selections
+        ]
+        cached = [
+            self._response_cache.get(question, schema_hash)
+            if self._response_cache is not None
+            else None
+            for question, schema_hash in zip(questions, schema_hashes)
+        ]
+        summary = {"questions": len(questions), "cached": 0, "failed": 0}
+        with ThreadPoolExecutor(
+            max_workers=self._concurrency, thread_name_prefix="chat-batch"
+        ) as pool:
+            futures = [
+                pool.submit(self._answer, question, selection, response)
+                for question, selection, response in zip(questions, selections, cached)
+            ]
+            for number, (future, schema_hash) in enumerate(
+                zip(futures, schema_hashes), 1
+            ):
+                answer, to_cache = future.result()
+                if to_cache is not None and self._response_cache is not None:
+                    self._response_cache.put(answer["question"], schema_hash, to_cache)
+                summary["cached"] += answer["cached"]
+                summary["failed"] += "error" in answer
+                if self._profiler is not None:
+                    prompt_chars = answer.get("prompt_chars", {})
+                    for stage, ms in answer["timing_ms"].items():
+                        if stage in ("model", "model_full_schema", "sql"):
+                            self._profiler.record(stage, ms, size=prompt_chars.get(stage))
+                    self._profiler.record("chat", answer["timing_ms"]["total"])
+                if self._output == "jsonl":
+                    stream.write(json.dumps(answer, default=str) + "\n")
+                else:
+                    self._write_markdown(stream, number, answer)
+                stream.flush()
+        while not self._guards.empty():
+            self._guards.get_nowait().close()
+        summary["seconds"] = round(time.perf_counter() - start, 3)
+        return summary
@@ -0,0 +1,159 @@
+"""
+In-memory stand-in for the parts of psutil the collector uses.
+
+Pass an instance as `psutil_module` to Information_Collector to simulate
+a host of any size, e.g. 10k processes, 64 partitions and 256 cores.
+Readings are pseudo-random but seeded, so two runs collect the same data.
+"""
+import contextlib
+import random
+from collections import namedtuple
+
+_Freq = namedtuple("_Freq", ["current", "min", "max"])
+_Memory = namedtuple("_Memory", ["total", "available", "percent", "used", "free"])
+_Swap = namedtuple("_Swap", ["total", "used", "free", "percent"])
+_Partition = namedtuple("_Partition", ["device", "mountpoint", "fstype", "opts"])
+_Usage = namedtuple("_Usage", ["total", "used", "free", "percent"])
+_Disk_IO = namedtuple("_Disk_IO", ["read_bytes", "write_bytes"])
+_Net_IO = namedtuple("_Net_IO", ["bytes_sent", "bytes_recv"])
+_Memory_Info = namedtuple("_Memory_Info", ["rss", "vms"])
+_Open_File = namedtuple("_Open_File", ["path", "fd"])
+
+GIB = 1024**3
+
+
+class Error(Exception):
+    pass
+
+
+class NoSuchProcess(Error):
+    pass
+
+
+class AccessDenied(Error):
+    pass
+
+
+class ZombieProcess(NoSuchProcess):
+    pass
+
+
+class Fake_Process:
+    def __init__(self, fake, pid: int, name: str, rss: int, open_files) -> None:
+        self._fake = fake
+        self.pid = pid
+        self._name = name
+        self._create_time = fake.BOOT_TIME + pid
+        self._rss = rss
+        self._open_files = open_files
+
+    @contextlib.contextmanager
+    def oneshot(self):
+        yield
+
+    def name(self) -> str:
+        return self._name
+
+    def create_time(self) -> float:
+        return self._create_time
+
+    def cpu_percent(self, interval=None) -> float:
+        return round(self._fake.random.expovariate(2.0), 1)
+
+    def memory_info(self):
+        return _Memory_Info(self._rss, self._rss * 4)
+
+    def memory_percent(self) -> float:
+        return self._rss / self._fake.TOTAL_MEMORY * 100
+
+    def open_files(self):
+        return self._open_files
+
+
+class Fake_Psutil:
+    """A fake host with `processes` processes, `partitions` mounts and `cores` cores"""
+
+    NoSuchProcess = NoSuchProcess
+    AccessDenied = AccessDenied
+    ZombieProcess = ZombieProcess
+
+    TOTAL_MEMORY = 512 * GIB
+    TOTAL_SWAP = 64 * GIB
+    BOOT_TIME = 1700000000.0
+
+    def __init__(
+        self,
+        processes: int = 10000,
+        partitions: int = 64,
+        cores: int = 256,
+        seed: int = 0,
+    ) -> None:
+        self.random = random.Random(seed)
+        self._cores = cores
+        self._partitions = [
+            _Partition(f"/dev/fake{i}", f"/mnt/fake{i}", "ext4", "rw")
+            for i in range(partitions)
+        ]
+        # A few hundred distinct names and a shared pool of open files, like a
+        # real host where most processes are workers of the same programs
+        names = [f"worker-{i}" for i in range(max(1, processes // 25))]
+        files = [_Open_File(f"/nonexistent/fake/file{i}", i) for i in range(1000)]
+        self._processes = [
+            Fake_Process(
+                self,
+                pid + 1,
+                self.random.choice(names),
+                self.random.randint(1, 512) * 1024**2,
+                self.random.sample(files, self.random.randint(0, 3)),
+            )
+            for pid in range(processes)
+        ]
+        self._io_bytes = 0
+
+    def cpu_count(self, logical: bool = True) -> int:
+        return self._cores if logical else self._cores // 2
+
+    def cpu_freq(self):
+        return _Freq(self.random.uniform(1800.0, 3500.0), 800.0, 3500.0)
+
+    def cpu_percent(self, interval=None, percpu: bool = False):
+        if percpu:
+            return [round(self.random.uniform(0, 100), 1) for _ in range(self._cores)]
+        return round(self.random.uniform(0, 100), 1)
+
+    def virtual_memory(self):
+        used = self.random.randint(64, 448) * GIB
+        return _Memory(
+            self.TOTAL_MEMORY,
+            self.TOTAL_MEMORY - used,
+            used / self.TOTAL_MEMORY * 100,
+            used,
+            self.TOTAL_MEMORY - used,
+        )
+
+    def swap_memory(self):
+        used = self.random.randint(0, 16) * GIB
+        return _Swap(
+            self.TOTAL_SWAP, used, self.TOTAL_SWAP - used, used / self.TOTAL_SWAP * 100
+        )
+
+    def disk_partitions(self, all: bool = False):
+        return self._partitions
+
+    def disk_usage(self, path: str):
+        total = 2048 * GIB
+        used = self.random.randint(1, 2047) * GIB
+        return _Usage(total, used, total - used, used / total * 100)
+
+    def disk_io_counters(self, perdisk: bool = False):
+        self._io_bytes += self.random.randint(0, 10**8)
+        return _Disk_IO(self._io_bytes, self._io_bytes // 2)
+
+    def net_io_counters(self, pernic: bool = False):
+        return _Net_IO(self._io_bytes // 3, self._io_bytes // 4)
+
+    def boot_time(self) -> float:
+        return self.BOOT_TIME
+
+    def process_iter(self, attrs=None):
+        return iter(self._processes)
@@ -0,0 +1,118 @@
+"""
+Fleet ingestion benchmark with local directories standing in for hosts.
+
+Each simulated host gets its own directory with a Fake_Psutil collector,
+its own host facts (and so its own Sys_ID), local database and spool.
+The spools are then ingested into one fleet database twice, the second
+run must find nothing new, and the fleet's task_manager is checked
+against the hosts' own.
+
+    python -m benchmarks.fleet --hosts 20 --snapshots 30 --processes 1000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.fake_psutil import Fake_Psutil
+from benchmarks.suite import _git_commit
+from host_facts import Host_Facts
+from ingester import Ingester
+from snapshot_writer import Snapshot_Writer
+from spool import Spool_Writer, segments
+from sql_lite import Information_Collector
+
+
+def simulate_host(host_dir: str, host: int, args) -> str:
+    """Collect `args.snapshots` snapshots of one fake host, returns its spool"""
+    os.makedirs(host_dir, exist_ok=True)
+    fake = Fake_Psutil(args.processes, args.partitions, args.cores, seed=host)
+    facts_path = os.path.join(host_dir, "host_facts.json")
+    facts = Host_Facts(facts_path, fake).load()
+    facts.update(sys_id=f"fake-{host:04d}", node_name=f"node-{host:04d}")
+    with open(facts_path, "w") as facts_file:
+        json.dump(facts, facts_file)
+    collector = Information_Collector(
+        resident=True, psutil_module=fake, facts_path=facts_path
+    )
+    spool_dir = os.path.join(host_dir, "spool")
+    with Snapshot_Writer(
+        os.path.join(host_dir, "os_data.db"),
+        core_count=fake.cpu_count(),
+        spool=Spool_Writer(spool_dir),
+    ) as writer:
+        collector.load_process_state(writer.connection())
+        for _ in range(args.snapshots):
+            writer.write(collector.collect())
+    return spool_dir
+
+
+def _task_manager_rows(db_path: str) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        (rows,) = conn.execute("SELECT count(*) FROM task_manager").fetchone()
+    finally:
+        conn.close()
+    return rows
+
+
+def run(args, tmp_dir: str) -> dict:
+    host_dirs = [os.path.join(tmp_dir, f"host-{host}") for host in range(args.hosts)]
+    start = time.perf_counter()
+    spools = [
+        simulate_host(host_dir, host, args) for host, host_dir in enumerate(host_dirs)
+    ]
+    collected = time.perf_counter() - start
+    spool_bytes = sum(
+        os.path.getsize(segment) for spool_dir in spools for segment in segments(spool_dir)
+    )
+    fleet_db = os.path.join(tmp_dir, "fleet.db")
+    runs = []
+    for _ in range(2):
+        with Ingester(fleet_db, batch_records=args.batch_records) as ingester:
+            start = time.perf_counter()
+            stats = ingester.ingest(spools)
+            runs.append({**stats, "seconds": round(time.perf_counter() - start, 3)})
+    first, second = runs
+    snapshots = args.hosts * args.snapshots
+    return {
+        "commit": _git_commit(),
+        "hosts": args.hosts,
+        "snapshots_per_host": args.snapshots,
+        "collect_s": round(collected, 3),
+        "spool_bytes_per_snapshot": spool_bytes // max(1, snapshots),
+        "ingest": first,
+        "ingest_rows_per_sec": round(first["rows"] / max(first["seconds"], 1e-9), 1),
+        "reingest": second,
+        "consistent": second["ingested"] == 0
+        and _task_manager_rows(fleet_db)
+        == sum(
+            _task_manager_rows(os.path.join(host_dir, "os_data.db"))
+            for host_dir in host_dirs
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--snapshots", type=int, default=30, help="per host")
+    parser.add_argument("--processes", type=int, default=1000)
+    parser.add_argument("--partitions", type=int, default=8)
+    parser.add_argument("--cores", type=int, default=32)
+    parser.add_argument("--batch-records", type=int, default=Ingester.BATCH_RECORDS)
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result = run(args, tmp_dir)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
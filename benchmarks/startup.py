@@ -0,0 +1,102 @@
+"""
+Startup-time guard for the scheduling commands of main.py.
+
+Each command is started in a fresh interpreter and timed against the floor
+of `python -c "import typer"`, which every command pays whatever it does.
+The run fails when a command's median overhead above that floor exceeds
+the budget, or when importing main.py loads any heavy module.
+
+    python -m benchmarks.startup --runs 10 --budget-ms 100
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = [
+    ["schedule-cron-job", "--help"],
+    ["reschedule-cron-job", "--help"],
+    ["remove-cron-job", "--help"],
+    ["collector-daemon-status"],
+]
+
+# Modules only chat_with_os or the collector may load
+HEAVY_MODULES = [
+    "google.generativeai",
+    "psutil",
+    "cpuinfo",
+    "dotenv",
+]
+
+
+def _time_run(args) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=False,
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def _median_ms(args, runs: int) -> float:
+    return statistics.median(_time_run(args) for _ in range(runs))
+
+
+def heavy_imports():
+    """Heavy modules left in sys.modules after importing main.py"""
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import json, sys, main; "
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))",
+        ],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs: int, budget_ms: float) -> dict:
+    floor = _median_ms(["-c", "import typer"], runs)
+    commands = {}
+    for command in COMMANDS:
+        median = _median_ms(["main.py", *command], runs)
+        commands[" ".join(command)] = {
+            "median_ms": round(median, 1),
+            "overhead_ms": round(median - floor, 1),
+        }
+    loaded = heavy_imports()
+    return {
+        "runs": runs,
+        "budget_ms": budget_ms,
+        "typer_floor_ms": round(floor, 1),
+        "commands": commands,
+        "heavy_imports": loaded,
+        "passed": not loaded
+        and all(result["overhead_ms"] <= budget_ms for result in commands.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    args = parser.parse_args()
+    result = run(args.runs, args.budget_ms)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Collector and chat pipeline benchmark on a simulated host.
+
+The collector runs against Fake_Psutil (10k processes, 64 partitions and
+256 cores by default) and writes to a scratch database, which `--history`
+grows with extra snapshots before the chat pipeline is timed against it
+with the stub model. Snapshots are spaced `--interval` seconds apart on a
+simulated clock ending now, so history questions cover a realistic window. Pass `--db` to keep the database and reuse it, e.g.
+to build a multi-GB history once. Results are printed as JSON, tagged
+with the git commit, so runs can be diffed between commits.
+
+    python -m benchmarks.suite --snapshots 20 --history 1000 --queries 50
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import subprocess
+import tempfile
+import time
+
+from benchmarks.fake_psutil import Fake_Psutil
+from model_backends import Stub_Backend
+from prompts import Prompts
+from query_guard import Query_Guard
+from result_renderer import Result_Renderer
+from schema_cache import Schema_Cache
+from snapshot_writer import Snapshot_Writer
+from sql_lite import Information_Collector
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One question per canned answer of Stub_Backend
+QUESTIONS = [
+    "top processes by memory",
+    "busiest cores",
+    "current cpu usage",
+    "disk usage per mount point",
+    "top running tasks",
+    # History questions, time-bounded reads of the raw tables
+    "average cpu per process over the last hour",
+    "memory trend",
+    "cpu history of the busiest process",
+]
+
+
+def percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def _summary_ms(seconds) -> dict:
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 2),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 2),
+    }
+
+
+def _db_bytes(conn, db_path: str) -> int:
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return sum(
+        os.path.getsize(path)
+        for path in (db_path, f"{db_path}-wal")
+        if os.path.exists(path)
+    )
+
+
+def _git_commit():
+    with contextlib.suppress(OSError, subprocess.CalledProcessError):
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    return None
+
+
+class _Clock:
+    """Epoch seconds stepping `interval` per call, the last call landing on now"""
+
+    def __init__(self, calls: int, interval: float) -> None:
+        self._interval = interval
+        self._now = time.time() - calls * interval
+
+    def __call__(self) -> float:
+        self._now += self._interval
+        return self._now
+
+
+def bench_collector(
+    db_path: str, fake, snapshots: int, history: int, interval: float
+) -> dict:
+    # The fake host's facts must not land in the real host's cache
+    start = time.perf_counter()
+    collector = Information_Collector(
+        resident=True,
+        psutil_module=fake,
+        facts_path=f"{db_path}.host.json",
+        clock=_Clock(1 + snapshots + history, interval),
+    )
+    startup = time.perf_counter() - start
+    with Snapshot_Writer(db_path, core_count=fake.cpu_count()) as writer:
+        conn = writer.connection()
+        start = time.perf_counter()
+        writer.write(collector.collect())
+        first_collect = time.perf_counter() - start
+        size_before = _db_bytes(conn, db_path)
+        collect_times, write_times, rows = [], [], 0
+        for _ in range(snapshots):
+            start = time.perf_counter()
+            snapshot = collector.collect()
+            collected = time.perf_counter()
+            rows += writer.write(snapshot)
+            collect_times.append(collected - start)
+            write_times.append(time.perf_counter() - collected)
+        size_after = _db_bytes(conn, db_path)
+        for _ in range(history):
+            writer.write(collector.collect())
+        size_total = _db_bytes(conn, db_path)
+    return {
+        "startup_s": round(startup, 3),
+        "first_collect_s": round(first_collect, 3),
+        "collect": _summary_ms(collect_times),
+        "write": _summary_ms(write_times),
+        "rows_per_snapshot": rows // max(1, snapshots),
+        "rows_per_sec": round(rows / (sum(collect_times) + sum(write_times)), 1),
+        "db_bytes_per_snapshot": (size_after - size_before) // max(1, snapshots),
+        "db_bytes": size_total,
+    }
+
+
+class _Rows:
+    """Already fetched rows behind the cursor interface Result_Renderer reads"""
+
+    def __init__(self, description, rows) -> None:
+        self.description = description
+        self._rows = iter(rows)
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size: int):
+        return [row for _, row in zip(range(size), self._rows)]
+
+
+def bench_chat(db_path: str, queries: int, max_rows: int) -> dict:
+    schema_cache = Schema_Cache(db_path, cache_path=f"{db_path}.schema.json")
+    with contextlib.suppress(OSError):
+        os.remove(f"{db_path}.schema.json")
+    model = Stub_Backend()
+    guard = Query_Guard(db_path, time_budget=0)
+    start = time.perf_counter()
+    schema_cache.describe()
+    schema_cold = time.perf_counter() - start
+    stages = {"schema": [], "model": [], "sql": [], "render": [], "total": []}
+    per_question = {}
+    full_prompt = len(
+        Prompts.DB_PROMPT.format(schemas=schema_cache.describe(), user_query="")
+    )
+    prompt_chars = {}
+    for question in QUESTIONS:
+        totals = []
+        for _ in range(queries):
+            start = time.perf_counter()
+            schemas, tables = schema_cache.select(question)
+            described = time.perf_counter()
+            json_data = json.loads(
+                model.generate(
+                    Prompts.DB_PROMPT.format(schemas=schemas, user_query=question),
+                    question,
+                )
+            )
+            generated = time.perf_counter()
+            cursor, _ = guard.execute(json_data["sql_query"], limit=max_rows + 1)
+            rows = _Rows(cursor.description, cursor.fetchmany(max_rows + 1))
+            queried = time.perf_counter()
+            Result_Renderer(max_rows=max_rows, stream=io.StringIO()).render(
+                rows, json_data["column_headers"]
+            )
+            rendered = time.perf_counter()
+            stages["schema"].append(described - start)
+            stages["model"].append(generated - described)
+            stages["sql"].append(queried - generated)
+            stages["render"].append(rendered - queried)
+            totals.append(rendered - start)
+        stages["total"].extend(totals)
+        per_question[question] = _summary_ms(totals)
+        prompt_chars[question] = len(
+            Prompts.DB_PROMPT.format(schemas=schemas, user_query=question)
+        )
+        if schema_cache.needs_full_schema(json_data["sql_query"], tables):
+            prompt_chars[question] = f"{prompt_chars[question]} (fell back to full)"
+    guard.close()
+    return {
+        "schema_cold_ms": round(schema_cold * 1000, 2),
+        "stages": {stage: _summary_ms(times) for stage, times in stages.items()},
+        "questions": per_question,
+        "prompt_chars": {"full_schema": full_prompt, **prompt_chars},
+    }
+
+
+def run(args, db_path: str) -> dict:
+    fake = Fake_Psutil(args.processes, args.partitions, args.cores, seed=args.seed)
+    return {
+        "commit": _git_commit(),
+        "host": {
+            "processes": args.processes,
+            "partitions": args.partitions,
+            "cores": args.cores,
+        },
+        "collector": bench_collector(
+            db_path, fake, args.snapshots, args.history, args.interval
+        ),
+        "chat": bench_chat(db_path, args.queries, args.max_rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--processes", type=int, default=10000)
+    parser.add_argument("--partitions", type=int, default=64)
+    parser.add_argument("--cores", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--snapshots", type=int, default=20, help="timed snapshots")
+    parser.add_argument(
+        "--history", type=int, default=0, help="untimed snapshots added before chat"
+    )
+    parser.add_argument(
+        "--interval", type=float, default=10.0, help="simulated seconds between snapshots"
+    )
+    parser.add_argument("--queries", type=int, default=50, help="runs per question")
+    parser.add_argument("--max-rows", type=int, default=1000)
+    parser.add_argument("--db", help="database to create or grow, kept afterwards")
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result = run(args, args.db or os.path.join(tmp_dir, "bench.db"))
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import contextlib
+import sqlite3
+import sys
+import threading
+import time
+
+
+class Snapshot_Prefetcher(threading.Thread):
+    """
+    Background thread of a chat session. It first warms what the first
+    question needs (the model client, the schema description and the
+    query connection) and then polls the newest snapshot of every host
+    every `interval` seconds on its own read-only connection.
+    """
+
+    def __init__(self, db_path: str, interval: float = 2.0, warm_up=None) -> None:
+        super().__init__(name="snapshot-prefetch", daemon=True)
+        self._db_path = db_path
+        self._interval = interval
+        self._warm_up = warm_up
+        self._stop = threading.Event()
+        self.warm = threading.Event()
+        self.warm_up_error = None
+        # Sys_ID => (Snapshot_ID, Extracted_Time) of its newest snapshot
+        self.latest = {}
+
+    def _poll(self, conn):
+        hosts = [row[0] for row in conn.execute("SELECT Mac_ID FROM system_information")]
+        latest = {}
+        for host in hosts:
+            # idx_snapshots_sys_time, one index probe per host
+            row = conn.execute(
+                """SELECT Snapshot_ID, Extracted_Time FROM snapshots WHERE Sys_ID = ?
+                ORDER BY Extracted_Time DESC, Snapshot_ID DESC LIMIT 1""",
+                (host,),
+            ).fetchone()
+            if row is not None:
+                latest[host] = row
+        self.latest = latest
+
+    def newest(self):
+        """Snapshot_ID of the newest snapshot of any host, None before the first poll"""
+        return max((row[0] for row in self.latest.values()), default=None)
+
+    def run(self):
+        try:
+            if self._warm_up is not None:
+                self._warm_up()
+        except Exception as e:
+            # Raised again by the question that needs it
+            self.warm_up_error = e
+        finally:
+            self.warm.set()
+        conn = None
+        while not self._stop.is_set():
+            with contextlib.suppress(sqlite3.Error):
+                if conn is None:
+                    conn = sqlite3.connect(f"file:{self._db_path}?mode=ro", uri=True)
+                self._poll(conn)
+            self._stop.wait(self._interval)
+        if conn is not None:
+            conn.close()
+
+    def stop(self):
+        self._stop.set()
+
+
+class Chat_Session:
+    """
+    Interactive chat that keeps the model, the query connection and the
+    schema description warm between questions.
+
+    Lines are questions, unless they start with ':', see HELP. The last
+    model answer is kept, so `:rerun` runs its SQL again on fresh data
+    without another model call.
+    """
+
+    HELP = """Type a question, or one of:
+  :rerun, :r         run the last SQL again on the newest data
+  :sql [query]       show the last SQL, or run this one instead
+  :latest            newest snapshot of every host
+  :output FORMAT     table, csv or jsonl
+  :max-rows N        rows shown per answer, 0 for all
+  :help              this help
+  :quit, :q          leave (or Ctrl-D)"""
+
+    def __init__(
+        self,
+        main,
+        output: str = "table",
+        max_rows: int = 1000,
+        page_size: int = 100,
+        time_budget: float = 10.0,
+        use_cache: bool = True,
+        refresh_seconds: float = 2.0,
+        profile: bool = False,
+    ) -> None:
+        self._main = main
+        self._output = output
+        self._max_rows = max_rows
+        self._page_size = page_size
+        self._time_budget = time_budget
+        self._use_cache = use_cache
+        self._profile = profile
+        self._last = None
+        # Newest snapshot when the last SQL ran, to tell whether a rerun sees new data
+        self._last_snapshot = None
+        self._prefetcher = Snapshot_Prefetcher(
+            main._db_file, refresh_seconds, warm_up=self._warm_up
+        )
+
+    def _warm_up(self):
+        # Building the model client imports its SDK, the slowest part of a chat
+        getattr(self._main, "_model")
+        self._main._schema_cache.selector()
+        self._main._query_guard.connection()
+
+    def _age(self, extracted_time: int) -> str:
+        return f"{max(0, int(time.time()) - extracted_time)}s ago"
+
+    def prompt(self) -> str:
+        latest = self._prefetcher.latest
+        if not latest:
+            return "chat-os> "
+        newest = max(extracted_time for _, extracted_time in latest.values())
+        return f"chat-os [{len(latest)} hosts, {self._age(newest)}]> "
+
+    def _run_last(self):
+        self._last_snapshot = self._prefetcher.newest()
+        self._main._run_sql(
+            self._last, self._output, self._max_rows, self._page_size, self._time_budget
+        )
+
+    def ask(self, question: str):
+        self._prefetcher.warm.wait()
+        if self._prefetcher.warm_up_error is not None:
+            error, self._prefetcher.warm_up_error = self._prefetcher.warm_up_error, None
+            raise error
+        with self._main._profiler.span("chat"):
+            self._last_snapshot = self._prefetcher.newest()
+            json_data = self._main._answer(
+                question,
+                self._use_cache,
+                self._output,
+                self._max_rows,
+                self._page_size,
+                self._time_budget,
+            )
+        if json_data is not None:
+            self._last = json_data
+
+    def _rerun(self):
+        if self._last is None:
+            print("Nothing to rerun yet, ask a question first")
+            return
+        if self._prefetcher.newest() == self._last_snapshot:
+            print("No new snapshot since the last run", file=sys.stderr)
+        with self._main._profiler.span("rerun"):
+            self._run_last()
+
+    def _sql(self, query: str):
+        if query:
+            self._last = {"sql_query": query}
+            with self._main._profiler.span("rerun"):
+                self._run_last()
+        elif self._last is None:
+            print("No SQL yet, ask a question first")
+        else:
+            print(self._last["sql_query"])
+
+    def _latest(self):
+        if not self._prefetcher.latest:
+            print("No snapshots yet")
+        for host, (snapshot_id, extracted_time) in sorted(self._prefetcher.latest.items()):
+            print(f"{host}  {snapshot_id}  {self._age(extracted_time)}")
+
+    def command(self, line: str) -> bool:
+        """Run one ':' command, returns False to end the session"""
+        name, _, argument = line[1:].strip().partition(" ")
+        argument = argument.strip()
+        if name in ("quit", "q", "exit"):
+            return False
+        if name in ("rerun", "r"):
+            self._rerun()
+        elif name == "sql":
+            self._sql(argument)
+        elif name == "latest":
+            self._latest()
+        elif name == "output" and argument in ("table", "csv", "jsonl"):
+            self._output = argument
+        elif name == "max-rows" and argument.isdigit():
+            self._max_rows = int(argument)
+        else:
+            print(self.HELP)
+        return True
+
+    def run(self, read_line=input):
+        with contextlib.suppress(ImportError):
+            # Line editing and history when the platform has it
+            import readline  # noqa: F401
+
+        self._prefetcher.start()
+        print("Chat session started, :help for commands, Ctrl-D to leave")
+        try:
+            while True:
+                try:
+                    line = read_line(self.prompt()).strip()
+                except EOFError:
+                    print()
+                    break
+                except KeyboardInterrupt:
+                    print()
+                    continue
+                if not line:
+                    continue
+                self._main._profiler.new_report()
+                try:
+                    if line.startswith(":"):
+                        if not self.command(line):
+                            break
+                    else:
+                        self.ask(line)
+                except KeyboardInterrupt:
+                    print("Interrupted", file=sys.stderr)
+                except Exception as e:
+                    print(f"An unexpected error occurred: {e}")
+                self._main._record_profile(self._profile)
+        finally:
+            self._prefetcher.stop()
@@ -0,0 +1,188 @@
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from snapshot_writer import Snapshot, Snapshot_Writer
+from retention import Retention
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# Pidfile of the resident collector, written by the daemon itself
+PID_PATH = os.path.join(script_dir, "collector.pid")
+
+
+class Collector_Daemon:
+    """
+    Keep one collector process resident and sample on a fixed interval.
+
+    The collector, its warm psutil Process objects and the DB connection
+    live for the whole run. Samples are buffered in memory and flushed in
+    one transaction every `flush_every` samples or `flush_seconds`,
+    whichever comes first, and once more on shutdown. Retention runs on
+    the same connection every `retention_seconds`. Flush and retention
+    spans go to collector_metrics with the next snapshot. With a `spool`
+    every flush is also appended to it. With a `policy` (a Sampling_Policy)
+    the interval follows the host's load instead, and a flush also happens
+    as soon as the host turns busy. With `profile` the spans of every
+    sample are also printed to stderr.
+
+    A flush or retention that fails (a locked database, a full disk) is
+    reported on stderr and the buffered samples are kept and written on
+    a later tick. Past MAX_BUFFERED_SAMPLES they are dropped, and the
+    process state is reloaded from the database so later samples do not
+    diff against rows that were never written.
+    """
+
+    MAX_BUFFERED_SAMPLES = 360
+
+    def __init__(
+        self,
+        collector,
+        db_path: str,
+        interval: float = 10.0,
+        flush_every: int = 6,
+        flush_seconds: float = 60.0,
+        pid_path: str = PID_PATH,
+        retention_seconds: float = 300.0,
+        spool=None,
+        policy=None,
+        profile: bool = False,
+    ) -> None:
+        if interval <= 0:
+            raise ValueError("Interval must be greater than 0 seconds")
+        self._collector = collector
+        self._profiler = collector.profiler
+        self._writer = Snapshot_Writer(db_path, spool=spool)
+        self._interval = interval
+        self._policy = policy
+        self._next_interval = interval
+        self._profile = profile
+        self._flush_every = max(1, flush_every)
+        self._flush_seconds = flush_seconds
+        self._pid_path = pid_path
+        self._stop = threading.Event()
+        self._buffer = Snapshot()
+        self._buffered_samples = 0
+        self._last_flush = time.monotonic()
+        self._retention_seconds = retention_seconds
+        self._retention = None
+        self._last_retention = None
+        self._reload_process_state = False
+        collector.load_process_state(self._writer.connection())
+
+    @staticmethod
+    def read_pid(pid_path: str = PID_PATH):
+        """Return the pid of a live daemon, or None when it is not running"""
+        try:
+            with open(pid_path) as pid_file:
+                pid = int(pid_file.read().strip())
+        except (OSError, ValueError):
+            return None
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return None
+        except PermissionError:
+            pass
+        return pid
+
+    def _write_pidfile(self):
+        if self.read_pid(self._pid_path) is not None:
+            raise RuntimeError("Collector daemon is already running")
+        tmp_path = f"{self._pid_path}.tmp"
+        with open(tmp_path, "w") as pid_file:
+            pid_file.write(str(os.getpid()))
+        os.replace(tmp_path, self._pid_path)
+
+    def _remove_pidfile(self):
+        if self.read_pid(self._pid_path) == os.getpid():
+            os.remove(self._pid_path)
+
+    def stop(self, *_):
+        self._stop.set()
+
+    def _flush(self):
+        if self._buffered_samples:
+            try:
+                with self._profiler.span("write"):
+                    self._writer.write(self._buffer)
+            except (sqlite3.Error, OSError) as error:
+                print(f"Collector daemon: write failed, {error}", file=sys.stderr)
+                if self._buffered_samples < self.MAX_BUFFERED_SAMPLES:
+                    return
+                print(
+                    f"Collector daemon: dropped {self._buffered_samples} samples",
+                    file=sys.stderr,
+                )
+                self._reload_process_state = True
+        self._buffer = Snapshot()
+        self._buffered_samples = 0
+        self._last_flush = time.monotonic()
+
+    def _should_flush(self) -> bool:
+        return (
+            self._buffered_samples >= self._flush_every
+            or time.monotonic() - self._last_flush >= self._flush_seconds
+        )
+
+    def _apply_retention(self):
+        if self._retention is None:
+            self._retention = Retention(self._writer.connection())
+        try:
+            with self._profiler.span("retention"):
+                self._retention.apply()
+        except (sqlite3.Error, OSError) as error:
+            print(f"Collector daemon: retention failed, {error}", file=sys.stderr)
+        self._last_retention = time.monotonic()
+
+    def _schedule_next(self) -> bool:
+        """Pick the next interval, returns whether the host just turned busy"""
+        if self._policy is None:
+            return False
+        was_busy = self._policy.state == "busy"
+        self._next_interval = self._policy.next_interval(self._collector.readings)
+        return self._policy.state == "busy" and not was_busy
+
+    def run_once(self):
+        if self._reload_process_state:
+            try:
+                self._collector.load_process_state(self._writer.connection())
+                self._reload_process_state = False
+            except sqlite3.Error as error:
+                print(f"Collector daemon: reload failed, {error}", file=sys.stderr)
+        self._collector.collect(self._buffer)
+        self._buffered_samples += 1
+        # Rows of an incident are written at once, not a flush interval later
+        if self._schedule_next() or self._should_flush():
+            self._flush()
+            if (
+                self._last_retention is None
+                or time.monotonic() - self._last_retention >= self._retention_seconds
+            ):
+                self._apply_retention()
+
+    def run(self):
+        self._write_pidfile()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        try:
+            next_run = time.monotonic()
+            while not self._stop.is_set():
+                self.run_once()
+                if self._profile:
+                    print(self._profiler.report() + "\n", file=sys.stderr)
+                # Fixed-rate schedule, a slow sample skips ticks instead of piling up
+                next_run += self._next_interval
+                now = time.monotonic()
+                if next_run < now:
+                    next_run = now
+                self._stop.wait(next_run - now)
+        finally:
+            try:
+                self._flush()
+            finally:
+                try:
+                    self._writer.close()
+                finally:
+                    self._remove_pidfile()
@@ -1,6 +1,51 @@
-from langchain_community.utilities import SQLDatabase
+import os
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
 
 
 class Config:
     GEMINI_MODEL_NAME = "models/gemini-1.5-flash-001"
-    DB_PATH = SQLDatabase.from_uri("sqlite:///os_data.db")
+    # Same database the collector writes, next to the scripts
+    DB_FILE = os.path.join(script_dir, "os_data.db")
+    # chat-batch model calls in flight at once, and at most this many a minute
+    BATCH_CONCURRENCY = 4
+    MODEL_REQUESTS_PER_MINUTE = 60.0
+    # How often chat-session looks for new snapshots in the background
+    SESSION_REFRESH_SECONDS = 2.0
+    # Model answers cached per question and schema
+    RESPONSE_CACHE_FILE = os.path.join(script_dir, "response_cache.db")
+    RESPONSE_CACHE_TTL = 24 * 3600
+    RESPONSE_CACHE_SIZE = 1000
+    # Budget for running the model's SQL, see Query_Guard
+    QUERY_TIME_BUDGET = 10.0
+    QUERY_STEP_BUDGET = 0
+    LARGE_TABLE_ROWS = 100000
+
+    # CHAT_OS_* settings are read on first use, once .env is loaded, so
+    # commands that never need them never import dotenv
+    _dotenv_loaded = False
+
+    @classmethod
+    def env(cls, name: str, default: str) -> str:
+        """A setting from the environment, or from the .env file"""
+        if not cls._dotenv_loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            cls._dotenv_loaded = True
+        return os.environ.get(name, default)
+
+    @classmethod
+    def model_backend(cls) -> str:
+        """"gemini", or "stub" for the local deterministic backend"""
+        return cls.env("CHAT_OS_MODEL_BACKEND", "gemini")
+
+    @classmethod
+    def fleet_db_file(cls) -> str:
+        """Spools of many hosts merged by the ingest command, chat-with-os --fleet"""
+        return cls.env("CHAT_OS_FLEET_DB", os.path.join(script_dir, "fleet.db"))
+
+    @classmethod
+    def schema_max_tables(cls) -> int:
+        """Tables described to the model per question, 0 for the whole schema"""
+        return int(cls.env("CHAT_OS_SCHEMA_MAX_TABLES", "6"))
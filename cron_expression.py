@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+
+_MONTH_NAMES = "jan feb mar apr may jun jul aug sep oct nov dec".split()
+_DAY_NAMES = "sun mon tue wed thu fri sat".split()
+
+
+class Cron_Expression:
+    """
+    A five field crontab schedule: minute, hour, day of month, month and
+    day of week, as cron reads them.
+
+    Fields take `*`, numbers, ranges `1-5`, lists `1,15,30` and steps of
+    `*` or a range, `*/5` or `0-30/10`. Months and weekdays
+    can be named (`jan`, `mon-fri`), Sunday is 0 or 7, and @hourly,
+    @daily, @weekly, @monthly and @yearly stand for their usual
+    schedules. Like cron, a run fires when either the day of month or
+    the day of week matches if both are restricted.
+    """
+
+    # Name, lowest and highest value, names standing for values
+    FIELDS = (
+        ("minute", 0, 59, None),
+        ("hour", 0, 23, None),
+        ("day of month", 1, 31, None),
+        ("month", 1, 12, {name: i + 1 for i, name in enumerate(_MONTH_NAMES)}),
+        ("day of week", 0, 7, {name: i for i, name in enumerate(_DAY_NAMES)}),
+    )
+    MACROS = {
+        "@yearly": "0 0 1 1 *",
+        "@annually": "0 0 1 1 *",
+        "@monthly": "0 0 1 * *",
+        "@weekly": "0 0 * * 0",
+        "@daily": "0 0 * * *",
+        "@midnight": "0 0 * * *",
+        "@hourly": "0 * * * *",
+    }
+    # A schedule that has not fired within this many years never will,
+    # February 29th on a given weekday can take 28
+    HORIZON_YEARS = 28
+
+    def __init__(self, expression: str) -> None:
+        if not isinstance(expression, str):
+            raise ValueError("Time should be a valid string")
+        self.expression = expression.strip()
+        fields = self.MACROS.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(
+                "Enter a valid crontab time format, five fields or an @macro"
+            )
+        (
+            self.minutes,
+            self.hours,
+            self.days,
+            self.months,
+            self.weekdays,
+        ) = (
+            self._parse_field(text, *field) for text, field in zip(fields, self.FIELDS)
+        )
+        # Sunday is both 0 and 7
+        if 7 in self.weekdays:
+            self.weekdays = (self.weekdays - {7}) | {0}
+        self._any_day = fields[2].startswith("*")
+        self._any_weekday = fields[4].startswith("*")
+
+    @staticmethod
+    def _value(text: str, name: str, low: int, high: int, names) -> int:
+        if names and text.lower() in names:
+            return names[text.lower()]
+        if not text.isdigit():
+            raise ValueError(f"'{text}' is not a valid {name}")
+        value = int(text)
+        if not low <= value <= high:
+            raise ValueError(
+                f"{name.capitalize()} must be between {low} and {high}, not {value}"
+            )
+        return value
+
+    @staticmethod
+    def _parse_field(text: str, name: str, low: int, high: int, names) -> frozenset:
+        """'0-30/10' => {0, 10, 20, 30}"""
+        values = set()
+        for part in text.split(","):
+            span, _, step = part.partition("/")
+            if step:
+                if not step.isdigit() or int(step) == 0:
+                    raise ValueError(f"Step of {name} must be a positive number")
+                step = int(step)
+            else:
+                step = 1
+            if span == "*":
+                start, end = low, high
+            elif "-" in span:
+                first, _, last = span.partition("-")
+                start = Cron_Expression._value(first, name, low, high, names)
+                end = Cron_Expression._value(last, name, low, high, names)
+                if start > end:
+                    raise ValueError(f"Range of {name} must go upwards, not '{span}'")
+            elif "/" in part:
+                # '5/15' is not read the same way by every cron
+                raise ValueError(f"A step of {name} needs '*' or a range before it")
+            else:
+                start = end = Cron_Expression._value(span, name, low, high, names)
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def _day_matches(self, day: datetime) -> bool:
+        in_days = day.day in self.days
+        # datetime counts weekdays from Monday, cron from Sunday
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def matches(self, moment: datetime) -> bool:
+        return (
+            moment.minute in self.minutes
+            and moment.hour in self.hours
+            and moment.month in self.months
+            and self._day_matches(moment)
+        )
+
+    def next(self, after: datetime = None) -> datetime:
+        """The first time the schedule fires strictly after `after` (now)"""
+        after = after or datetime.now()
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        horizon = after.year + self.HORIZON_YEARS
+        # Whole months, days and hours that can not match are skipped at once
+        while moment.year <= horizon:
+            if moment.month not in self.months:
+                year, month = divmod(moment.month, 12)
+                moment = moment.replace(
+                    year=moment.year + year, month=month + 1, day=1, hour=0, minute=0
+                )
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"'{self.expression}' never fires")
+
+    def next_times(self, count: int, after: datetime = None) -> list:
+        """The next `count` fire times after `after` (now)"""
+        times = []
+        moment = after or datetime.now()
+        for _ in range(count):
+            moment = self.next(moment)
+            times.append(moment)
+        return times
+
+    def __str__(self) -> str:
+        return self.expression
@@ -0,0 +1,88 @@
+import json
+import os
+import platform
+import socket
+import psutil
+from profiler import sys_id
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# Static facts about this host, rebuilt after a reboot or a hostname change
+HOST_FACTS_PATH = os.path.join(script_dir, "host_facts.json")
+
+
+class Host_Facts:
+    """
+    Facts about the host that do not change while it is up: its id, CPU
+    model, core counts, total memory and so on.
+
+    They are cached in a small JSON file keyed on the boot time and the
+    hostname, which are cheap to read, so cpuinfo (slow, it spawns a helper
+    process), the MAC address and the DNS lookup of the IP address are
+    only paid once per boot.
+    """
+
+    def __init__(self, cache_path: str = HOST_FACTS_PATH, psutil_module=None) -> None:
+        self._cache_path = cache_path
+        self._psutil = psutil_module or psutil
+
+    def _key(self) -> dict:
+        return {
+            "boot_time": int(round(self._psutil.boot_time())),
+            "hostname": socket.gethostname(),
+        }
+
+    def _load(self, key: dict):
+        try:
+            with open(self._cache_path) as cache_file:
+                cached = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if any(cached.get(name) != value for name, value in key.items()):
+            return None
+        return cached
+
+    def _save(self, facts: dict):
+        tmp_path = f"{self._cache_path}.tmp"
+        try:
+            with open(tmp_path, "w") as cache_file:
+                json.dump(facts, cache_file, indent=2)
+            os.replace(tmp_path, self._cache_path)
+        except OSError:
+            # A read-only directory only costs the cache
+            pass
+
+    def _ip_address(self, hostname: str) -> str:
+        try:
+            return socket.gethostbyname(hostname)
+        except OSError:
+            return "127.0.0.1"
+
+    def _discover(self, key: dict) -> dict:
+        import cpuinfo
+
+        uname = platform.uname()
+        cpu_freq = self._psutil.cpu_freq()
+        return {
+            **key,
+            "sys_id": sys_id(),
+            "system": uname.system,
+            "node_name": uname.node,
+            "machine": uname.machine,
+            "processor": uname.processor,
+            "processor_model": cpuinfo.get_cpu_info().get("brand_raw", "Unknown"),
+            "physical_cores": self._psutil.cpu_count(logical=False) or 0,
+            "total_cores": self._psutil.cpu_count(logical=True) or 0,
+            "max_frequency": cpu_freq.max if cpu_freq else 0.0,
+            "min_frequency": cpu_freq.min if cpu_freq else 0.0,
+            "total_memory": self._psutil.virtual_memory().total,
+            "total_swap_memory": self._psutil.swap_memory().total,
+            "ip_address": self._ip_address(key["hostname"]),
+        }
+
+    def load(self) -> dict:
+        key = self._key()
+        facts = self._load(key)
+        if facts is None:
+            facts = self._discover(key)
+            self._save(facts)
+        return facts
@@ -0,0 +1,182 @@
+import contextlib
+import json
+import os
+import sqlite3
+import time
+import spool
+from latest_tables import Latest_Tables
+from schema import Schema
+from snapshot_writer import Snapshot_Writer
+
+
+class Ingester:
+    """
+    Merge the spools of many hosts into one fleet database.
+
+    Each segment is replayed in the order its host wrote it, BATCH_RECORDS
+    records to a transaction together with the latest_* tables and how far
+    the segment has been read (ingest_state), so an interrupted ingest
+    resumes at its last commit. A record whose first run is already in
+    snapshots is skipped, which makes re-reading a segment or ingesting
+    overlapping copies of a spool harmless. Spooled statements may only insert into the collected
+    tables (and update processes), a record trying anything else is refused.
+    """
+
+    BATCH_RECORDS = 500
+    TABLES = (
+        "system_information",
+        "snapshots",
+        *Schema.TIME_SERIES_TABLES,
+        "cpu_core_samples",
+        "processes",
+        "process_samples",
+        "collector_metrics",
+    )
+    _ALLOWED_ACTIONS = (
+        sqlite3.SQLITE_READ,
+        sqlite3.SQLITE_SELECT,
+        sqlite3.SQLITE_FUNCTION,
+        sqlite3.SQLITE_SAVEPOINT,
+    )
+
+    def __init__(self, db_path: str, batch_records: int = BATCH_RECORDS) -> None:
+        # cpu_usage_wide starts with one core column and grows with the hosts
+        self._writer = Snapshot_Writer(db_path, core_count=1)
+        self._batch_records = max(1, batch_records)
+        self._core_count = None
+        self._stats = None
+
+    def connection(self):
+        return self._writer.connection()
+
+    def _authorize(self, action, table, column, database, trigger):
+        if action in (sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE):
+            allowed = table in self.TABLES and (
+                action == sqlite3.SQLITE_INSERT
+                or table == "processes"
+                # The triggers keeping each sample's validity
+                or (table == "process_samples" and trigger is not None)
+            )
+        else:
+            allowed = action in self._ALLOWED_ACTIONS
+        return sqlite3.SQLITE_OK if allowed else sqlite3.SQLITE_DENY
+
+    @staticmethod
+    def _cores_in(row) -> int:
+        """Cores of an INSERT_CPU_CORES row, 0 when it is not what it should be"""
+        with contextlib.suppress(ValueError, TypeError, IndexError):
+            return len(json.loads(row[0]))
+        return 0
+
+    def _widen_cpu_view(self, conn, snapshots):
+        if self._core_count is None:
+            self._core_count = Schema.wide_core_count(conn)
+        needed = max(
+            (
+                self._cores_in(row)
+                for snapshot in snapshots
+                if snapshot is not None
+                for sql, rows in snapshot.statements()
+                if sql == Schema.INSERT_CPU_CORES
+                for row in rows
+            ),
+            default=0,
+        )
+        if needed > self._core_count:
+            Schema.widen_cpu_view(conn, needed)
+            self._core_count = needed
+
+    def _replay(self, conn, snapshot) -> str:
+        """Insert one record inside the batch transaction, returns its outcome"""
+        if snapshot is None or not snapshot.runs():
+            return "unreadable"
+        snapshot_id, _, sys_id = snapshot.runs()[0]
+        if conn.execute(
+            "SELECT 1 FROM snapshots WHERE Snapshot_ID = ? AND Sys_ID = ?",
+            (snapshot_id, sys_id),
+        ).fetchone():
+            return "duplicates"
+        conn.execute("SAVEPOINT record")
+        try:
+            for sql, rows in snapshot.statements():
+                conn.executemany(sql, rows)
+        except sqlite3.DatabaseError:
+            # Refused, or written by a newer schema, the rest of the batch goes on
+            conn.execute("ROLLBACK TO record")
+            conn.execute("RELEASE record")
+            return "refused"
+        conn.execute("RELEASE record")
+        self._stats["rows"] += len(snapshot)
+        return "ingested"
+
+    def _commit(self, segment_key: str, snapshots: list, offset: int):
+        conn = self.connection()
+        self._widen_cpu_view(conn, snapshots)
+        # The first json_each of a connection registers it, a sqlite_master
+        # write the authorizer would refuse
+        conn.execute("SELECT 1 FROM json_each('[]')").fetchall()
+        with conn:
+            # An explicit transaction, so each record's savepoint nests in it
+            conn.execute("BEGIN")
+            conn.set_authorizer(self._authorize)
+            runs = []
+            try:
+                for snapshot in snapshots:
+                    outcome = self._replay(conn, snapshot)
+                    self._stats[outcome] += 1
+                    if outcome == "ingested":
+                        runs.extend(snapshot.runs())
+            finally:
+                conn.set_authorizer(None)
+            Latest_Tables.refresh(conn, runs)
+            conn.execute(
+                """INSERT INTO ingest_state VALUES (?, ?, ?)
+                ON CONFLICT (Spool_Segment) DO UPDATE SET
+                Offset = excluded.Offset, Ingested_Time = excluded.Ingested_Time""",
+                (segment_key, offset, int(time.time())),
+            )
+
+    def _offset(self, segment_key: str, size: int) -> int:
+        row = self.connection().execute(
+            "SELECT Offset FROM ingest_state WHERE Spool_Segment = ?", (segment_key,)
+        ).fetchone()
+        # A segment shorter than what was read is a new file under the same name
+        if row is None or row[0] > size:
+            return 0
+        return row[0]
+
+    def ingest_segment(self, path: str):
+        segment_key = os.path.realpath(path)
+        offset = self._offset(segment_key, os.path.getsize(path))
+        batch = []
+        for offset, snapshot in spool.read_segment(path, offset):
+            batch.append(snapshot)
+            if len(batch) >= self._batch_records:
+                self._commit(segment_key, batch, offset)
+                batch = []
+        if batch:
+            self._commit(segment_key, batch, offset)
+        self._stats["segments"] += 1
+
+    def ingest(self, paths) -> dict:
+        """
+        Ingest spool directories or single segment files, returns counts of
+        segments read and records ingested, duplicates, refused or unreadable
+        """
+        self._stats = dict.fromkeys(
+            ("segments", "ingested", "duplicates", "refused", "unreadable", "rows"),
+            0,
+        )
+        for path in paths:
+            for segment in spool.segments(path) if os.path.isdir(path) else [path]:
+                self.ingest_segment(segment)
+        return self._stats
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
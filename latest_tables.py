@@ -0,0 +1,85 @@
+from schema import Schema
+
+
+class Latest_Tables:
+    """
+    Keep the latest_* and top_processes_by_* tables on the newest snapshot
+    of every host.
+
+    refresh() runs inside the transaction that wrote the snapshots, so the
+    tables always match what is committed. Only the newest run of each host
+    counts, and only when it is newer than the one the tables hold, so
+    buffered or late (ingested) snapshots never move them back. A source
+    without rows in that run (a probe that timed out) keeps its previous
+    rows, each row carries the Snapshot_ID it came from.
+    """
+
+    RUN_COLUMNS = "Snapshot_ID, Extracted_Time, Sys_ID"
+
+    @staticmethod
+    def _replace(conn, table: str, source: str, columns, snapshot_id, sys_id):
+        if not conn.execute(
+            f"SELECT 1 FROM {source} WHERE Snapshot_ID = ? AND Sys_ID = ? LIMIT 1",
+            (snapshot_id, sys_id),
+        ).fetchone():
+            return
+        conn.execute(f"DELETE FROM {table} WHERE Sys_ID = ?", (sys_id,))
+        columns = ", ".join(columns)
+        conn.execute(
+            f"""INSERT INTO {table} ({columns}, {Latest_Tables.RUN_COLUMNS})
+            SELECT {columns}, {Latest_Tables.RUN_COLUMNS} FROM {source}
+            WHERE Snapshot_ID = ? AND Sys_ID = ?""",
+            (snapshot_id, sys_id),
+        )
+
+    @staticmethod
+    def _rank(conn, sys_id: str):
+        _, process_columns = Schema.LATEST_TABLES["latest_task_manager"]
+        columns = ", ".join(Schema.column_names(process_columns))
+        for table, order_by in Schema.TOP_PROCESSES.items():
+            conn.execute(f"DELETE FROM {table} WHERE Sys_ID = ?", (sys_id,))
+            conn.execute(
+                f"""INSERT INTO {table} (Rank, {columns}, {Latest_Tables.RUN_COLUMNS})
+                SELECT row_number() OVER (ORDER BY {order_by} DESC, PID),
+                {columns}, {Latest_Tables.RUN_COLUMNS}
+                FROM latest_task_manager WHERE Sys_ID = ?
+                ORDER BY {order_by} DESC, PID LIMIT ?""",
+                (sys_id, Schema.TOP_PROCESSES_N),
+            )
+
+    @staticmethod
+    def refresh(conn, runs) -> int:
+        """
+        Move the tables to the newest of `runs`, (Snapshot_ID, Extracted_Time,
+        Sys_ID) rows, per host. Returns the number of hosts moved
+        """
+        newest = {}
+        for snapshot_id, extracted_time, sys_id in runs:
+            if sys_id not in newest or snapshot_id > newest[sys_id][0]:
+                newest[sys_id] = (snapshot_id, extracted_time)
+        moved = 0
+        for sys_id, (snapshot_id, extracted_time) in newest.items():
+            row = conn.execute(
+                "SELECT Snapshot_ID FROM latest_snapshots WHERE Sys_ID = ?", (sys_id,)
+            ).fetchone()
+            if row is not None and row[0] >= snapshot_id:
+                continue
+            conn.execute(
+                """INSERT INTO latest_snapshots VALUES (?, ?, ?)
+                ON CONFLICT (Sys_ID) DO UPDATE SET
+                Snapshot_ID = excluded.Snapshot_ID,
+                Extracted_Time = excluded.Extracted_Time""",
+                (sys_id, snapshot_id, extracted_time),
+            )
+            for table, (source, columns) in Schema.LATEST_TABLES.items():
+                Latest_Tables._replace(
+                    conn,
+                    table,
+                    source,
+                    Schema.column_names(columns),
+                    snapshot_id,
+                    sys_id,
+                )
+            Latest_Tables._rank(conn, sys_id)
+            moved += 1
+        return moved
@@ -1,103 +1,429 @@
-from schedular import Schedular
+from functools import cached_property
+from typing import List
 import typer
-import google.generativeai as genai
-from dotenv import load_dotenv
-import os
-from prompts import Prompts
-import json
-import ast
-from rich.console import Console
-from rich.markdown import Markdown
+import contextlib
 from config import Config
 
-
-load_dotenv()
-
-genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
+# Commands import and build what they need on first use, so scheduling
+# commands never load the model backend, dotenv or psutil
 
 app = typer.Typer()
-console = Console()
 
 
 class Main:
-    def __init__(self) -> None:
-        self._schedular = Schedular()
-        self._db = Config.DB_PATH
-        self._generative_model = genai.GenerativeModel(
-            Config.GEMINI_MODEL_NAME, generation_config={"temperature": 0.0}
-        )
+    # The collector's own database, or the fleet database with --fleet
+    _db_file = Config.DB_FILE
 
-    def schedule_cron_job(self, schedule_time: str = "* * * * *"):
-        self._schedular.schedule_cron_job(schedule_time)
-        typer.echo("Job successfully scheduled")
+    @cached_property
+    def _schedular(self):
+        from schedular import Schedular
 
-    def format_markdown_table(self, headers, values) -> str:
-        column_widths = [
-            max(len(str(item)) for item in col) for col in zip(headers, *values)
-        ]
-        formatted_table = (
-            "| "
-            + " | ".join(
-                f"{header.ljust(width)}"
-                for header, width in zip(headers, column_widths)
-            )
-            + " |\n"
+        return Schedular()
+
+    @cached_property
+    def _query_guard(self):
+        return self._new_query_guard()
+
+    def _new_query_guard(self):
+        from query_guard import Query_Guard
+
+        return Query_Guard(
+            self._db_file,
+            time_budget=Config.QUERY_TIME_BUDGET,
+            step_budget=Config.QUERY_STEP_BUDGET,
+            large_table_rows=Config.LARGE_TABLE_ROWS,
         )
-        formatted_table += (
-            "|-" + "-|-".join("-" * width for width in column_widths) + "-|\n"
+
+    @cached_property
+    def _schema_cache(self):
+        from schema_cache import Schema_Cache
+
+        return Schema_Cache(self._db_file, max_tables=Config.schema_max_tables())
+
+    @cached_property
+    def _model(self):
+        from model_backends import create_backend
+
+        return create_backend(Config.model_backend(), Config.GEMINI_MODEL_NAME)
+
+    @cached_property
+    def _response_cache(self):
+        from response_cache import Response_Cache
+
+        return Response_Cache(
+            Config.RESPONSE_CACHE_FILE,
+            ttl=Config.RESPONSE_CACHE_TTL,
+            max_entries=Config.RESPONSE_CACHE_SIZE,
         )
-        for row in values:
-            formatted_table += (
-                "| "
-                + " | ".join(
-                    f"{str(item).ljust(width)}"
-                    for item, width in zip(row, column_widths)
-                )
-                + " |\n"
-            )
 
-        return formatted_table
+    @cached_property
+    def _profiler(self):
+        from profiler import Profiler
+
+        return Profiler("chat")
+
+    @cached_property
+    def _console(self):
+        from rich.console import Console
+
+        return Console()
+
+    def schedule_cron_job(self, schedule_time: str = "* * * * *"):
+        self._schedular.schedule_cron_job(schedule_time)
+        typer.echo("Job successfully scheduled")
 
     def reschedule_cron_job(self, reschedule_time: str = "* 1 * * *"):
         self._schedular.reschedule_cron_job(reschedule_time)
         typer.echo("Job scheduled successfully")
 
+    def cron_next_runs(self, schedule_time: str = "* * * * *", count: int = 5):
+        """Show when a crontab schedule fires next, without scheduling it"""
+        for moment in self._schedular.next_runs(schedule_time, count):
+            typer.echo(moment.strftime("%Y-%m-%d %H:%M %a"))
+
     def remove_cron_job(self):
         self._schedular.remove_cron_job()
         typer.echo("Job removed successfully")
 
-    def format_string(self, s: str):
-        return s.replace("```", "").replace("json", "")
+    def start_collector_daemon(
+        self,
+        interval: float = 10.0,
+        flush_every: int = 6,
+        spool: str = "",
+        adaptive: bool = False,
+        busy_threshold: str = "",
+        idle_threshold: str = "",
+    ):
+        """
+        --busy-threshold and --idle-threshold (like cpu=70,disk=95) move the
+        percentages --adaptive switches at
+        """
+        self._schedular.start_daemon(
+            interval, flush_every, spool, adaptive, busy_threshold, idle_threshold
+        )
+        if adaptive:
+            typer.echo(
+                f"Collector daemon started, sampling around every {interval} seconds"
+            )
+        else:
+            typer.echo(f"Collector daemon started, sampling every {interval} seconds")
+
+    def stop_collector_daemon(self):
+        self._schedular.stop_daemon()
+        typer.echo("Collector daemon stopped")
+
+    def collector_daemon_status(self):
+        pid = self._schedular.daemon_status()
+        if pid is None:
+            typer.echo("Collector daemon is not running")
+        else:
+            typer.echo(f"Collector daemon is running with pid {pid}")
+
+    def migrate_db(self):
+        """Upgrade an existing os_data.db in place to the current schema"""
+        import sqlite3
+        from schema import Schema
+
+        with contextlib.closing(sqlite3.connect(Config.DB_FILE)) as conn:
+            (version,) = conn.execute("PRAGMA user_version").fetchone()
+            Schema.bootstrap(conn)
+        typer.echo(f"Database migrated from version {version} to {Schema.VERSION}")
+
+    def apply_retention(self, raw_days: float = 2.0):
+        """Roll up raw samples, prune those older than --raw-days and reclaim space"""
+        from snapshot_writer import Snapshot_Writer
+        from retention import Retention
+
+        with Snapshot_Writer(Config.DB_FILE) as writer:
+            stats = Retention(writer.connection(), raw_days=raw_days).apply()
+        typer.echo(
+            f"Rolled up {stats['rolled_up']} rows, pruned {stats['pruned']} rows, "
+            f"reclaimed {stats['reclaimed_pages']} pages"
+        )
+
+    def ingest(
+        self,
+        spools: List[str],
+        db: str = "",
+        raw_days: float = 2.0,
+    ):
+        """
+        Merge spool directories (collect --spool) of any number of hosts into
+        the fleet database (--db, CHAT_OS_FLEET_DB by default), records
+        already there are skipped
+        """
+        from ingester import Ingester
+        from retention import Retention
+
+        db = db or Config.fleet_db_file()
+        with Ingester(db) as ingester:
+            stats = ingester.ingest(spools)
+            Retention(ingester.connection(), raw_days=raw_days).apply()
+        typer.echo(
+            f"Read {stats['segments']} segments, ingested {stats['ingested']} "
+            f"snapshots ({stats['rows']} rows), skipped {stats['duplicates']} "
+            f"already ingested, {stats['refused']} refused and "
+            f"{stats['unreadable']} unreadable"
+        )
+
+    def response_cache_stats(self, clear: bool = False):
+        """Show the response cache hit/miss counters, or empty it with --clear"""
+        if clear:
+            self._response_cache.clear()
+            typer.echo("Response cache cleared")
+            return
+        stats = self._response_cache.stats()
+        typer.echo(
+            f"{stats['entries']} cached responses, "
+            f"{stats['hits']} hits, {stats['misses']} misses"
+        )
+
+    def collect(
+        self,
+        daemon: bool = False,
+        interval: float = 10.0,
+        flush_every: int = 6,
+        profile: bool = False,
+        spool: str = "",
+        adaptive: bool = False,
+        busy_threshold: str = "",
+        idle_threshold: str = "",
+    ):
+        """
+        Collect one snapshot, or keep sampling every --interval seconds with
+        --daemon. --spool also appends the snapshots to a spool directory,
+        --adaptive samples faster under load and slower while idle, at the
+        percentages of --busy-threshold and --idle-threshold (like cpu=70)
+        """
+        from sql_lite import collect
+
+        collect(
+            daemon=daemon,
+            interval=interval,
+            flush_every=flush_every,
+            profile=profile,
+            spool=spool,
+            adaptive=adaptive,
+            busy_threshold=busy_threshold,
+            idle_threshold=idle_threshold,
+        )
+
+    def _generate(self, user_query: str, use_cache: bool):
+        """Return the model's parsed JSON answer, or its raw text when it is not JSON"""
+        from model_backends import parse_response
+        from prompts import Prompts
+        from response_cache import Response_Cache
+
+        span = self._profiler.span
+        with span("schema") as measured:
+            schemas, tables = self._schema_cache.select(user_query)
+            schema_hash = Response_Cache.schema_hash(schemas)
+            measured["size"] = len(schemas)
+        if use_cache:
+            with span("response_cache"):
+                json_data = self._response_cache.get(user_query, schema_hash)
+            if json_data is not None:
+                return json_data, None
+        prompt = Prompts.DB_PROMPT.format(schemas=schemas, user_query=user_query)
+        with span("model", size=len(prompt)):
+            response_text = self._model.generate(prompt, user_query)
+        json_data = parse_response(response_text)
+        if json_data is not None and self._schema_cache.needs_full_schema(
+            json_data.get("sql_query", ""), tables
+        ):
+            # The SQL guessed at a table the pruned schema left out, ask again with all of them
+            prompt = Prompts.DB_PROMPT.format(
+                schemas=self._schema_cache.describe(), user_query=user_query
+            )
+            with span("model_full_schema", size=len(prompt)):
+                response_text = self._model.generate(prompt, user_query)
+            json_data = parse_response(response_text)
+        if json_data is None:
+            return None, response_text
+        # Keyed on the pruned schema, the one the next ask of this question looks up
+        if use_cache and "sql_query" in json_data:
+            self._response_cache.put(user_query, schema_hash, json_data)
+        return json_data, None
 
     def chat_with_os(
         self,
         user_query: str = "Provide me the top 10 running task along with the resources",
+        use_cache: bool = True,
+        output: str = "table",
+        max_rows: int = 1000,
+        page_size: int = 100,
+        time_budget: float = Config.QUERY_TIME_BUDGET,
+        profile: bool = False,
+        fleet: bool = False,
     ):
-        response = self._generative_model.generate_content(
-            Prompts.DB_PROMPT.format(
-                schemas=self._db.get_table_info(), user_query=user_query
-            )
-        )
+        """
+        Answer a question from the collected data, --output table, csv or
+        jsonl. --profile prints how long each stage took, --fleet asks the
+        database the ingest command merges every host into
+        """
+        if fleet:
+            self._db_file = Config.fleet_db_file()
         try:
-            formatted_string = self.format_string(response.text)
-            json_data = json.loads(formatted_string)
+            with self._profiler.span("chat"):
+                self._answer(
+                    user_query, use_cache, output, max_rows, page_size, time_budget
+                )
+        finally:
+            self._record_profile(profile)
 
-            # Assuming `self._db.run()` returns a JSON formatted string
-            result = self._db.run(json_data["sql_query"])
+    def chat_session(
+        self,
+        output: str = "table",
+        max_rows: int = 1000,
+        page_size: int = 100,
+        time_budget: float = Config.QUERY_TIME_BUDGET,
+        use_cache: bool = True,
+        fleet: bool = False,
+        profile: bool = False,
+    ):
+        """
+        Interactive chat keeping the model, database connection and schema
+        warm between questions, :rerun runs the last SQL on fresh data
+        """
+        from chat_session import Chat_Session
 
-            values = ast.literal_eval(result)
+        if fleet:
+            self._db_file = Config.fleet_db_file()
+        Chat_Session(
+            self,
+            output=output,
+            max_rows=max_rows,
+            page_size=page_size,
+            time_budget=time_budget,
+            use_cache=use_cache,
+            refresh_seconds=Config.SESSION_REFRESH_SECONDS,
+            profile=profile,
+        ).run()
 
-            final_answer = self.format_markdown_table(
-                json_data["column_headers"], values
+    def chat_batch(
+        self,
+        questions: str = "-",
+        output: str = "markdown",
+        concurrency: int = Config.BATCH_CONCURRENCY,
+        requests_per_minute: float = Config.MODEL_REQUESTS_PER_MINUTE,
+        max_rows: int = 100,
+        time_budget: float = Config.QUERY_TIME_BUDGET,
+        use_cache: bool = True,
+        fleet: bool = False,
+        profile: bool = False,
+    ):
+        """
+        Answer every question of a file (one per line, - for stdin) in one
+        go, --output markdown or jsonl, in the order they were asked
+        """
+        import sys
+        from batch_chat import Batch_Chat
+
+        if fleet:
+            self._db_file = Config.fleet_db_file()
+        if questions == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(questions) as questions_file:
+                lines = questions_file.read().splitlines()
+        # Blank lines and # comments are skipped
+        asked = [
+            line.strip()
+            for line in lines
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+        try:
+            summary = Batch_Chat(
+                self._model,
+                self._schema_cache,
+                self._new_query_guard,
+                response_cache=self._response_cache if use_cache else None,
+                concurrency=concurrency,
+                requests_per_minute=requests_per_minute,
+                max_rows=max_rows,
+                time_budget=time_budget,
+                output=output,
+                profiler=self._profiler,
+            ).run(asked, sys.stdout)
+            print(
+                f"Answered {summary['questions']} questions in {summary['seconds']} s, "
+                f"{summary['cached']} from the cache, {summary['failed']} failed",
+                file=sys.stderr,
             )
+        finally:
+            self._record_profile(profile)
 
-            md = Markdown(final_answer)
+    def _record_profile(self, profile: bool):
+        """Print the chat spans with --profile, and keep them in collector_metrics"""
+        import os
+        import sqlite3
+        import sys
+        from schema import Schema
+        from snapshot_writer import Snapshot
+        from profiler import METRIC_COLUMNS
 
-            console.print(md)
+        if profile:
+            print(self._profiler.report(), file=sys.stderr)
+        rows = self._profiler.drain()
+        if not os.path.exists(self._db_file):
+            return
+        # Losing the timings must never fail the answer itself, and chat never
+        # migrates a database: one on another schema version gets no rows
+        with contextlib.suppress(sqlite3.Error), contextlib.closing(
+            sqlite3.connect(self._db_file, timeout=5)
+        ) as conn:
+            (version,) = conn.execute("PRAGMA user_version").fetchone()
+            if version != Schema.VERSION:
+                return
+            with conn:
+                conn.executemany(
+                    Snapshot.insert_sql("collector_metrics", METRIC_COLUMNS), rows
+                )
+
+    def _answer(self, user_query, use_cache, output, max_rows, page_size, time_budget):
+        from rich.markdown import Markdown
+
+        json_data, response_text = self._generate(user_query, use_cache)
+        if json_data is None:
+            # General questions are answered in Markdown
+            self._console.print(Markdown(response_text))
+            return None
+        self._run_sql(json_data, output, max_rows, page_size, time_budget)
+        return json_data
+
+    def _run_sql(self, json_data, output, max_rows, page_size, time_budget):
+        """Run the SQL of a model answer and render its rows"""
+        import sys
+        from result_renderer import Result_Renderer
+
+        span = self._profiler.span
+        try:
+            renderer = Result_Renderer(
+                output=output,
+                page_size=page_size,
+                max_rows=max_rows,
+                console=self._console,
+            )
+            # Read-only, LIMITed to one row past --max-rows and interrupted
+            # after --time-budget seconds, rows stream with their native types
+            with span("sql"):
+                cursor, warnings = self._query_guard.execute(
+                    json_data["sql_query"],
+                    limit=max_rows + 1 if max_rows else 0,
+                    time_budget=time_budget,
+                )
+            for warning in warnings:
+                print(f"Warning: {warning}", file=sys.stderr)
+            # Rows are fetched while rendering, so this covers most of the query
+            with span("render"):
+                written = renderer.render(cursor, json_data.get("column_headers"))
+            if cursor.interrupted:
+                print(
+                    f"Query stopped after {self._query_guard.exceeded}, "
+                    f"showing the {written} rows fetched before that",
+                    file=sys.stderr,
+                )
 
-        except json.JSONDecodeError as e:
-            md = Markdown(response.text)
-            console.print(md)
         except KeyError as e:
             print(f"Key error: {e}")
         except Exception as e:
@@ -108,8 +434,19 @@ cli_app = Main()
 
 app.command()(cli_app.schedule_cron_job)
 app.command()(cli_app.reschedule_cron_job)
+app.command()(cli_app.cron_next_runs)
 app.command()(cli_app.remove_cron_job)
 app.command()(cli_app.chat_with_os)
+app.command()(cli_app.chat_batch)
+app.command()(cli_app.chat_session)
+app.command()(cli_app.response_cache_stats)
+app.command()(cli_app.start_collector_daemon)
+app.command()(cli_app.stop_collector_daemon)
+app.command()(cli_app.collector_daemon_status)
+app.command()(cli_app.migrate_db)
+app.command()(cli_app.apply_retention)
+app.command()(cli_app.collect)
+app.command()(cli_app.ingest)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,577 @@
+import re
+from datetime import datetime
+
+_NUMBER = re.compile(r"[-+]?\d+(?:\.\d+)?")
+_SIZE = re.compile(r"([-+]?\d+(?:\.\d+)?)\s*([KMGTP]?)")
+_SIZE_UNITS = ["", "K", "M", "G", "T", "P"]
+
+# Tables created before PRAGMA user_version was tracked
+_LEGACY_TABLES = (
+    "system_information",
+    "cpu_usage",
+    "ram_usage",
+    "disk_usage",
+    "total_disk_usage",
+    "task_manager",
+)
+
+
+class Migrations:
+    """
+    In-place upgrades of existing databases, one step per schema version.
+
+    Each step owns a frozen copy of the DDL it migrates to, so it keeps
+    working after Schema moves on. Tables are rebuilt in rowid batches of
+    BATCH_SIZE rows, each committed on its own, so memory and journal size
+    stay bounded however large the database is, and an interrupted run
+    simply starts that table over.
+    """
+
+    BATCH_SIZE = 50000
+
+    @staticmethod
+    def to_number(value):
+        """'12.5%' => 12.5, '2400.00Mhz' => 2400.0"""
+        if value is None or isinstance(value, (int, float)):
+            return value
+        match = _NUMBER.search(str(value))
+        return float(match.group()) if match else None
+
+    @staticmethod
+    def to_bytes(value):
+        """'1.20GB' => 1288490189, '345.22 MB%' => 361989407, '1234 bytes' => 1234"""
+        if value is None or isinstance(value, int):
+            return value
+        if isinstance(value, float):
+            return int(round(value))
+        match = _SIZE.search(str(value))
+        if not match:
+            return None
+        number, unit = match.groups()
+        return int(round(float(number) * 1024 ** _SIZE_UNITS.index(unit)))
+
+    @staticmethod
+    def boot_time_to_epoch(value):
+        """'2024/1/5 3:4:5' in local time => unix epoch seconds"""
+        if value is None or isinstance(value, int):
+            return value
+        try:
+            return int(datetime.strptime(value, "%Y/%m/%d %H:%M:%S").timestamp())
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _table_exists(conn, table: str) -> bool:
+        return (
+            conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (table,),
+            ).fetchone()
+            is not None
+        )
+
+    @staticmethod
+    def _columns(conn, table: str):
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+    @staticmethod
+    def rebuild(
+        conn,
+        table: str,
+        columns_definition: str,
+        expressions: dict,
+        keep_rowid: bool = True,
+    ):
+        """
+        Copy `table` into a new definition. `expressions` maps a column of the
+        new table to the SQL computing it from the old row, every other column
+        is copied as is. Without `keep_rowid` the new table numbers its rows
+        afresh, for a rowid that was an alias of a column that no longer is.
+        """
+        if not Migrations._table_exists(conn, table):
+            return
+        columns = Migrations._columns(conn, table)
+        tmp_table = f"{table}_migrating"
+        with conn:
+            conn.execute(f"DROP TABLE IF EXISTS {tmp_table}")
+            conn.execute(f"CREATE TABLE {tmp_table} ({columns_definition})")
+        new_columns = Migrations._columns(conn, tmp_table)
+        target = [column for column in columns if column in new_columns]
+        target += [column for column in expressions if column not in target]
+        # Tables without an INTEGER PRIMARY KEY keep their rowid explicitly
+        if "id" not in columns and keep_rowid:
+            target = ["rowid", *[column for column in target if column != "id"]]
+            if "id" in new_columns:
+                target[0] = "id"
+                expressions = {**expressions, "id": "rowid"}
+        select = ", ".join(expressions.get(column, column) for column in target)
+        last_rowid = 0
+        while True:
+            with conn:
+                (batch_end,) = conn.execute(
+                    f"""SELECT max(rowid) FROM (SELECT rowid FROM {table}
+                    WHERE rowid > ? ORDER BY rowid LIMIT ?)""",
+                    (last_rowid, Migrations.BATCH_SIZE),
+                ).fetchone()
+                if batch_end is None:
+                    break
+                conn.execute(
+                    f"""INSERT INTO {tmp_table} ({', '.join(target)})
+                    SELECT {select} FROM {table} WHERE rowid > ? AND rowid <= ?""",
+                    (last_rowid, batch_end),
+                )
+            last_rowid = batch_end
+        with conn:
+            conn.execute(f"DROP TABLE {table}")
+            conn.execute(f"ALTER TABLE {tmp_table} RENAME TO {table}")
+
+    @staticmethod
+    def _apply(function: str, columns) -> dict:
+        return {column: f"{function}({column})" for column in columns}
+
+    @staticmethod
+    def _typed_numeric_columns(conn):
+        """Version 2: formatted strings become raw bytes, percentages and MHz"""
+        conn.create_function("to_bytes", 1, Migrations.to_bytes, deterministic=True)
+        conn.create_function("to_number", 1, Migrations.to_number, deterministic=True)
+        foreign_key = "FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID)"
+        Migrations.rebuild(
+            conn,
+            "system_information",
+            """Mac_ID TEXT PRIMARY KEY, System TEXT, Node_Name TEXT, Machine TEXT,
+            Processor TEXT, Processor_Model TEXT, Physcial_cores INT,
+            Total_cores INT, Max_Frequency REAL, Min_Frequency REAL,
+            Total_Memory INTEGER, Total_Swap_Memory INTEGER, Ip_Address TEXT""",
+            {
+                **Migrations._apply("to_number", ["Max_Frequency", "Min_Frequency"]),
+                **Migrations._apply("to_bytes", ["Total_Memory", "Total_Swap_Memory"]),
+            },
+        )
+        if Migrations._table_exists(conn, "cpu_usage"):
+            core_columns = [
+                column
+                for column in Migrations._columns(conn, "cpu_usage")
+                if column.startswith("Core_")
+            ]
+            Migrations.rebuild(
+                conn,
+                "cpu_usage",
+                f"""id INTEGER PRIMARY KEY AUTOINCREMENT, Current_Frequency REAL,
+                {', '.join(f'{column} REAL' for column in core_columns)},
+                Total_Cpu_Usage REAL,
+                Extracted_Time TEXT DEFAULT (datetime('now')), Sys_ID TEXT,
+                {foreign_key}""",
+                Migrations._apply(
+                    "to_number", ["Current_Frequency", "Total_Cpu_Usage", *core_columns]
+                ),
+            )
+        Migrations.rebuild(
+            conn,
+            "ram_usage",
+            f"""id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Free INTEGER, Used INTEGER, Percentage REAL,
+            Swap_Free INTEGER, Swap_Used INTEGER, Swap_Percentage REAL,
+            Extracted_Time TEXT DEFAULT (datetime('now')), Sys_ID TEXT,
+            {foreign_key}""",
+            {
+                **Migrations._apply("to_bytes", ["Free", "Used", "Swap_Free", "Swap_Used"]),
+                **Migrations._apply("to_number", ["Percentage", "Swap_Percentage"]),
+            },
+        )
+        Migrations.rebuild(
+            conn,
+            "disk_usage",
+            f"""id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Device TEXT, Mount_Point TEXT, File_System_Type TEXT,
+            Total_Size INTEGER, Used INTEGER, Free INTEGER, Percentage REAL,
+            Extracted_Time TEXT DEFAULT (datetime('now')), Sys_ID TEXT,
+            {foreign_key}""",
+            {
+                **Migrations._apply("to_bytes", ["Total_Size", "Used", "Free"]),
+                **Migrations._apply("to_number", ["Percentage"]),
+            },
+        )
+        Migrations.rebuild(
+            conn,
+            "total_disk_usage",
+            f"""id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Total_Read INTEGER, Total_Write INTEGER, Boot_Time TEXT,
+            Extracted_Time TEXT DEFAULT (datetime('now')), Sys_ID TEXT,
+            {foreign_key}""",
+            Migrations._apply("to_bytes", ["Total_Read", "Total_Write"]),
+        )
+        Migrations.rebuild(
+            conn,
+            "task_manager",
+            f"""Process_Name TEXT, PID INTEGER, CPU_Usage REAL, Memory_Usage INTEGER,
+            Memory_Percentage REAL, Disk_Usage INTEGER,
+            Network_Sent INTEGER, Network_Received INTEGER,
+            Extracted_Time TEXT DEFAULT (datetime('now')), Sys_ID TEXT,
+            {foreign_key}""",
+            {
+                **Migrations._apply("to_number", ["CPU_Usage", "Memory_Percentage"]),
+                **Migrations._apply(
+                    "to_bytes",
+                    ["Memory_Usage", "Disk_Usage", "Network_Sent", "Network_Received"],
+                ),
+            },
+        )
+
+    @staticmethod
+    def _epoch_timestamps(conn):
+        """
+        Version 3: Extracted_Time becomes unix epoch seconds, every row gets
+        a Snapshot_ID and task_manager gets a primary key. Rows written before
+        snapshots existed were stamped as they were written, task_manager rows
+        over the seconds spent on each process, so they are grouped into runs:
+        a run starts with a cpu_usage row (a ram_usage row on hosts without
+        any) and each row joins the last run started at or before it.
+        """
+        conn.create_function(
+            "boot_time_to_epoch", 1, Migrations.boot_time_to_epoch, deterministic=True
+        )
+        foreign_key = "FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID)"
+        time_columns = "Snapshot_ID INTEGER, Extracted_Time INTEGER, Sys_ID TEXT"
+        epoch = "CAST(strftime('%s', Extracted_Time) AS INTEGER)"
+
+        def expressions(table: str) -> dict:
+            run = f"""coalesce((SELECT max(Run_Start) FROM legacy_runs
+            WHERE Run_Sys_ID = {table}.Sys_ID AND Run_Start <= {epoch}), {epoch})"""
+            return {"Extracted_Time": run, "Snapshot_ID": f"{run} * 1000000"}
+
+        with conn:
+            conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS snapshots
+                (Snapshot_ID INTEGER PRIMARY KEY, Sys_ID TEXT, Extracted_Time INTEGER,
+                {foreign_key})"""
+            )
+            conn.execute("DROP TABLE IF EXISTS temp.legacy_runs")
+            conn.execute(
+                """CREATE TEMP TABLE legacy_runs
+                (Run_Sys_ID TEXT, Run_Start INTEGER, PRIMARY KEY (Run_Sys_ID, Run_Start))"""
+            )
+            for table in ("cpu_usage", "ram_usage"):
+                if Migrations._table_exists(conn, table):
+                    conn.execute(
+                        f"""INSERT OR IGNORE INTO legacy_runs
+                        SELECT DISTINCT Sys_ID, {epoch} FROM {table}
+                        WHERE Extracted_Time IS NOT NULL
+                        AND Sys_ID NOT IN (SELECT Run_Sys_ID FROM legacy_runs)"""
+                    )
+        if Migrations._table_exists(conn, "cpu_usage"):
+            core_columns = [
+                column
+                for column in Migrations._columns(conn, "cpu_usage")
+                if column.startswith("Core_")
+            ]
+            Migrations.rebuild(
+                conn,
+                "cpu_usage",
+                f"""id INTEGER PRIMARY KEY AUTOINCREMENT, Current_Frequency REAL,
+                {', '.join(f'{column} REAL' for column in core_columns)},
+                Total_Cpu_Usage REAL, {time_columns}, {foreign_key}""",
+                expressions("cpu_usage"),
+            )
+        Migrations.rebuild(
+            conn,
+            "ram_usage",
+            f"""id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Free INTEGER, Used INTEGER, Percentage REAL,
+            Swap_Free INTEGER, Swap_Used INTEGER, Swap_Percentage REAL,
+            {time_columns}, {foreign_key}""",
+            expressions("ram_usage"),
+        )
+        Migrations.rebuild(
+            conn,
+            "disk_usage",
+            f"""id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Device TEXT, Mount_Point TEXT, File_System_Type TEXT,
+            Total_Size INTEGER, Used INTEGER, Free INTEGER, Percentage REAL,
+            {time_columns}, {foreign_key}""",
+            expressions("disk_usage"),
+        )
+        Migrations.rebuild(
+            conn,
+            "total_disk_usage",
+            f"""id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Total_Read INTEGER, Total_Write INTEGER, Boot_Time INTEGER,
+            {time_columns}, {foreign_key}""",
+            {**expressions("total_disk_usage"), "Boot_Time": "boot_time_to_epoch(Boot_Time)"},
+        )
+        Migrations.rebuild(
+            conn,
+            "task_manager",
+            f"""id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Process_Name TEXT, PID INTEGER, CPU_Usage REAL, Memory_Usage INTEGER,
+            Memory_Percentage REAL, Disk_Usage INTEGER,
+            Network_Sent INTEGER, Network_Received INTEGER,
+            {time_columns}, {foreign_key}""",
+            expressions("task_manager"),
+        )
+        for table in (
+            "cpu_usage",
+            "ram_usage",
+            "disk_usage",
+            "total_disk_usage",
+            "task_manager",
+        ):
+            if Migrations._table_exists(conn, table):
+                with conn:
+                    conn.execute(
+                        f"""INSERT OR IGNORE INTO snapshots
+                        (Snapshot_ID, Sys_ID, Extracted_Time)
+                        SELECT DISTINCT Snapshot_ID, Sys_ID, Extracted_Time
+                        FROM {table} WHERE Snapshot_ID IS NOT NULL"""
+                    )
+        with conn:
+            conn.execute("DROP TABLE temp.legacy_runs")
+
+    @staticmethod
+    def _change_only_processes(conn):
+        """
+        Version 6: the task_manager table is split into a processes dimension,
+        change-only process_samples and a per-snapshot network_usage table,
+        and becomes a view. Old rows have no process start time, they are
+        interned with Start_Time 0 and every one of them is kept as a sample.
+        A process missing from a few snapshots in between is carried through
+        them, as the collector does for unchanged processes.
+        """
+        if not Migrations._table_exists(conn, "task_manager"):
+            return
+        with conn:
+            # Only this step creates them, so a partial earlier run starts over
+            for table in ("processes", "process_samples", "network_usage"):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute(
+                """CREATE TABLE processes
+                (Process_Key INTEGER PRIMARY KEY, Sys_ID TEXT, PID INTEGER,
+                Start_Time REAL, Process_Name TEXT,
+                First_Snapshot_ID INTEGER, Exit_Snapshot_ID INTEGER,
+                UNIQUE (Sys_ID, PID, Start_Time, Process_Name))"""
+            )
+            conn.execute(
+                """CREATE TABLE process_samples
+                (id INTEGER PRIMARY KEY, Process_Key INTEGER,
+                CPU_Usage REAL, Memory_Usage INTEGER, Memory_Percentage REAL,
+                Disk_Usage INTEGER, Snapshot_ID INTEGER, Extracted_Time INTEGER,
+                FOREIGN KEY (Process_Key) REFERENCES processes (Process_Key))"""
+            )
+            conn.execute(
+                """CREATE TABLE network_usage
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                Bytes_Sent INTEGER, Bytes_Received INTEGER,
+                Snapshot_ID INTEGER, Extracted_Time INTEGER, Sys_ID TEXT,
+                FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID))"""
+            )
+            conn.execute(
+                """CREATE INDEX idx_task_manager_migrating
+                ON task_manager (Sys_ID, PID, Process_Name, Snapshot_ID)"""
+            )
+            conn.execute(
+                """INSERT INTO processes
+                (Sys_ID, PID, Start_Time, Process_Name, First_Snapshot_ID)
+                SELECT Sys_ID, PID, 0, Process_Name, min(Snapshot_ID)
+                FROM task_manager GROUP BY Sys_ID, PID, Process_Name"""
+            )
+            # Gone from the first snapshot after the last one it was seen in
+            conn.execute(
+                """UPDATE processes SET Exit_Snapshot_ID = (
+                SELECT min(s.Snapshot_ID) FROM snapshots s
+                WHERE s.Sys_ID = processes.Sys_ID AND s.Snapshot_ID > (
+                SELECT max(t.Snapshot_ID) FROM task_manager t
+                WHERE t.Sys_ID IS processes.Sys_ID AND t.PID IS processes.PID
+                AND t.Process_Name IS processes.Process_Name))"""
+            )
+            conn.execute(
+                """INSERT INTO network_usage
+                (Bytes_Sent, Bytes_Received, Snapshot_ID, Extracted_Time, Sys_ID)
+                SELECT max(Network_Sent), max(Network_Received), Snapshot_ID,
+                max(Extracted_Time), Sys_ID
+                FROM task_manager GROUP BY Snapshot_ID, Sys_ID ORDER BY Snapshot_ID"""
+            )
+        last_rowid = 0
+        while True:
+            with conn:
+                (batch_end,) = conn.execute(
+                    """SELECT max(rowid) FROM (SELECT rowid FROM task_manager
+                    WHERE rowid > ? ORDER BY rowid LIMIT ?)""",
+                    (last_rowid, Migrations.BATCH_SIZE),
+                ).fetchone()
+                if batch_end is None:
+                    break
+                conn.execute(
+                    """INSERT INTO process_samples
+                    (Process_Key, CPU_Usage, Memory_Usage, Memory_Percentage,
+                    Disk_Usage, Snapshot_ID, Extracted_Time)
+                    SELECT p.Process_Key, t.CPU_Usage, t.Memory_Usage,
+                    t.Memory_Percentage, t.Disk_Usage, t.Snapshot_ID, t.Extracted_Time
+                    FROM task_manager t JOIN processes p ON p.Sys_ID IS t.Sys_ID
+                    AND p.PID IS t.PID AND p.Start_Time = 0
+                    AND p.Process_Name IS t.Process_Name
+                    WHERE t.rowid > ? AND t.rowid <= ?""",
+                    (last_rowid, batch_end),
+                )
+            last_rowid = batch_end
+        with conn:
+            conn.execute("DROP TABLE task_manager")
+
+    @staticmethod
+    def _snapshots_per_host(conn):
+        """
+        Version 7: snapshots are keyed on (Snapshot_ID, Sys_ID), hosts merged
+        into one database can take a snapshot in the same microsecond
+        """
+        Migrations.rebuild(
+            conn,
+            "snapshots",
+            """Snapshot_ID INTEGER, Sys_ID TEXT, Extracted_Time INTEGER,
+            PRIMARY KEY (Snapshot_ID, Sys_ID),
+            FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID)""",
+            {},
+            # The old rowid was the Snapshot_ID itself
+            keep_rowid=False,
+        )
+
+    @staticmethod
+    def _long_cpu_cores(conn):
+        """
+        Version 9: the Core_N columns of cpu_usage move to one
+        cpu_core_samples row per core, cpu_usage keeps the summary
+        """
+        if not Migrations._table_exists(conn, "cpu_usage"):
+            return
+        core_columns = [
+            column
+            for column in Migrations._columns(conn, "cpu_usage")
+            if column.startswith("Core_")
+        ]
+        if not core_columns:
+            # Already moved by an earlier run interrupted before its version was set
+            return
+        with conn:
+            # Only this step creates it, so a partial earlier run starts over
+            conn.execute("DROP TABLE IF EXISTS cpu_core_samples")
+            conn.execute(
+                """CREATE TABLE cpu_core_samples
+                (Cpu_Usage_ID INTEGER, Core INTEGER, Percentage REAL,
+                PRIMARY KEY (Cpu_Usage_ID, Core),
+                FOREIGN KEY (Cpu_Usage_ID) REFERENCES cpu_usage (id)) WITHOUT ROWID"""
+            )
+        last_rowid = 0
+        while True:
+            with conn:
+                (batch_end,) = conn.execute(
+                    """SELECT max(rowid) FROM (SELECT rowid FROM cpu_usage
+                    WHERE rowid > ? ORDER BY rowid LIMIT ?)""",
+                    (last_rowid, Migrations.BATCH_SIZE),
+                ).fetchone()
+                if batch_end is None:
+                    break
+                for column in core_columns:
+                    conn.execute(
+                        f"""INSERT INTO cpu_core_samples (Cpu_Usage_ID, Core, Percentage)
+                        SELECT id, {int(column[5:])}, {column} FROM cpu_usage
+                        WHERE rowid > ? AND rowid <= ? AND {column} IS NOT NULL""",
+                        (last_rowid, batch_end),
+                    )
+            last_rowid = batch_end
+        Migrations.rebuild(
+            conn,
+            "cpu_usage",
+            """id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Current_Frequency REAL, Total_Cpu_Usage REAL,
+            Snapshot_ID INTEGER, Extracted_Time INTEGER, Sys_ID TEXT,
+            FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID)""",
+            {},
+        )
+
+    @staticmethod
+    def _metric_sizes(conn):
+        """
+        Version 10: collector_metrics gets a Size, added in place rather than
+        rebuilt since existing rows have none
+        """
+        if not Migrations._table_exists(conn, "collector_metrics"):
+            return
+        if "Size" not in Migrations._columns(conn, "collector_metrics"):
+            with conn:
+                conn.execute("ALTER TABLE collector_metrics ADD COLUMN Size INTEGER")
+
+    @staticmethod
+    def _sample_validity(conn):
+        """
+        Version 11: process_samples get the Sys_ID of their process and a
+        Valid_Until_Snapshot_ID, the next sample of the same process or the
+        process's exit, filled in rowid batches
+        """
+        if not Migrations._table_exists(conn, "process_samples"):
+            return
+        # Schema.STILL_VALID, the end of samples that still hold
+        still_valid = 9223372036854775807
+        columns = Migrations._columns(conn, "process_samples")
+        with conn:
+            for column in (
+                "Sys_ID TEXT",
+                f"Valid_Until_Snapshot_ID INTEGER NOT NULL DEFAULT {still_valid}",
+            ):
+                if column.split()[0] not in columns:
+                    conn.execute(f"ALTER TABLE process_samples ADD COLUMN {column}")
+            # Finds the next sample of each row, Schema creates it under this name too
+            conn.execute(
+                """CREATE INDEX IF NOT EXISTS idx_process_samples_key
+                ON process_samples (Process_Key, Snapshot_ID)"""
+            )
+        last_rowid = 0
+        while True:
+            with conn:
+                (batch_end,) = conn.execute(
+                    """SELECT max(rowid) FROM (SELECT rowid FROM process_samples
+                    WHERE rowid > ? ORDER BY rowid LIMIT ?)""",
+                    (last_rowid, Migrations.BATCH_SIZE),
+                ).fetchone()
+                if batch_end is None:
+                    break
+                conn.execute(
+                    """UPDATE process_samples SET
+                    Sys_ID = (SELECT Sys_ID FROM processes p
+                    WHERE p.Process_Key = process_samples.Process_Key),
+                    Valid_Until_Snapshot_ID = coalesce(
+                    (SELECT min(g.Snapshot_ID) FROM process_samples g
+                    WHERE g.Process_Key = process_samples.Process_Key
+                    AND g.Snapshot_ID > process_samples.Snapshot_ID),
+                    (SELECT Exit_Snapshot_ID FROM processes p
+                    WHERE p.Process_Key = process_samples.Process_Key), ?)
+                    WHERE rowid > ? AND rowid <= ?""",
+                    (still_valid, last_rowid, batch_end),
+                )
+            last_rowid = batch_end
+
+    STEPS = {
+        2: "_typed_numeric_columns",
+        3: "_epoch_timestamps",
+        6: "_change_only_processes",
+        7: "_snapshots_per_host",
+        9: "_long_cpu_cores",
+        10: "_metric_sizes",
+        11: "_sample_validity",
+    }
+
+    @staticmethod
+    def upgrade(conn, version: int, target: int) -> None:
+        """Run every step between `version` and `target`, recording each one"""
+        if version == 0:
+            if not any(Migrations._table_exists(conn, t) for t in _LEGACY_TABLES):
+                # Fresh database, Schema creates everything at the latest version
+                return
+            # Tables written before versioning have the version 1 layout
+            version = 1
+        # Views are recreated by Schema once the tables are in their final shape
+        views = conn.execute("SELECT name FROM sqlite_master WHERE type = 'view'")
+        with conn:
+            for (view,) in views.fetchall():
+                conn.execute(f"DROP VIEW IF EXISTS {view}")
+        for step_version in range(version + 1, target + 1):
+            # Versions that only add tables have no step, Schema creates them
+            if step_version in Migrations.STEPS:
+                getattr(Migrations, Migrations.STEPS[step_version])(conn)
+            conn.execute(f"PRAGMA user_version = {step_version}")
@@ -0,0 +1,117 @@
+import json
+import os
+
+
+class Gemini_Backend:
+    """Google Gemini, the model chat_with_os uses in production"""
+
+    def __init__(self, model_name: str) -> None:
+        import google.generativeai as genai
+
+        genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
+        self._model = genai.GenerativeModel(
+            model_name, generation_config={"temperature": 0.0}
+        )
+
+    def generate(self, prompt: str, user_query: str) -> str:
+        return self._model.generate_content(prompt).text
+
+
+class Stub_Backend:
+    """
+    Local deterministic stand-in for tests and benchmarks, answers from
+    canned SQL picked by the first keyword found in the question
+    """
+
+    RESPONSES = {
+        # History questions, over the hour or minutes before the newest snapshot
+        "last hour": (
+            """SELECT Process_Name, avg(CPU_Usage) AS Avg_Cpu_Usage FROM task_manager
+            WHERE Extracted_Time >=
+            (SELECT max(Extracted_Time) FROM latest_snapshots) - 3600
+            GROUP BY Process_Name ORDER BY Avg_Cpu_Usage DESC LIMIT 10""",
+            ["Process_Name", "Avg_Cpu_Usage"],
+        ),
+        "history": (
+            """SELECT Extracted_Time, PID, CPU_Usage FROM task_manager
+            WHERE Process_Name =
+            (SELECT Process_Name FROM top_processes_by_cpu WHERE Rank = 1)
+            AND Extracted_Time >=
+            (SELECT max(Extracted_Time) FROM latest_snapshots) - 600
+            ORDER BY PID, Extracted_Time""",
+            ["Extracted_Time", "PID", "CPU_Usage"],
+        ),
+        "trend": (
+            """SELECT Extracted_Time, Percentage FROM ram_usage
+            WHERE Extracted_Time >=
+            (SELECT max(Extracted_Time) FROM latest_snapshots) - 3600
+            ORDER BY Extracted_Time""",
+            ["Extracted_Time", "Percentage"],
+        ),
+        "memory": (
+            """SELECT Process_Name, PID, Memory_Usage FROM top_processes_by_memory
+            ORDER BY Rank LIMIT 10""",
+            ["Process_Name", "PID", "Memory_Usage"],
+        ),
+        "core": (
+            """SELECT Core, Percentage FROM latest_cpu_core_usage
+            ORDER BY Percentage DESC LIMIT 10""",
+            ["Core", "Percentage"],
+        ),
+        "cpu": (
+            "SELECT Total_Cpu_Usage, Current_Frequency FROM latest_cpu_usage",
+            ["Total_Cpu_Usage", "Current_Frequency"],
+        ),
+        "disk": (
+            """SELECT DISTINCT Device, Mount_Point, Percentage FROM latest_disk_usage
+            ORDER BY Percentage DESC""",
+            ["Device", "Mount_Point", "Percentage"],
+        ),
+    }
+
+    DEFAULT = (
+        """SELECT Process_Name, PID, CPU_Usage, Memory_Usage FROM top_processes_by_cpu
+        ORDER BY Rank LIMIT 10""",
+        ["Process_Name", "PID", "CPU_Usage", "Memory_Usage"],
+    )
+
+    def __init__(self, responses: dict = None) -> None:
+        self._responses = responses or self.RESPONSES
+        self.calls = 0
+
+    def generate(self, prompt: str, user_query: str) -> str:
+        self.calls += 1
+        question = user_query.lower()
+        sql_query, column_headers = next(
+            (
+                response
+                for keyword, response in self._responses.items()
+                if keyword in question
+            ),
+            self.DEFAULT,
+        )
+        return json.dumps(
+            {
+                "user_query": user_query,
+                "sql_query": " ".join(sql_query.split()),
+                "column_headers": column_headers,
+            }
+        )
+
+
+def parse_response(response_text: str):
+    """The model's JSON answer, or None for a Markdown answer to a general question"""
+    try:
+        answer = json.loads(response_text.replace("```", "").replace("json", ""))
+    except json.JSONDecodeError:
+        return None
+    return answer if isinstance(answer, dict) else None
+
+
+def create_backend(name: str, model_name: str):
+    """Build the backend selected by Config.model_backend()"""
+    if name == "stub":
+        return Stub_Backend()
+    if name == "gemini":
+        return Gemini_Backend(model_name)
+    raise ValueError(f"Unknown model backend: {name}")
@@ -0,0 +1,60 @@
+import threading
+import time
+
+
+class _Call(threading.Thread):
+    """One probe call on a daemon thread, so a hung call never blocks exit"""
+
+    def __init__(self, name: str, function) -> None:
+        super().__init__(name=f"probe-{name}", daemon=True)
+        self._function = function
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self._function()
+        except Exception as error:
+            self.error = error
+
+
+class Probe_Scheduler:
+    """
+    Run independent probes at the same time, each with its own timeout.
+
+    Every call starts on its own daemon thread and is waited for until its
+    timeout, counted from the common start. A call that times out is left
+    running and that probe is skipped on later runs until it returns, so a
+    hung mount costs one thread rather than one thread per run.
+    """
+
+    def __init__(self) -> None:
+        self._hung = {}
+        self.timed_out = []
+        self.skipped = []
+
+    def run(self, calls: dict) -> dict:
+        """
+        `calls` maps a name to (function, timeout in seconds). Returns the
+        finished calls by name, check `.error` before using `.result`
+        """
+        self._hung = {
+            name: call for name, call in self._hung.items() if call.is_alive()
+        }
+        self.skipped = [name for name in calls if name in self._hung]
+        self.timed_out = []
+        started = {}
+        for name, (function, _) in calls.items():
+            if name not in self._hung:
+                started[name] = _Call(name, function)
+                started[name].start()
+        start = time.monotonic()
+        finished = {}
+        for name, call in started.items():
+            call.join(max(0.0, start + calls[name][1] - time.monotonic()))
+            if call.is_alive():
+                self._hung[name] = call
+                self.timed_out.append(name)
+            else:
+                finished[name] = call
+        return finished
@@ -0,0 +1,95 @@
+import os
+import time
+from collections import namedtuple
+import psutil
+
+Process_Sample = namedtuple(
+    "Process_Sample",
+    [
+        "pid",
+        "name",
+        "create_time",
+        "cpu_percent",
+        "rss",
+        "memory_percent",
+        "disk_usage",
+    ],
+)
+
+
+class Process_Sampler:
+    """
+    Sample every process in linear time.
+
+    CPU counters are primed for all processes, then a single sleep covers
+    the whole sample window instead of one sleep per process. Once primed,
+    later calls measure since the previous sample and do not sleep at all.
+    """
+
+    def __init__(self, interval: float = 0.1, psutil_module=None) -> None:
+        self._interval = interval
+        self._primed = False
+        self._psutil = psutil_module or psutil
+        self._skipped = (
+            self._psutil.NoSuchProcess,
+            self._psutil.AccessDenied,
+            self._psutil.ZombieProcess,
+        )
+
+    def _prime(self):
+        # process_iter keeps the Process objects alive between calls, so the
+        # counters primed here are the ones read back in sample()
+        for proc in self._psutil.process_iter():
+            try:
+                proc.cpu_percent(interval=None)
+            except self._skipped:
+                continue
+        self._primed = True
+
+    def _open_files_size(self, proc, file_sizes: dict) -> int:
+        total = 0
+        for file in proc.open_files():
+            size = file_sizes.get(file.path)
+            if size is None:
+                try:
+                    size = os.path.getsize(file.path)
+                except OSError:
+                    size = 0
+                file_sizes[file.path] = size
+            total += size
+        return total
+
+    def sample(self):
+        """Return a Process_Sample per live process, read in one process_iter pass"""
+        if not self._primed:
+            self._prime()
+            time.sleep(self._interval)
+        samples = []
+        # Each file is only stat'ed once per run however many processes hold it
+        file_sizes = {}
+        for proc in self._psutil.process_iter():
+            try:
+                with proc.oneshot():
+                    name = proc.name()
+                    create_time = proc.create_time()
+                    cpu_percent = proc.cpu_percent(interval=None)
+                    rss = proc.memory_info().rss
+                    memory_percent = proc.memory_percent()
+                    try:
+                        disk_usage = self._open_files_size(proc, file_sizes)
+                    except self._psutil.AccessDenied:
+                        disk_usage = 0
+            except self._skipped:
+                continue
+            samples.append(
+                Process_Sample(
+                    proc.pid,
+                    name,
+                    create_time,
+                    cpu_percent,
+                    rss,
+                    memory_percent,
+                    disk_usage,
+                )
+            )
+        return samples
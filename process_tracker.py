@@ -0,0 +1,118 @@
+from schema import Schema
+from snapshot_writer import Snapshot
+
+# One upsert for both appearances and exits, so within a buffered snapshot
+# they are applied in the order they were collected
+PROCESS_SQL = """INSERT INTO processes
+(Sys_ID, PID, Start_Time, Process_Name, First_Snapshot_ID, Exit_Snapshot_ID)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (Sys_ID, PID, Start_Time, Process_Name)
+DO UPDATE SET Exit_Snapshot_ID = excluded.Exit_Snapshot_ID"""
+
+PROCESS_SAMPLE_SQL = """INSERT INTO process_samples
+(Process_Key, CPU_Usage, Memory_Usage, Memory_Percentage, Disk_Usage,
+Snapshot_ID, Extracted_Time)
+SELECT Process_Key, ?, ?, ?, ?, ?, ? FROM processes
+WHERE Sys_ID = ? AND PID = ? AND Start_Time = ? AND Process_Name = ?"""
+
+
+class Process_Tracker:
+    """
+    Turn per-run process samples into change-only rows.
+
+    A process is identified by (pid, start time, name). It gets a
+    `processes` row when it appears and its Exit_Snapshot_ID when it is
+    gone, and a `process_samples` row only when it appears or its CPU moves
+    by `cpu_threshold` points or its memory or disk usage by
+    `memory_threshold` of the last value written. The task_manager view
+    carries the last written values forward to every snapshot in between.
+    """
+
+    CPU_THRESHOLD = 1.0
+    MEMORY_THRESHOLD = 0.05
+
+    def __init__(
+        self,
+        sys_id: str,
+        cpu_threshold: float = CPU_THRESHOLD,
+        memory_threshold: float = MEMORY_THRESHOLD,
+    ) -> None:
+        self._sys_id = sys_id
+        self._cpu_threshold = cpu_threshold
+        self._memory_threshold = memory_threshold
+        # (pid, start time, name) => (cpu, rss, disk usage) last written
+        self._written = {}
+        self._pending = None
+
+    def load(self, conn):
+        """Pick up the live processes and their last values from the database"""
+        rows = conn.execute(
+            """SELECT p.PID, p.Start_Time, p.Process_Name,
+            f.CPU_Usage, f.Memory_Usage, f.Disk_Usage
+            FROM processes p JOIN process_samples f ON f.Process_Key = p.Process_Key
+            AND f.Valid_Until_Snapshot_ID = ?
+            WHERE p.Sys_ID = ? AND p.Exit_Snapshot_ID IS NULL""",
+            (Schema.STILL_VALID, self._sys_id),
+        )
+        self._written = {
+            (pid, start_time, name): (cpu, rss, disk_usage)
+            for pid, start_time, name, cpu, rss, disk_usage in rows
+        }
+
+    def _moved(self, old: float, new: float) -> bool:
+        if not old:
+            return bool(new)
+        return abs(new - old) > abs(old) * self._memory_threshold
+
+    def _changed(self, written, sample) -> bool:
+        cpu, rss, disk_usage = written
+        return (
+            abs(sample.cpu_percent - cpu) >= self._cpu_threshold
+            or self._moved(rss, sample.rss)
+            or self._moved(disk_usage, sample.disk_usage)
+        )
+
+    def add(self, snapshot: Snapshot, samples, run) -> int:
+        """
+        Add the rows of one run to the snapshot, returns the samples written.
+        They only count as written once commit() is called
+        """
+        snapshot_id, extracted_time, _ = run
+        process_rows, sample_rows = [], []
+        seen = set()
+        pending = dict(self._written)
+        for sample in samples:
+            key = (sample.pid, sample.create_time, sample.name)
+            seen.add(key)
+            written = pending.get(key)
+            if written is None:
+                process_rows.append((self._sys_id, *key, snapshot_id, None))
+            elif not self._changed(written, sample):
+                continue
+            pending[key] = (sample.cpu_percent, sample.rss, sample.disk_usage)
+            sample_rows.append(
+                (
+                    sample.cpu_percent,
+                    sample.rss,
+                    sample.memory_percent,
+                    sample.disk_usage,
+                    snapshot_id,
+                    extracted_time,
+                    self._sys_id,
+                    *key,
+                )
+            )
+        for key in [key for key in pending if key not in seen]:
+            del pending[key]
+            process_rows.append((self._sys_id, *key, snapshot_id, snapshot_id))
+        # Both statements are registered even when empty, which keeps them in
+        # this order when several runs share a buffered snapshot
+        snapshot.extend_sql(PROCESS_SQL, process_rows)
+        snapshot.extend_sql(PROCESS_SAMPLE_SQL, sample_rows)
+        self._pending = pending
+        return len(sample_rows)
+
+    def commit(self):
+        """The rows of the last add() made it into the snapshot that is written"""
+        if self._pending is not None:
+            self._written, self._pending = self._pending, None
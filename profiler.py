@@ -0,0 +1,101 @@
+import contextlib
+import re
+import time
+import uuid
+
+# Columns of collector_metrics, in the order of Profiler.rows()
+METRIC_COLUMNS = (
+    "Source",
+    "Stage",
+    "Duration_Ms",
+    "Size",
+    "Snapshot_ID",
+    "Extracted_Time",
+    "Sys_ID",
+)
+
+
+def sys_id() -> str:
+    """This host's id, its MAC address as aa:bb:cc:dd:ee:ff"""
+    return ":".join(re.findall("..", "%012x" % uuid.getnode()))
+
+
+class Profiler:
+    """
+    Wall-clock spans around the stages of the collector or of a chat.
+
+    Spans are kept until drained into collector_metrics, each tagged with
+    the Snapshot_ID the owner was working on when the span started, and
+    optionally with the size of what the stage handled (e.g. prompt
+    characters for the model).
+    """
+
+    def __init__(self, source: str, host: str = None) -> None:
+        self._source = source
+        self._host = host or sys_id()
+        self._spans = []
+        # Spans of the current snapshot, kept for report() after a drain
+        self._recent = []
+        self.snapshot_id = None
+
+    @contextlib.contextmanager
+    def span(self, stage: str, size: int = None):
+        """Time the block, which may set the yielded span's "size" once it is known"""
+        started_at = time.time()
+        start = time.perf_counter()
+        measured = {"size": size}
+        try:
+            yield measured
+        finally:
+            self.record(
+                stage, (time.perf_counter() - start) * 1000, started_at, measured["size"]
+            )
+
+    def record(
+        self,
+        stage: str,
+        duration_ms: float,
+        started_at: float = None,
+        size: int = None,
+    ):
+        """Add a span measured elsewhere, e.g. the timeout of a probe that hung"""
+        span = (
+            stage,
+            duration_ms,
+            size,
+            self.snapshot_id,
+            int(time.time() if started_at is None else started_at),
+        )
+        self._spans.append(span)
+        if self._recent and self._recent[-1][3] != self.snapshot_id:
+            self._recent = []
+        self._recent.append(span)
+
+    def new_report(self):
+        """Start report() afresh, e.g. for the next question of a chat session"""
+        self._recent = []
+
+    def drain(self) -> list:
+        """collector_metrics rows of every span so far, which are then forgotten"""
+        rows = [
+            (
+                self._source,
+                stage,
+                round(duration_ms, 3),
+                size,
+                snapshot_id,
+                started_at,
+                self._host,
+            )
+            for stage, duration_ms, size, snapshot_id, started_at in self._spans
+        ]
+        self._spans = []
+        return rows
+
+    def report(self) -> str:
+        """One line per span of the current snapshot, e.g. 'task_manager    812.40 ms'"""
+        return "\n".join(
+            f"{stage:<20}{duration_ms:>10.2f} ms"
+            + (f"{size:>10} size" if size is not None else "")
+            for stage, duration_ms, size, _, _ in self._recent
+        )
@@ -11,6 +11,15 @@ class Prompts:
                 Do not use SELECT *. Instead, specify the relevant column names.
                 Ensure that column names in the query are accurate and relevant based on the schema.
                 Always use distinct in the query when you are reteriving more data.
+                Sizes are stored as raw bytes, percentages as numbers between 0 and 100 and frequencies in MHz, so compare and aggregate them as numbers.
+                Extracted_Time is a unix epoch in seconds (UTC): filter time ranges with Extracted_Time >= CAST(strftime('%s', 'now', '-1 hour') AS INTEGER) and display it with datetime(Extracted_Time, 'unixepoch').
+                For questions about right now, read the latest_* tables first (latest_cpu_usage, latest_cpu_core_usage, latest_ram_usage, latest_disk_usage, latest_network_usage and latest_task_manager hold only the newest snapshot of each host) and top_processes_by_cpu, top_processes_by_memory and top_processes_by_disk (the top 20 processes of each host, ordered by Rank). They need no Snapshot_ID or time filter.
+                Every row carries the Snapshot_ID of the collection run it came from. When a question about the current state needs a history table, filter on Snapshot_ID = (SELECT Snapshot_ID FROM latest_snapshots WHERE Sys_ID = <table>.Sys_ID) instead of searching for the latest Extracted_Time.
+                The database may hold several hosts, told apart by Sys_ID (system_information.Mac_ID, named by Node_Name).
+                Raw tables only keep the last few days. For longer ranges use the rollup tables (<table>_per_minute, <table>_hourly, <table>_daily), which hold Samples and the _Min, _Avg, _Max and _P95 of each metric per Bucket_Start (unix epoch seconds).
+                cpu_usage holds one Total_Cpu_Usage and Current_Frequency per snapshot, per-core usage is in cpu_core_usage with one Percentage per Core (numbered from 0) and snapshot.
+                task_manager lists every live process at each snapshot. Its Network_Sent and Network_Received are system-wide counters, also found once per snapshot in network_usage, so use network_usage for network questions.
+                Questions about this tool's own speed or overhead are answered from collector_metrics, which holds one Duration_Ms per Stage of each collection run (Source 'collector') or chat answer (Source 'chat'), with the prompt Size in characters for the chat stages schema and model.
             Response Format for Data Retrieval Queries:
                 Always return your response in the following JSON format:
                     "user_query": "Repeat the user’s query",
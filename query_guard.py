@@ -0,0 +1,188 @@
+import re
+import sqlite3
+import time
+
+
+class Guarded_Cursor:
+    """
+    Cursor wrapper that turns a budget interrupt into the end of the result,
+    so the rows fetched before it are still returned
+    """
+
+    def __init__(self, cursor, guard) -> None:
+        self._cursor = cursor
+        self._guard = guard
+        self.interrupted = False
+
+    @property
+    def description(self):
+        # None when the budget ran out before the statement returned a row
+        return self._cursor.description or ()
+
+    def fetchone(self):
+        if self.interrupted:
+            return None
+        try:
+            return self._cursor.fetchone()
+        except sqlite3.OperationalError:
+            if not self._guard.exceeded:
+                raise
+            self.interrupted = True
+            return None
+
+    def fetchmany(self, size: int):
+        rows = []
+        while len(rows) < size:
+            row = self.fetchone()
+            if row is None:
+                break
+            rows.append(row)
+        return rows
+
+
+class Query_Guard:
+    """
+    Run model-generated SQL on a read-only connection within a budget.
+
+    Before running, EXPLAIN QUERY PLAN is checked for full scans of tables
+    with more than `large_table_rows` rows and a LIMIT is appended when the
+    statement has none. While running, a progress handler interrupts the
+    query after `time_budget` seconds or `step_budget` VM instructions,
+    0 disables either budget.
+    """
+
+    # How many VM instructions run between two progress handler calls
+    CHECK_EVERY = 10000
+    ALIAS_PATTERN = re.compile(
+        r"\b(?:FROM|JOIN|,)\s*(\w+)\s+(?:AS\s+)?(\w+)", re.IGNORECASE
+    )
+    LIMIT_PATTERN = re.compile(
+        r"\bLIMIT\s+(\d+|\?)(\s*(,|OFFSET)\s*(\d+|\?))?\s*$", re.IGNORECASE
+    )
+    # WITHOUT ROWID tables have no max(rowid), their key gives the estimate:
+    # cpu_usage rows times the cores of the last one
+    KEYED_ROW_ESTIMATES = {
+        "cpu_core_samples": """SELECT max(Cpu_Usage_ID) * count(*) FROM cpu_core_samples
+        WHERE Cpu_Usage_ID = (SELECT max(Cpu_Usage_ID) FROM cpu_core_samples)""",
+    }
+
+    def __init__(
+        self,
+        db_path: str,
+        time_budget: float = 10.0,
+        step_budget: int = 0,
+        large_table_rows: int = 100000,
+    ) -> None:
+        self._db_path = db_path
+        self._time_budget = time_budget
+        self._step_budget = step_budget
+        self._large_table_rows = large_table_rows
+        self._conn = None
+        self._started = None
+        self._deadline = None
+        self._steps = 0
+        self.exceeded = None
+
+    def connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                f"file:{self._db_path}?mode=ro", uri=True, check_same_thread=False
+            )
+            self._conn.execute("PRAGMA query_only = ON")
+        return self._conn
+
+    @staticmethod
+    def strip(sql: str) -> str:
+        return sql.strip().rstrip(";").strip()
+
+    def with_limit(self, sql: str, limit: int) -> str:
+        """'SELECT * FROM cpu_usage' => 'SELECT * FROM cpu_usage\\nLIMIT 1001'"""
+        sql = self.strip(sql)
+        if not limit or self.LIMIT_PATTERN.search(sql):
+            return sql
+        # On its own line so a trailing -- comment can not swallow it
+        return f"{sql}\nLIMIT {limit}"
+
+    def _row_estimate(self, table: str):
+        sql = self.KEYED_ROW_ESTIMATES.get(table, f'SELECT max(rowid) FROM "{table}"')
+        try:
+            (rows,) = self.connection().execute(sql).fetchone()
+        except sqlite3.Error:
+            return None
+        return rows or 0
+
+    def _aliases(self, sql: str) -> dict:
+        """'FROM task_manager a, task_manager AS b' => {'a': 'task_manager', ...}"""
+        tables = {
+            name
+            for (name,) in self.connection().execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        return {
+            alias: table
+            for table, alias in self.ALIAS_PATTERN.findall(sql)
+            if table in tables
+        }
+
+    def full_scans(self, sql: str) -> list:
+        """
+        Tables over large_table_rows the plan walks end to end, SEARCH steps
+        use an index and are left alone while a SCAN reads every row (or
+        every index entry)
+        """
+        aliases = self._aliases(sql)
+        flagged = {}
+        for row in self.connection().execute(f"EXPLAIN QUERY PLAN {sql}"):
+            # 'SCAN a', or 'SCAN TABLE task_manager AS a' before SQLite 3.36
+            match = re.match(r"SCAN (?:TABLE )?(\w+)", row[-1])
+            if match is None:
+                continue
+            table = match.group(1)
+            table = aliases.get(table, table)
+            rows = self._row_estimate(table)
+            if rows is not None and rows > self._large_table_rows:
+                flagged[table] = rows
+        return list(flagged.items())
+
+    def _progress(self) -> int:
+        self._steps += self.CHECK_EVERY
+        if self._step_budget and self._steps > self._step_budget:
+            self.exceeded = f"{self._step_budget} VM steps"
+        elif self._deadline is not None and time.monotonic() > self._deadline:
+            self.exceeded = f"{self._deadline - self._started:g} seconds"
+        return 1 if self.exceeded else 0
+
+    def execute(self, sql: str, limit: int = 0, time_budget: float = None):
+        """
+        Return a Guarded_Cursor and the warnings about the plan, the
+        budget covers fetching as well since SQLite steps lazily
+        """
+        if time_budget is None:
+            time_budget = self._time_budget
+        conn = self.connection()
+        sql = self.with_limit(sql, limit)
+        warnings = [
+            f"Query scans all ~{rows} rows of {table}, "
+            "filtering on Snapshot_ID or Extracted_Time would use an index"
+            for table, rows in self.full_scans(sql)
+        ]
+        self._started = time.monotonic()
+        self._deadline = self._started + time_budget if time_budget else None
+        self._steps = 0
+        self.exceeded = None
+        conn.set_progress_handler(self._progress, self.CHECK_EVERY)
+        raw_cursor = conn.cursor()
+        cursor = Guarded_Cursor(raw_cursor, self)
+        try:
+            raw_cursor.execute(sql)
+        except sqlite3.OperationalError:
+            if not self.exceeded:
+                raise
+            cursor.interrupted = True
+        return cursor, warnings
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
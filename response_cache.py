@@ -0,0 +1,133 @@
+import contextlib
+import hashlib
+import json
+import re
+import sqlite3
+import time
+
+
+class Response_Cache:
+    """
+    Persistent cache of the model's parsed JSON answer.
+
+    Entries are keyed on the normalized question plus a hash of the schema
+    text, so a schema change invalidates them. Entries expire after `ttl`
+    seconds and the least recently used ones are evicted beyond
+    `max_entries`. Hits and misses are counted in memory and on disk.
+    """
+
+    def __init__(self, cache_path: str, ttl: float = 86400.0, max_entries: int = 1000):
+        self._cache_path = cache_path
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self._cache_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute(
+                    """CREATE TABLE IF NOT EXISTS responses
+                    (Cache_Key TEXT PRIMARY KEY, Question TEXT, Response TEXT,
+                    Created_At REAL, Last_Used REAL)"""
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (Last_Used)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS counters (Name TEXT PRIMARY KEY, Value INTEGER)"
+                )
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """'  Top 10 processes by Memory? ' => 'top 10 processes by memory'"""
+        return re.sub(r"\s+", " ", question.strip().lower()).rstrip("?.! ")
+
+    @staticmethod
+    def schema_hash(schema_text: str) -> str:
+        return hashlib.sha256(schema_text.encode()).hexdigest()
+
+    def _key(self, question: str, schema_hash: str) -> str:
+        return hashlib.sha256(
+            f"{self.normalize(question)}\0{schema_hash}".encode()
+        ).hexdigest()
+
+    def _count(self, name: str):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """INSERT INTO counters VALUES (?, 1)
+                ON CONFLICT (Name) DO UPDATE SET Value = Value + 1""",
+                (name,),
+            )
+
+    def get(self, question: str, schema_hash: str):
+        """Return the cached JSON answer, or None on a miss"""
+        conn = self._connect()
+        key = self._key(question, schema_hash)
+        now = time.time()
+        row = conn.execute(
+            "SELECT Response, Created_At FROM responses WHERE Cache_Key = ?", (key,)
+        ).fetchone()
+        if row and now - row[1] <= self._ttl:
+            with conn:
+                conn.execute(
+                    "UPDATE responses SET Last_Used = ? WHERE Cache_Key = ?", (now, key)
+                )
+            self.hits += 1
+            self._count("hits")
+            return json.loads(row[0])
+        if row:
+            with conn:
+                conn.execute("DELETE FROM responses WHERE Cache_Key = ?", (key,))
+        self.misses += 1
+        self._count("misses")
+        return None
+
+    def put(self, question: str, schema_hash: str, response: dict):
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (
+                    self._key(question, schema_hash),
+                    self.normalize(question),
+                    json.dumps(response),
+                    now,
+                    now,
+                ),
+            )
+            conn.execute(
+                """DELETE FROM responses WHERE Cache_Key IN
+                (SELECT Cache_Key FROM responses ORDER BY Last_Used DESC
+                LIMIT -1 OFFSET ?)""",
+                (self._max_entries,),
+            )
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        counters = dict(conn.execute("SELECT Name, Value FROM counters"))
+        (entries,) = conn.execute("SELECT count(*) FROM responses").fetchone()
+        return {
+            "entries": entries,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+        }
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM responses")
+            conn.execute("DELETE FROM counters")
+
+    def close(self):
+        if self._conn is not None:
+            with contextlib.suppress(sqlite3.Error):
+                self._conn.close()
+            self._conn = None
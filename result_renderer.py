@@ -0,0 +1,129 @@
+import csv
+import itertools
+import json
+import sys
+
+
+class Result_Renderer:
+    """
+    Stream query results from a sqlite cursor instead of materializing them.
+
+    `table` output renders a small result as Markdown through rich, and
+    anything larger as a fixed-width table written one page at a time, with
+    column widths estimated from the first page. `csv` and `jsonl` write
+    plain rows with no layout work and are meant for large results.
+    `max_rows` caps the rows written in any format, 0 means no cap.
+    """
+
+    OUTPUTS = ("table", "csv", "jsonl")
+
+    def __init__(
+        self,
+        output: str = "table",
+        page_size: int = 100,
+        max_rows: int = 1000,
+        stream=None,
+        console=None,
+        truncation_note: bool = True,
+    ) -> None:
+        if output not in self.OUTPUTS:
+            raise ValueError(f"Output must be one of {', '.join(self.OUTPUTS)}")
+        self._output = output
+        self._page_size = max(1, page_size)
+        self._max_rows = max_rows
+        self._stream = stream or sys.stdout
+        self._console = console
+        self._truncation_note = truncation_note
+        self.truncated = False
+
+    @staticmethod
+    def headers(cursor, column_headers=None):
+        """The model's column headers when they line up with the result, else the SQL names"""
+        names = [column[0] for column in cursor.description]
+        if column_headers and len(column_headers) == len(names):
+            return list(column_headers)
+        return names
+
+    def _pages(self, cursor):
+        remaining = self._max_rows or None
+        while remaining is None or remaining > 0:
+            size = self._page_size if remaining is None else min(self._page_size, remaining)
+            page = cursor.fetchmany(size)
+            if not page:
+                return
+            if remaining is not None:
+                remaining -= len(page)
+            yield page
+
+    @staticmethod
+    def format_row(values, widths) -> str:
+        return (
+            "| "
+            + " | ".join(str(value).ljust(width) for value, width in zip(values, widths))
+            + " |\n"
+        )
+
+    def _render_table(self, headers, pages) -> int:
+        first_page = next(pages, [])
+        widths = [
+            max(len(str(item)) for item in column)
+            for column in zip(headers, *first_page)
+        ]
+        separator = "|-" + "-|-".join("-" * width for width in widths) + "-|\n"
+        second_page = next(pages, None)
+        if second_page is None and self._console is not None:
+            # The whole result fits in one page, let rich lay it out
+            from rich.markdown import Markdown
+
+            self._console.print(
+                Markdown(
+                    self.format_row(headers, widths)
+                    + separator
+                    + "".join(self.format_row(row, widths) for row in first_page)
+                )
+            )
+            return len(first_page)
+        self._stream.write(self.format_row(headers, widths) + separator)
+        written = 0
+        for page in itertools.chain(
+            [first_page], [second_page] if second_page else [], pages
+        ):
+            self._stream.write("".join(self.format_row(row, widths) for row in page))
+            self._stream.flush()
+            written += len(page)
+        return written
+
+    def _render_csv(self, headers, pages) -> int:
+        writer = csv.writer(self._stream)
+        writer.writerow(headers)
+        written = 0
+        for page in pages:
+            writer.writerows(page)
+            written += len(page)
+        return written
+
+    def _render_jsonl(self, headers, pages) -> int:
+        written = 0
+        for page in pages:
+            self._stream.write(
+                "".join(json.dumps(dict(zip(headers, row))) + "\n" for row in page)
+            )
+            written += len(page)
+        return written
+
+    def render(self, cursor, column_headers=None) -> int:
+        """Write the cursor's rows, returns how many were written"""
+        headers = self.headers(cursor, column_headers)
+        pages = self._pages(cursor)
+        written = getattr(self, f"_render_{self._output}")(headers, pages)
+        self.truncated = bool(
+            self._max_rows and written >= self._max_rows and cursor.fetchone()
+        )
+        if self.truncated and self._truncation_note:
+            print(
+                f"Showing the first {written} rows, use --max-rows 0 "
+                "(ideally with --output csv or jsonl) for the full result",
+                file=sys.stderr,
+            )
+        self._stream.flush()
+        return written
@@ -0,0 +1,244 @@
+import math
+import time
+from schema import Schema
+
+
+class _P95:
+    """SQLite aggregate returning the nearest-rank 95th percentile"""
+
+    def __init__(self) -> None:
+        self._values = []
+
+    def step(self, value):
+        if value is not None:
+            self._values.append(value)
+
+    def finalize(self):
+        if not self._values:
+            return None
+        self._values.sort()
+        return self._values[math.ceil(0.95 * len(self._values)) - 1]
+
+
+class Retention:
+    """
+    Roll raw samples up into per-minute, hourly and daily tables, prune raw
+    rows past the horizon and hand the freed pages back incrementally.
+
+    Raw rows are only pruned once every resolution has rolled them up, so
+    the rollups are always computed from raw samples.
+    """
+
+    DAY = 86400
+    # Late rows (a daemon buffering its writes) still land in open buckets
+    ROLLUP_LAG = 120
+    # Largest time range aggregated in one transaction
+    ROLLUP_SPAN = DAY
+    DELETE_BATCH = 10000
+    VACUUM_PAGES = 2000
+
+    def __init__(
+        self,
+        conn,
+        raw_days: float = 2.0,
+        rollup_days: dict = None,
+    ) -> None:
+        self._conn = conn
+        self._raw_horizon = int(raw_days * self.DAY)
+        # Horizon per resolution in days, None keeps the rollup forever
+        self._rollup_days = rollup_days or {
+            "per_minute": 14,
+            "hourly": 180,
+            "daily": None,
+        }
+        conn.create_aggregate("p95", 1, _P95)
+
+    def _rolled_until(self, table: str, resolution: str):
+        row = self._conn.execute(
+            "SELECT Rolled_Until FROM rollup_state WHERE Table_Name = ? AND Resolution = ?",
+            (table, resolution),
+        ).fetchone()
+        if row:
+            return row[0]
+        (oldest,) = self._conn.execute(
+            f"SELECT min(Extracted_Time) FROM {table}"
+        ).fetchone()
+        if oldest is None:
+            return None
+        seconds = Schema.RESOLUTIONS[resolution]
+        return oldest // seconds * seconds
+
+    def rollup(self, table: str, resolution: str, now: int) -> int:
+        """Aggregate every complete bucket not rolled up yet, returns the rows written"""
+        key, metrics = Schema.ROLLUPS[table]
+        seconds = Schema.RESOLUTIONS[resolution]
+        start = self._rolled_until(table, resolution)
+        if start is None:
+            return 0
+        cutoff = (now - self.ROLLUP_LAG) // seconds * seconds
+        key_columns = [key] if key else []
+        columns = ", ".join(
+            [
+                "Bucket_Start",
+                "Sys_ID",
+                *key_columns,
+                "Samples",
+                *(
+                    f"{metric}_{stat}"
+                    for metric in metrics
+                    for stat in ("Min", "Avg", "Max", "P95")
+                ),
+            ]
+        )
+        aggregates = ", ".join(
+            f"min({metric}), avg({metric}), max({metric}), p95({metric})"
+            for metric in metrics
+        )
+        group_by = ", ".join(["Bucket_Start", "Sys_ID", *key_columns])
+        sql = f"""
+        INSERT OR REPLACE INTO {Schema.rollup_table(table, resolution)} ({columns})
+        SELECT Extracted_Time / {seconds} * {seconds} AS Bucket_Start, Sys_ID,
+        {''.join(f'{column}, ' for column in key_columns)}count(*), {aggregates}
+        FROM {table} WHERE Extracted_Time >= ? AND Extracted_Time < ?
+        GROUP BY {group_by}
+        """
+        written = 0
+        while start < cutoff:
+            end = min(cutoff, start + max(seconds, self.ROLLUP_SPAN))
+            with self._conn:
+                written += self._conn.execute(sql, (start, end)).rowcount
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rollup_state VALUES (?, ?, ?)",
+                    (table, resolution, end),
+                )
+            start = end
+        return written
+
+    def _delete_batches(self, sql: str, parameters) -> int:
+        """Delete in small committed batches so the collector is never blocked long"""
+        deleted = 0
+        while True:
+            with self._conn:
+                count = self._conn.execute(
+                    sql, (*parameters, self.DELETE_BATCH)
+                ).rowcount
+            deleted += count
+            if count < self.DELETE_BATCH:
+                return deleted
+
+    def _delete_before(self, table: str, column: str, cutoff: int) -> int:
+        return self._delete_batches(
+            f"""DELETE FROM {table} WHERE rowid IN
+            (SELECT rowid FROM {table} WHERE {column} < ? LIMIT ?)""",
+            (cutoff,),
+        )
+
+    def _prune_processes(self, cutoff: int) -> int:
+        """
+        task_manager is a view over change-only rows. Before the cutoff only
+        the last sample of each process is kept, it still holds afterwards,
+        and processes that exited before the cutoff go entirely
+        """
+        deleted = self._delete_batches(
+            """DELETE FROM process_samples WHERE id IN
+            (SELECT f.id FROM process_samples f WHERE f.Extracted_Time < ?
+            AND EXISTS (SELECT 1 FROM process_samples g
+            WHERE g.Process_Key = f.Process_Key AND g.Snapshot_ID > f.Snapshot_ID
+            AND g.Extracted_Time < ?) LIMIT ?)""",
+            (cutoff, cutoff),
+        )
+        # Snapshot ids are microseconds since the epoch
+        exited = cutoff * 1000000
+        deleted += self._delete_batches(
+            """DELETE FROM process_samples WHERE id IN
+            (SELECT f.id FROM processes p JOIN process_samples f
+            ON f.Process_Key = p.Process_Key WHERE p.Exit_Snapshot_ID < ? LIMIT ?)""",
+            (exited,),
+        )
+        deleted += self._delete_batches(
+            """DELETE FROM processes WHERE Process_Key IN
+            (SELECT Process_Key FROM processes WHERE Exit_Snapshot_ID < ? LIMIT ?)""",
+            (exited,),
+        )
+        return deleted
+
+    def _prune_cpu_cores(self, cutoff: int) -> int:
+        """The per-core rows of the cpu_usage rows about to be pruned"""
+        return self._delete_batches(
+            """DELETE FROM cpu_core_samples WHERE (Cpu_Usage_ID, Core) IN
+            (SELECT k.Cpu_Usage_ID, k.Core FROM cpu_usage c
+            JOIN cpu_core_samples k ON k.Cpu_Usage_ID = c.id
+            WHERE c.Extracted_Time < ? LIMIT ?)""",
+            (cutoff,),
+        )
+
+    def prune(self, now: int) -> int:
+        deleted = 0
+        # snapshots rows are kept as long as any raw table still references them
+        snapshots_cutoff = now - self._raw_horizon
+        for table in Schema.ROLLUPS:
+            rolled = [
+                self._conn.execute(
+                    "SELECT Rolled_Until FROM rollup_state WHERE Table_Name = ? AND Resolution = ?",
+                    (table, resolution),
+                ).fetchone()
+                for resolution in Schema.RESOLUTIONS
+            ]
+            if not all(rolled):
+                snapshots_cutoff = None
+                continue
+            # Never drop raw rows a resolution has not aggregated yet
+            cutoff = min(now - self._raw_horizon, *(row[0] for row in rolled))
+            if table == "task_manager":
+                deleted += self._prune_processes(cutoff)
+            elif table == "cpu_usage":
+                deleted += self._prune_cpu_cores(cutoff)
+                deleted += self._delete_before(table, "Extracted_Time", cutoff)
+            else:
+                deleted += self._delete_before(table, "Extracted_Time", cutoff)
+            if snapshots_cutoff is not None:
+                snapshots_cutoff = min(snapshots_cutoff, cutoff)
+        if snapshots_cutoff is not None:
+            deleted += self._delete_before("snapshots", "Extracted_Time", snapshots_cutoff)
+            deleted += self._delete_before(
+                "network_usage", "Extracted_Time", snapshots_cutoff
+            )
+        # Timing spans are not rolled up, they only live as long as raw samples
+        deleted += self._delete_before(
+            "collector_metrics", "Extracted_Time", now - self._raw_horizon
+        )
+        for resolution, days in self._rollup_days.items():
+            if days is None:
+                continue
+            for table in Schema.ROLLUPS:
+                deleted += self._delete_before(
+                    Schema.rollup_table(table, resolution),
+                    "Bucket_Start",
+                    now - int(days * self.DAY),
+                )
+        return deleted
+
+    def reclaim(self) -> int:
+        """Release up to VACUUM_PAGES free pages, a no-op unless auto_vacuum is INCREMENTAL"""
+        (auto_vacuum,) = self._conn.execute("PRAGMA auto_vacuum").fetchone()
+        if auto_vacuum != 2:
+            return 0
+        (free_pages,) = self._conn.execute("PRAGMA freelist_count").fetchone()
+        pages = min(free_pages, self.VACUUM_PAGES)
+        if pages:
+            # execute() only steps the pragma once, freeing a single page
+            self._conn.executescript(f"PRAGMA incremental_vacuum({pages});")
+        return pages
+
+    def apply(self, now: int = None) -> dict:
+        now = int(time.time()) if now is None else now
+        rolled_up = sum(
+            self.rollup(table, resolution, now)
+            for table in Schema.ROLLUPS
+            for resolution in Schema.RESOLUTIONS
+        )
+        return {
+            "rolled_up": rolled_up,
+            "pruned": self.prune(now),
+            "reclaimed_pages": self.reclaim(),
+        }
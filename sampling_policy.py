@@ -0,0 +1,90 @@
+class Sampling_Policy:
+    """
+    Interval until the next sample of the collector daemon, from what the
+    last one read.
+
+    While CPU, memory or disk usage is at or over its threshold the host
+    is busy and samples come every `min_interval` seconds, and keep
+    coming that fast for CALM_SAMPLES samples after it calms down, so an
+    incident that flaps is not sampled in bursts. While CPU and memory
+    stay under their idle thresholds the interval doubles on every
+    sample up to `max_interval`. Otherwise the daemon's own interval
+    applies. Readings that are missing (a probe that timed out) count as
+    neither busy nor idle.
+    """
+
+    # Percent of cpu, memory and the fullest disk
+    BUSY_THRESHOLDS = {"cpu": 80.0, "memory": 85.0, "disk": 90.0}
+    IDLE_THRESHOLDS = {"cpu": 10.0, "memory": 60.0}
+    CALM_SAMPLES = 3
+    BACKOFF = 2.0
+    # Default min_interval and max_interval, relative to the interval
+    MIN_FACTOR = 0.2
+    MAX_FACTOR = 6.0
+    MIN_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        interval: float,
+        min_interval: float = None,
+        max_interval: float = None,
+        busy_thresholds: dict = None,
+        idle_thresholds: dict = None,
+    ) -> None:
+        self._interval = interval
+        self._min_interval = min(
+            interval, min_interval or max(self.MIN_INTERVAL, interval * self.MIN_FACTOR)
+        )
+        self._max_interval = max(interval, max_interval or interval * self.MAX_FACTOR)
+        self._busy_thresholds = busy_thresholds or self.BUSY_THRESHOLDS
+        self._idle_thresholds = idle_thresholds or self.IDLE_THRESHOLDS
+        self._calm_samples = self.CALM_SAMPLES
+        self.current = interval
+        # "busy", "steady" or "idle", as of the last sample
+        self.state = "steady"
+
+    @staticmethod
+    def thresholds(spec: str, defaults: dict) -> dict:
+        """'cpu=70,disk=95' => `defaults` with cpu and disk replaced"""
+        thresholds = dict(defaults)
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            name, _, value = item.partition("=")
+            name = name.strip()
+            if name not in defaults:
+                raise ValueError(
+                    f"Unknown threshold {name!r}, expected one of {', '.join(defaults)}"
+                )
+            try:
+                thresholds[name] = float(value)
+            except ValueError:
+                raise ValueError(f"Threshold {name} must be a percentage") from None
+        return thresholds
+
+    def _busy(self, readings: dict) -> bool:
+        return any(
+            readings.get(name) is not None and readings[name] >= threshold
+            for name, threshold in self._busy_thresholds.items()
+        )
+
+    def _idle(self, readings: dict) -> bool:
+        return all(
+            readings.get(name) is not None and readings[name] < threshold
+            for name, threshold in self._idle_thresholds.items()
+        )
+
+    def next_interval(self, readings: dict) -> float:
+        """Seconds until the next sample, given the readings of the last one"""
+        if self._busy(readings):
+            self.state, self._calm_samples = "busy", 0
+            self.current = self._min_interval
+        elif self.state == "busy" and self._calm_samples < self.CALM_SAMPLES:
+            self._calm_samples += 1
+        elif self._idle(readings):
+            self.state = "idle"
+            self.current = min(
+                self._max_interval, max(self.current, self._interval) * self.BACKOFF
+            )
+        else:
+            self.state = "steady"
+            self.current = self._interval
+        return self.current
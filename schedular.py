@@ -1,54 +1,38 @@
 from crontab import CronTab
+from collector_daemon import Collector_Daemon
+from cron_expression import Cron_Expression
+from sampling_policy import Sampling_Policy
 import getpass
 import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
 
 
 class Schedular:
     def __init__(self) -> None:
         self._user_name = getpass.getuser()
-        self._python_version = os.popen("which python").read().strip()
+        self._python_path = None
         self._script_path = f"{os.getcwd()}/sql_lite.py"
 
-    def is_numeric_string(self, s):
-        if s.startswith("-"):
-            return s[1:].isdigit()
-        return s.isdigit()
+    @property
+    def _python_version(self):
+        # Resolved on first use with a PATH lookup instead of forking `which`
+        if self._python_path is None:
+            self._python_path = shutil.which("python") or sys.executable
+        return self._python_path
 
-    def is_valid_crontab_value(self, s):
-        return all(self.is_numeric_string(s) or c == "*" for c in s)
+    def _validate_crontab(self, time_data: str) -> Cron_Expression:
+        """Validate crontab time format, a schedule that never fires included"""
+        expression = Cron_Expression(time_data)
+        expression.next()
+        return expression
 
-    def _validate_crontab(self, time_data: str) -> bool:
-        """Validate crontab time format"""
-        crontab_format = time_data.split()
-        if not isinstance(time_data, str):
-            raise ValueError("Time should be a valid string")
-
-        if not len(crontab_format) == 5:
-            raise ValueError("Enter a valid crontab time format")
-
-        if not all(self.is_valid_crontab_value(item) for item in crontab_format):
-            raise ValueError("Crontab cannot have other string values except '*' ")
-
-        if self.is_numeric_string(crontab_format[0]):
-            minutes = int(crontab_format[0])
-            if not (0 <= minutes <= 59):
-                raise ValueError("Minutes must be between 0 and 59")
-
-        if self.is_numeric_string(crontab_format[1]):
-            if not (0 <= int(crontab_format[1]) <= 23):
-                raise ValueError("Hours must be between 0 and 23")
-
-        if self.is_numeric_string(crontab_format[2]):
-            if not (1 <= int(crontab_format[2]) <= 31):
-                raise ValueError("Day must be between 1 and 31")
-
-        if self.is_numeric_string(crontab_format[3]):
-            if not (1 <= int(crontab_format[3]) <= 12):
-                raise ValueError("Month must be between 1 and 12")
-
-        if self.is_numeric_string(crontab_format[4]):
-            if not (1 <= int(crontab_format[4]) <= 6):
-                raise ValueError("Day of the week must between 1 and 6")
+    def next_runs(self, time_data: str, count: int = 5) -> list:
+        """The next `count` times a schedule fires"""
+        return self._validate_crontab(time_data).next_times(count)
 
     def _remove_existing_jobs(self, job_schedular):
         """Remove existing jobs with the same command"""
@@ -101,3 +85,61 @@ class Schedular:
             job_schedular.write()
         else:
             raise ValueError("No job found with the specified old schedule")
+
+    def start_daemon(
+        self,
+        interval: float,
+        flush_every: int = 6,
+        spool: str = "",
+        adaptive: bool = False,
+        busy_threshold: str = "",
+        idle_threshold: str = "",
+    ):
+        """Start the resident collector in the background"""
+        if interval <= 0:
+            raise ValueError("Interval must be greater than 0 seconds")
+        if (busy_threshold or idle_threshold) and not adaptive:
+            raise ValueError(
+                "--busy-threshold and --idle-threshold only apply with --adaptive"
+            )
+        # Checked here, the daemon's own errors go nowhere
+        Sampling_Policy.thresholds(busy_threshold, Sampling_Policy.BUSY_THRESHOLDS)
+        Sampling_Policy.thresholds(idle_threshold, Sampling_Policy.IDLE_THRESHOLDS)
+        if Collector_Daemon.read_pid() is not None:
+            raise ValueError("Collector daemon is already running")
+        subprocess.Popen(
+            [
+                self._python_version,
+                self._script_path,
+                "--daemon",
+                "--interval",
+                str(interval),
+                "--flush-every",
+                str(flush_every),
+                *(["--spool", os.path.abspath(spool)] if spool else []),
+                *(["--adaptive"] if adaptive else []),
+                *(["--busy-threshold", busy_threshold] if busy_threshold else []),
+                *(["--idle-threshold", idle_threshold] if idle_threshold else []),
+            ],
+            cwd=os.path.dirname(self._script_path),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+    def stop_daemon(self, timeout: float = 30.0):
+        """Stop the resident collector, waiting for its final flush"""
+        pid = Collector_Daemon.read_pid()
+        if pid is None:
+            raise ValueError("Collector daemon is not running")
+        os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while Collector_Daemon.read_pid() == pid:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Collector daemon {pid} did not stop")
+            time.sleep(0.1)
+
+    def daemon_status(self):
+        """Return the pid of the resident collector, or None"""
+        return Collector_Daemon.read_pid()
@@ -0,0 +1,516 @@
+import os
+from migrations import Migrations
+
+
+class Schema:
+    # Bumped whenever the DDL below changes, stored in PRAGMA user_version.
+    # Sizes are stored in bytes, percentages as 0-100 and frequencies in MHz.
+    # Times are unix epoch seconds, and every row carries the Snapshot_ID of
+    # the collection run it came from
+    VERSION = 11
+
+    TIME_SERIES_TABLES = (
+        "cpu_usage",
+        "ram_usage",
+        "disk_usage",
+        "total_disk_usage",
+        "network_usage",
+    )
+
+    # Physical storage behind the task_manager and cpu_core_usage views,
+    # ingest bookkeeping and the wide per-core pivot, left out of the prompt
+    STORAGE_TABLES = (
+        "processes",
+        "process_samples",
+        "cpu_core_samples",
+        "ingest_state",
+        "cpu_usage_wide",
+    )
+
+    # Small tables holding only the newest snapshot of each host, rebuilt in
+    # the transaction that writes it (see Latest_Tables). They come first in
+    # the prompt, most questions are about right now.
+    # Table => (source table or view, columns copied from it)
+    LATEST_TABLES = {
+        "latest_cpu_usage": ("cpu_usage", "Current_Frequency REAL, Total_Cpu_Usage REAL"),
+        "latest_cpu_core_usage": ("cpu_core_usage", "Core INTEGER, Percentage REAL"),
+        "latest_ram_usage": (
+            "ram_usage",
+            """Free INTEGER, Used INTEGER, Percentage REAL,
+            Swap_Free INTEGER, Swap_Used INTEGER, Swap_Percentage REAL""",
+        ),
+        "latest_disk_usage": (
+            "disk_usage",
+            """Device TEXT, Mount_Point TEXT, File_System_Type TEXT,
+            Total_Size INTEGER, Used INTEGER, Free INTEGER, Percentage REAL""",
+        ),
+        "latest_network_usage": (
+            "network_usage",
+            "Bytes_Sent INTEGER, Bytes_Received INTEGER",
+        ),
+        "latest_task_manager": (
+            "task_manager",
+            """Process_Name TEXT, PID INTEGER, CPU_Usage REAL, Memory_Usage INTEGER,
+            Memory_Percentage REAL, Disk_Usage INTEGER""",
+        ),
+    }
+
+    # Top TOP_PROCESSES_N rows of latest_task_manager per host, by column
+    TOP_PROCESSES = {
+        "top_processes_by_cpu": "CPU_Usage",
+        "top_processes_by_memory": "Memory_Usage",
+        "top_processes_by_disk": "Disk_Usage",
+    }
+    TOP_PROCESSES_N = 20
+
+    # Described before every other table in the prompt
+    PROMPT_FIRST = (*LATEST_TABLES, *TOP_PROCESSES, "latest_snapshots")
+
+    LATEST_SNAPSHOTS = """
+    CREATE TABLE IF NOT EXISTS latest_snapshots
+    (Sys_ID TEXT PRIMARY KEY, Snapshot_ID INTEGER, Extracted_Time INTEGER);
+    """
+
+    # Rollup resolutions and their bucket size in seconds
+    RESOLUTIONS = {"per_minute": 60, "hourly": 3600, "daily": 86400}
+
+    # Source table => (grouping column or None, metrics rolled up)
+    ROLLUPS = {
+        "cpu_usage": (None, ("Total_Cpu_Usage", "Current_Frequency")),
+        "ram_usage": (None, ("Percentage", "Used", "Swap_Percentage", "Swap_Used")),
+        "disk_usage": ("Mount_Point", ("Percentage", "Used", "Free")),
+        "task_manager": (
+            "Process_Name",
+            ("CPU_Usage", "Memory_Usage", "Memory_Percentage"),
+        ),
+    }
+
+    # How far each spool segment has been ingested into a fleet database
+    INGEST_STATE = """
+    CREATE TABLE IF NOT EXISTS ingest_state
+    (Spool_Segment TEXT PRIMARY KEY, Offset INTEGER, Ingested_Time INTEGER);
+    """
+
+    ROLLUP_STATE = """
+    CREATE TABLE IF NOT EXISTS rollup_state
+    (Table_Name TEXT, Resolution TEXT, Rolled_Until INTEGER,
+    PRIMARY KEY (Table_Name, Resolution));
+    """
+
+    SYSTEM_INFORMATION = """
+    CREATE TABLE IF NOT EXISTS system_information
+    (Mac_ID TEXT PRIMARY KEY, System TEXT, Node_Name TEXT, Machine TEXT,
+    Processor TEXT, Processor_Model TEXT, Physcial_cores INT,
+    Total_cores INT, Max_Frequency REAL, Min_Frequency REAL,
+    Total_Memory INTEGER, Total_Swap_Memory INTEGER, Ip_Address TEXT);
+    """
+
+    # Snapshot ids are per host, a fleet database holds many hosts
+    SNAPSHOTS = """
+    CREATE TABLE IF NOT EXISTS snapshots
+    (Snapshot_ID INTEGER, Sys_ID TEXT, Extracted_Time INTEGER,
+    PRIMARY KEY (Snapshot_ID, Sys_ID),
+    FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID));
+    """
+
+    # One summary row per snapshot, the cores are in cpu_core_samples
+    CPU_USAGE = """
+    CREATE TABLE IF NOT EXISTS cpu_usage
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Current_Frequency REAL, Total_Cpu_Usage REAL,
+    Snapshot_ID INTEGER, Extracted_Time INTEGER, Sys_ID TEXT,
+    FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID));
+    """
+
+    # One row per core and snapshot, keyed on the cpu_usage row so it only
+    # stores three numbers
+    CPU_CORE_SAMPLES = """
+    CREATE TABLE IF NOT EXISTS cpu_core_samples
+    (Cpu_Usage_ID INTEGER, Core INTEGER, Percentage REAL,
+    PRIMARY KEY (Cpu_Usage_ID, Core),
+    FOREIGN KEY (Cpu_Usage_ID) REFERENCES cpu_usage (id)) WITHOUT ROWID;
+    """
+
+    # Every core of a snapshot in one statement whatever their number, the
+    # percentages are bound as one JSON array after the summary row
+    INSERT_CPU_CORES = """
+    INSERT INTO cpu_core_samples (Cpu_Usage_ID, Core, Percentage)
+    SELECT c.id, j.key, j.value FROM cpu_usage c, json_each(?) j
+    WHERE c.Snapshot_ID = ? AND c.Sys_ID = ?
+    """
+
+    CPU_CORE_USAGE = """
+    SELECT c.Snapshot_ID, c.Sys_ID, k.Core, k.Percentage, c.Extracted_Time
+    FROM cpu_core_samples k JOIN cpu_usage c ON c.id = k.Cpu_Usage_ID
+    """
+
+    RAM_USAGE = """
+    CREATE TABLE IF NOT EXISTS ram_usage
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Free INTEGER, Used INTEGER, Percentage REAL,
+    Swap_Free INTEGER, Swap_Used INTEGER, Swap_Percentage REAL,
+    Snapshot_ID INTEGER, Extracted_Time INTEGER, Sys_ID TEXT,
+    FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID));
+    """
+
+    DISK_USAGE = """
+    CREATE TABLE IF NOT EXISTS disk_usage
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Device TEXT, Mount_Point TEXT, File_System_Type TEXT ,
+    Total_Size INTEGER, Used INTEGER,
+    Free INTEGER, Percentage REAL,
+    Snapshot_ID INTEGER, Extracted_Time INTEGER, Sys_ID TEXT,
+    FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID));
+    """
+
+    TOTAL_DISK_USAGE = """
+    CREATE TABLE IF NOT EXISTS total_disk_usage
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Total_Read INTEGER, Total_Write INTEGER, Boot_Time INTEGER,
+    Snapshot_ID INTEGER, Extracted_Time INTEGER, Sys_ID TEXT,
+    FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID));
+    """
+
+    NETWORK_USAGE = """
+    CREATE TABLE IF NOT EXISTS network_usage
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Bytes_Sent INTEGER, Bytes_Received INTEGER,
+    Snapshot_ID INTEGER, Extracted_Time INTEGER, Sys_ID TEXT,
+    FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID));
+    """
+
+    # One row per process over its lifetime, Exit_Snapshot_ID is the first
+    # snapshot it was no longer seen in
+    PROCESSES = """
+    CREATE TABLE IF NOT EXISTS processes
+    (Process_Key INTEGER PRIMARY KEY, Sys_ID TEXT, PID INTEGER,
+    Start_Time REAL, Process_Name TEXT,
+    First_Snapshot_ID INTEGER, Exit_Snapshot_ID INTEGER,
+    UNIQUE (Sys_ID, PID, Start_Time, Process_Name));
+    """
+
+    # Written only when a process appears or its usage changes, each row
+    # holds until the next one of the same process or the process's exit,
+    # Valid_Until_Snapshot_ID (exclusive, STILL_VALID while it still holds)
+    STILL_VALID = 9223372036854775807
+
+    PROCESS_SAMPLES = f"""
+    CREATE TABLE IF NOT EXISTS process_samples
+    (id INTEGER PRIMARY KEY, Process_Key INTEGER,
+    CPU_Usage REAL, Memory_Usage INTEGER, Memory_Percentage REAL,
+    Disk_Usage INTEGER, Snapshot_ID INTEGER, Extracted_Time INTEGER,
+    Sys_ID TEXT, Valid_Until_Snapshot_ID INTEGER NOT NULL DEFAULT {STILL_VALID},
+    FOREIGN KEY (Process_Key) REFERENCES processes (Process_Key));
+    """
+
+    # Sys_ID and Valid_Until_Snapshot_ID are kept by triggers, so rows
+    # written by the collector, replayed from a spool or migrated all get them
+    PROCESS_SAMPLE_TRIGGERS = (
+        f"""CREATE TRIGGER IF NOT EXISTS process_samples_replace
+        AFTER INSERT ON process_samples
+        BEGIN
+            UPDATE process_samples SET Valid_Until_Snapshot_ID = NEW.Snapshot_ID
+            WHERE Process_Key = NEW.Process_Key AND Valid_Until_Snapshot_ID = {STILL_VALID}
+            AND Snapshot_ID < NEW.Snapshot_ID;
+            UPDATE process_samples SET Sys_ID =
+            (SELECT Sys_ID FROM processes WHERE Process_Key = NEW.Process_Key)
+            WHERE id = NEW.id AND NEW.Sys_ID IS NULL;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS process_samples_exit
+        AFTER UPDATE OF Exit_Snapshot_ID ON processes
+        WHEN NEW.Exit_Snapshot_ID IS NOT NULL
+        BEGIN
+            UPDATE process_samples SET Valid_Until_Snapshot_ID = NEW.Exit_Snapshot_ID
+            WHERE Process_Key = NEW.Process_Key AND Valid_Until_Snapshot_ID = {STILL_VALID};
+        END""",
+    )
+
+    # The task_manager table as it used to be stored, one row per live
+    # process and snapshot with the values last written for it. Snapshots
+    # drive the join, each finding the samples valid at it from the
+    # covering idx_process_samples_valid, so a time-bounded query reads the
+    # samples of its window rather than the whole history
+    TASK_MANAGER = """
+    SELECT p.Process_Name, p.PID, f.CPU_Usage, f.Memory_Usage,
+    f.Memory_Percentage, f.Disk_Usage,
+    n.Bytes_Sent AS Network_Sent, n.Bytes_Received AS Network_Received,
+    s.Snapshot_ID, s.Extracted_Time, s.Sys_ID
+    FROM snapshots s
+    CROSS JOIN process_samples f ON f.Sys_ID = s.Sys_ID
+    AND f.Snapshot_ID <= s.Snapshot_ID
+    AND f.Valid_Until_Snapshot_ID > s.Snapshot_ID
+    JOIN processes p ON p.Process_Key = f.Process_Key
+    LEFT JOIN network_usage n ON n.Snapshot_ID = s.Snapshot_ID
+    AND n.Sys_ID = s.Sys_ID
+    """
+
+    # Timing spans of the collector's probes and of chat stages, Size is
+    # what the stage handled when it matters (prompt characters of a chat)
+    COLLECTOR_METRICS = """
+    CREATE TABLE IF NOT EXISTS collector_metrics
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Source TEXT, Stage TEXT, Duration_Ms REAL, Size INTEGER,
+    Snapshot_ID INTEGER, Extracted_Time INTEGER, Sys_ID TEXT);
+    """
+
+    @staticmethod
+    def column_names(columns_definition: str) -> list:
+        """'Free INTEGER, Used INTEGER' => ['Free', 'Used']"""
+        return [column.split()[0] for column in columns_definition.split(",")]
+
+    @staticmethod
+    def latest_tables() -> list:
+        """DDL of the latest_* and top_processes_by_* tables"""
+        run_columns = "Snapshot_ID INTEGER, Extracted_Time INTEGER, Sys_ID TEXT"
+        statements = [Schema.LATEST_SNAPSHOTS]
+        for table, (_, columns) in Schema.LATEST_TABLES.items():
+            statements.append(
+                f"CREATE TABLE IF NOT EXISTS {table} ({columns}, {run_columns})"
+            )
+        _, process_columns = Schema.LATEST_TABLES["latest_task_manager"]
+        for table in Schema.TOP_PROCESSES:
+            statements.append(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                f"(Rank INTEGER, {process_columns}, {run_columns})"
+            )
+        return statements
+
+    @staticmethod
+    def rollup_table(table: str, resolution: str) -> str:
+        return f"{table}_{resolution}"
+
+    @staticmethod
+    def rollups() -> list:
+        """
+        DDL of the aggregate tables, e.g. cpu_usage_hourly with
+        Total_Cpu_Usage_Min/_Avg/_Max/_P95 per Bucket_Start
+        """
+        statements = []
+        for table, (key, metrics) in Schema.ROLLUPS.items():
+            key_columns = [key] if key else []
+            columns = ", ".join(
+                [
+                    "Bucket_Start INTEGER",
+                    "Sys_ID TEXT",
+                    *(f"{column} TEXT" for column in key_columns),
+                    "Samples INTEGER",
+                    *(
+                        f"{metric}_{stat} REAL"
+                        for metric in metrics
+                        for stat in ("Min", "Avg", "Max", "P95")
+                    ),
+                ]
+            )
+            primary_key = ", ".join(["Bucket_Start", "Sys_ID", *key_columns])
+            for resolution in Schema.RESOLUTIONS:
+                statements.append(
+                    f"CREATE TABLE IF NOT EXISTS {Schema.rollup_table(table, resolution)} "
+                    f"({columns}, PRIMARY KEY ({primary_key}))"
+                )
+        return statements
+
+    @staticmethod
+    def indexes() -> list:
+        """Time-bounded and latest-snapshot questions are index range scans"""
+        statements = [
+            "CREATE INDEX IF NOT EXISTS idx_snapshots_time ON snapshots (Extracted_Time)",
+            "CREATE INDEX IF NOT EXISTS idx_snapshots_sys_time ON snapshots (Sys_ID, Extracted_Time)",
+        ]
+        for table in Schema.TIME_SERIES_TABLES:
+            statements += [
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_snapshot ON {table} (Snapshot_ID)",
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_time ON {table} (Extracted_Time)",
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_sys_snapshot ON {table} (Sys_ID, Snapshot_ID)",
+            ]
+        statements += [
+            "CREATE INDEX IF NOT EXISTS idx_processes_first ON processes (Sys_ID, First_Snapshot_ID)",
+            "CREATE INDEX IF NOT EXISTS idx_processes_exit ON processes (Sys_ID, Exit_Snapshot_ID)",
+            "CREATE INDEX IF NOT EXISTS idx_process_samples_key ON process_samples (Process_Key, Snapshot_ID)",
+            "CREATE INDEX IF NOT EXISTS idx_process_samples_time ON process_samples (Extracted_Time)",
+            "CREATE INDEX IF NOT EXISTS idx_process_samples_open ON process_samples (Process_Key, Valid_Until_Snapshot_ID)",
+            "CREATE INDEX IF NOT EXISTS idx_process_samples_valid ON process_samples (Sys_ID, Valid_Until_Snapshot_ID, Snapshot_ID)",
+            "CREATE INDEX IF NOT EXISTS idx_collector_metrics_time ON collector_metrics (Extracted_Time)",
+        ]
+        # Each host's rows are replaced on every snapshot
+        for table in (*Schema.LATEST_TABLES, *Schema.TOP_PROCESSES):
+            statements.append(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_sys ON {table} (Sys_ID)"
+            )
+        return statements
+
+    @staticmethod
+    def readable_size(column: str) -> str:
+        """SQL expression rendering a byte count the way '1.20GB' used to be stored"""
+        cases = " ".join(
+            f"WHEN abs({column}) < {1024 ** (power + 1)} "
+            f"THEN printf('%.2f{unit}B', {column} / {float(1024 ** power)})"
+            for power, unit in enumerate(["", "K", "M", "G", "T"])
+        )
+        return f"CASE WHEN {column} IS NULL THEN NULL {cases} ELSE printf('%.2fPB', {column} / {float(1024 ** 5)}) END AS {column}"
+
+    @staticmethod
+    def readable_percent(column: str) -> str:
+        return f"printf('%.2f%%', {column}) AS {column}"
+
+    @staticmethod
+    def readable_frequency(column: str) -> str:
+        return f"printf('%.2fMhz', {column}) AS {column}"
+
+    @staticmethod
+    def readable_time(column: str) -> str:
+        return f"datetime({column}, 'unixepoch') AS {column}"
+
+    @staticmethod
+    def cpu_usage_wide(core_count: int) -> str:
+        """cpu_usage pivoted back to one Core_N column per core, for the first `core_count`"""
+        cores = ", ".join(
+            f"max(CASE WHEN k.Core = {i} THEN k.Percentage END) AS Core_{i}"
+            for i in range(core_count)
+        )
+        # Grouped on the run columns too, so filters on them reach cpu_usage
+        return f"""
+        SELECT c.id, c.Current_Frequency, {cores}, c.Total_Cpu_Usage,
+        c.Snapshot_ID, c.Extracted_Time, c.Sys_ID
+        FROM cpu_usage c LEFT JOIN cpu_core_samples k ON k.Cpu_Usage_ID = c.id
+        GROUP BY c.id, c.Snapshot_ID, c.Extracted_Time, c.Sys_ID
+        """
+
+    @staticmethod
+    def views(core_count: int) -> dict:
+        """
+        The task_manager and cpu_core_usage views over their storage tables,
+        the wide cpu pivot, then read-only views formatting the numeric
+        tables for humans
+        """
+        size, percent, frequency, time = (
+            Schema.readable_size,
+            Schema.readable_percent,
+            Schema.readable_frequency,
+            Schema.readable_time,
+        )
+        return {
+            "task_manager": Schema.TASK_MANAGER,
+            "cpu_core_usage": Schema.CPU_CORE_USAGE,
+            "cpu_usage_wide": Schema.cpu_usage_wide(core_count),
+            "system_information_readable": f"""
+            SELECT Mac_ID, System, Node_Name, Machine, Processor, Processor_Model,
+            Physcial_cores, Total_cores, {frequency('Max_Frequency')},
+            {frequency('Min_Frequency')}, {size('Total_Memory')},
+            {size('Total_Swap_Memory')}, Ip_Address
+            FROM system_information
+            """,
+            "cpu_usage_readable": f"""
+            SELECT id, {frequency('Current_Frequency')},
+            {percent('Total_Cpu_Usage')}, Snapshot_ID, {time('Extracted_Time')}, Sys_ID
+            FROM cpu_usage
+            """,
+            "ram_usage_readable": f"""
+            SELECT id, {size('Free')}, {size('Used')}, {percent('Percentage')},
+            {size('Swap_Free')}, {size('Swap_Used')}, {percent('Swap_Percentage')},
+            Snapshot_ID, {time('Extracted_Time')}, Sys_ID
+            FROM ram_usage
+            """,
+            "disk_usage_readable": f"""
+            SELECT id, Device, Mount_Point, File_System_Type, {size('Total_Size')},
+            {size('Used')}, {size('Free')}, {percent('Percentage')},
+            Snapshot_ID, {time('Extracted_Time')}, Sys_ID
+            FROM disk_usage
+            """,
+            "total_disk_usage_readable": f"""
+            SELECT id, {size('Total_Read')}, {size('Total_Write')},
+            datetime(Boot_Time, 'unixepoch', 'localtime') AS Boot_Time,
+            Snapshot_ID, {time('Extracted_Time')}, Sys_ID
+            FROM total_disk_usage
+            """,
+            "network_usage_readable": f"""
+            SELECT id, {size('Bytes_Sent')}, {size('Bytes_Received')},
+            Snapshot_ID, {time('Extracted_Time')}, Sys_ID
+            FROM network_usage
+            """,
+            "task_manager_readable": f"""
+            SELECT Process_Name, PID, {percent('CPU_Usage')}, {size('Memory_Usage')},
+            {percent('Memory_Percentage')}, {size('Disk_Usage')},
+            {size('Network_Sent')}, {size('Network_Received')},
+            Snapshot_ID, {time('Extracted_Time')}, Sys_ID
+            FROM task_manager
+            """,
+        }
+
+    @staticmethod
+    def wide_core_count(conn) -> int:
+        """Core_N columns of cpu_usage_wide, 0 before it exists"""
+        return sum(
+            row[1].startswith("Core_")
+            for row in conn.execute("PRAGMA table_info(cpu_usage_wide)")
+        )
+
+    @staticmethod
+    def _create_views(conn, core_count: int):
+        # As wide as the widest host stored, a database can outlive a resize
+        (stored,) = conn.execute("SELECT max(Core) + 1 FROM cpu_core_samples").fetchone()
+        core_count = max(core_count, stored or 0, Schema.wide_core_count(conn))
+        for name, select in Schema.views(core_count).items():
+            conn.execute(f"DROP VIEW IF EXISTS {name}")
+            conn.execute(f"CREATE VIEW {name} AS {select}")
+
+    @staticmethod
+    def widen_cpu_view(conn, core_count: int) -> bool:
+        """
+        Recreate cpu_usage_wide with `core_count` core columns when it has
+        fewer, for a host with more cpus than the ones seen so far (or a
+        resized VM). Returns whether it was widened
+        """
+        if core_count <= Schema.wide_core_count(conn):
+            return False
+        with conn:
+            conn.execute("DROP VIEW IF EXISTS cpu_usage_wide")
+            conn.execute(
+                f"CREATE VIEW cpu_usage_wide AS {Schema.cpu_usage_wide(core_count)}"
+            )
+        return True
+
+    @staticmethod
+    def bootstrap(conn, core_count: int = None) -> None:
+        """
+        Bring a database to the current schema once, tracked through PRAGMA
+        user_version. Existing databases are migrated in place first.
+        """
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+        if version >= Schema.VERSION:
+            return
+        Migrations.upgrade(conn, version, Schema.VERSION)
+        with conn:
+            for ddl in (
+                Schema.SYSTEM_INFORMATION,
+                Schema.SNAPSHOTS,
+                Schema.CPU_USAGE,
+                Schema.CPU_CORE_SAMPLES,
+                Schema.RAM_USAGE,
+                Schema.DISK_USAGE,
+                Schema.TOTAL_DISK_USAGE,
+                Schema.NETWORK_USAGE,
+                Schema.PROCESSES,
+                Schema.PROCESS_SAMPLES,
+                Schema.ROLLUP_STATE,
+                Schema.INGEST_STATE,
+                Schema.COLLECTOR_METRICS,
+                *Schema.latest_tables(),
+                *Schema.rollups(),
+            ):
+                conn.execute(ddl)
+            for statement in (*Schema.indexes(), *Schema.PROCESS_SAMPLE_TRIGGERS):
+                conn.execute(statement)
+            Schema._create_views(conn, core_count or os.cpu_count() or 1)
+            if version < 8:
+                # The latest_* tables (version 8) read the views, so they are
+                # filled from the newest snapshot of every host only now
+                from latest_tables import Latest_Tables
+
+                Latest_Tables.refresh(
+                    conn,
+                    conn.execute(
+                        """SELECT max(Snapshot_ID), Extracted_Time, Sys_ID
+                        FROM snapshots GROUP BY Sys_ID"""
+                    ).fetchall(),
+                )
+            conn.execute(f"PRAGMA user_version = {Schema.VERSION}")
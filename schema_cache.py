@@ -0,0 +1,167 @@
+import contextlib
+import json
+import os
+import sqlite3
+from schema import Schema
+from schema_selector import Schema_Selector
+
+
+class Schema_Cache:
+    """
+    Schema text for the LLM prompt, cached in memory and on disk.
+
+    The cache is keyed on PRAGMA schema_version, which SQLite bumps on every
+    DDL change, so the description is only rebuilt when the schema actually
+    changes. Sample rows come from the latest snapshot through the
+    Snapshot_ID index (or the tail of the rowid b-tree) instead of a scan.
+    Each table is described on its own, so select() can hand the prompt
+    only the tables a question needs.
+    """
+
+    SAMPLE_ROWS = 3
+    MAX_VALUE_LENGTH = 100
+
+    def __init__(
+        self,
+        db_path: str,
+        cache_path: str = None,
+        max_tables: int = Schema_Selector.MAX_TABLES,
+    ) -> None:
+        self._db_path = db_path
+        self._cache_path = cache_path or f"{os.path.splitext(db_path)[0]}.schema.json"
+        self._max_tables = max_tables
+        self._schema_version = None
+        # Table => (description, columns), in prompt order
+        self._tables = None
+        self._text = None
+        self._selector = None
+
+    def _connect(self):
+        return sqlite3.connect(f"file:{self._db_path}?mode=ro", uri=True)
+
+    @staticmethod
+    def schema_version(conn) -> int:
+        (version,) = conn.execute("PRAGMA schema_version").fetchone()
+        return version
+
+    def _load(self, version: int):
+        try:
+            with open(self._cache_path) as cache_file:
+                cached = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if cached.get("schema_version") != version or "tables" not in cached:
+            return None
+        return {table: tuple(entry) for table, entry in cached["tables"].items()}
+
+    def _save(self, version: int, tables: dict):
+        tmp_path = f"{self._cache_path}.tmp"
+        try:
+            with open(tmp_path, "w") as cache_file:
+                json.dump({"schema_version": version, "tables": tables}, cache_file)
+            os.replace(tmp_path, self._cache_path)
+        except OSError:
+            # A read-only directory only costs the on-disk cache
+            pass
+
+    def _sample_rows(self, conn, table: str, columns, kind: str = "table"):
+        if "Snapshot_ID" in columns:
+            # A view's own max(Snapshot_ID) would evaluate the whole view
+            latest = "snapshots" if kind == "view" else table
+            sql = f"""SELECT * FROM {table}
+            WHERE Snapshot_ID = (SELECT max(Snapshot_ID) FROM {latest}) LIMIT ?"""
+        else:
+            sql = f"SELECT * FROM {table} ORDER BY rowid DESC LIMIT ?"
+        try:
+            return conn.execute(sql, (self.SAMPLE_ROWS,)).fetchall()
+        except sqlite3.Error:
+            return []
+
+    def _render_table(self, conn, table: str, create_sql: str, kind: str):
+        """The table's description and its columns"""
+        table_info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        columns = [row[1] for row in table_info]
+        if kind == "view":
+            # Described by its columns, the joins behind it are not the model's concern
+            create_sql = f"CREATE VIEW {table} (" + ", ".join(
+                f"{row[1]} {row[2]}".strip() for row in table_info
+            ) + ")"
+        rows = self._sample_rows(conn, table, columns, kind)
+        lines = ["\t".join(columns)]
+        for row in rows:
+            lines.append(
+                "\t".join(str(value)[: self.MAX_VALUE_LENGTH] for value in row)
+            )
+        return (
+            f"{create_sql.strip()}\n\n/*\n{len(rows)} rows from {table} table:\n"
+            + "\n".join(lines)
+            + "\n*/"
+        ), columns
+
+    def render_tables(self, conn) -> dict:
+        """
+        Describe every table like SQLDatabase.get_table_info, as table =>
+        (description, columns). Views standing in for tables (task_manager)
+        are described too, the storage tables behind them and the *_readable
+        views are not. The latest_* tables come first, then the others by name
+        """
+        entries = conn.execute(
+            """SELECT name, sql, type FROM sqlite_master
+            WHERE (type = 'table' OR (type = 'view' AND name NOT LIKE '%_readable'))
+            AND name NOT LIKE 'sqlite_%' ORDER BY name"""
+        ).fetchall()
+        first = Schema.PROMPT_FIRST
+        entries.sort(
+            key=lambda entry: first.index(entry[0]) if entry[0] in first else len(first)
+        )
+        return {
+            name: self._render_table(conn, name, sql, kind)
+            for name, sql, kind in entries
+            if name not in Schema.STORAGE_TABLES
+        }
+
+    def _refresh(self):
+        with contextlib.closing(self._connect()) as conn:
+            version = self.schema_version(conn)
+            if self._tables is not None and self._schema_version == version:
+                return
+            tables = self._load(version)
+            if tables is None:
+                tables = self.render_tables(conn)
+                self._save(version, tables)
+        self._schema_version, self._tables = version, tables
+        self._text = "\n\n".join(description for description, _ in tables.values())
+        self._selector = None
+
+    def describe(self, tables=None) -> str:
+        """The whole schema description, or only that of `tables`"""
+        self._refresh()
+        if tables is None:
+            return self._text
+        return "\n\n".join(
+            self._tables[table][0] for table in tables if table in self._tables
+        )
+
+    def selector(self) -> Schema_Selector:
+        """The term index of the current schema, built once per schema version"""
+        self._refresh()
+        if self._selector is None:
+            self._selector = Schema_Selector(
+                {table: columns for table, (_, columns) in self._tables.items()},
+                self._max_tables,
+            )
+        return self._selector
+
+    def select(self, question: str):
+        """
+        Description of the tables `question` needs and their names, or the
+        whole schema and None when nothing in it matches the question
+        """
+        tables = self.selector().select(question)
+        return self.describe(tables), tables
+
+    def needs_full_schema(self, sql: str, tables) -> bool:
+        """Whether `sql` names a described table left out of `tables`"""
+        if tables is None:
+            return False
+        return bool(self.selector().referenced(sql) - set(tables))
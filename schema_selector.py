@@ -0,0 +1,261 @@
+import math
+import re
+from schema import Schema
+
+_WORD = re.compile(r"[a-z0-9]+")
+# FROM and JOIN targets, with the tables of a comma join: 'FROM a x, b y'
+_TABLE_REFERENCE = re.compile(
+    r"\b(?:FROM|JOIN)\s+((?:\w+(?:\s+(?:AS\s+)?\w+)?\s*,\s*)*\w+)", re.IGNORECASE
+)
+
+# Words of a question or a schema name => the term they are indexed under.
+# Both sides go through it, so 'memory' in a question meets Memory_Usage
+# as well as ram_usage
+SYNONYMS = {
+    **dict.fromkeys(("memory", "mem", "ram"), "ram"),
+    **dict.fromkeys(("swap", "swapping", "swapped", "paging"), "swap"),
+    **dict.fromkeys(
+        ("cpu", "cpus", "processor", "processors", "load", "utilization", "utilisation"),
+        "cpu",
+    ),
+    **dict.fromkeys(("core", "cores", "percore", "thread", "threads"), "core"),
+    **dict.fromkeys(
+        (
+            "disk",
+            "disks",
+            "drive",
+            "drives",
+            "storage",
+            "partition",
+            "partitions",
+            "mount",
+            "filesystem",
+            "volume",
+            "space",
+        ),
+        "disk",
+    ),
+    **dict.fromkeys(
+        ("network", "net", "bandwidth", "traffic", "internet", "upload", "download"),
+        "network",
+    ),
+    **dict.fromkeys(
+        (
+            "process",
+            "task",
+            "program",
+            "app",
+            "application",
+            "service",
+            "running",
+            "pid",
+        ),
+        "process",
+    ),
+    **dict.fromkeys(
+        ("host", "machine", "node", "server", "computer", "hostname", "fleet", "mac"),
+        "host",
+    ),
+    **dict.fromkeys(("frequency", "clock", "ghz", "mhz"), "frequency"),
+    **dict.fromkeys(
+        (
+            "metric",
+            "overhead",
+            "latency",
+            "slow",
+            "duration",
+            "timing",
+            "profile",
+            "collector",
+            "collection",
+            "collecting",
+            "take",
+            "took",
+            "taking",
+        ),
+        "metric",
+    ),
+    **dict.fromkeys(("now", "current", "currently", "latest", "right"), "latest"),
+    **dict.fromkeys(
+        ("top", "largest", "biggest", "highest", "heaviest", "most", "busiest"), "top"
+    ),
+    **dict.fromkeys(("minute", "minutes"), "minute"),
+    **dict.fromkeys(("hour", "hourly"), "hourly"),
+    **dict.fromkeys(("day", "daily", "week", "month", "yesterday"), "daily"),
+    **dict.fromkeys(("read", "write", "io", "written"), "io"),
+}
+
+STOP_WORDS = frozenset(
+    """a an and are as at be by do does for from give how i in is it list me my
+    of on or over per please show tell than that the their them there this to
+    was what when which who why with""".split()
+)
+
+# What each table is about beyond its names, keyed on the base table so
+# the latest_*, top_* and rollup tables inherit it
+DESCRIPTIONS = {
+    "system_information": "host machine node name hardware total memory cores",
+    "snapshots": "sampling runs of every host",
+    "latest_snapshots": "newest snapshot of every host current",
+    "cpu_usage": "cpu load utilization frequency total",
+    "cpu_core_usage": "per core cpu utilization",
+    "ram_usage": "memory swap used free",
+    "disk_usage": "disk space mount partition filesystem full",
+    "total_disk_usage": "disk io read write boot uptime",
+    "network_usage": "network bytes sent received traffic",
+    "task_manager": "process task program cpu memory disk usage",
+    "top_processes": "top process task program heaviest",
+    "collector_metrics": "collector chat speed overhead duration metric timing",
+    "rollup_state": "rollup bookkeeping",
+}
+
+_RESOLUTION_TERMS = {"per_minute": "minute", "hourly": "hourly", "daily": "daily"}
+
+
+def stem(word: str) -> str:
+    """
+    'processes' => 'process', 'bytes' => 'byte', 'policies' => 'policy',
+    'swapping' => 'swap', 'loaded' => 'load'
+    """
+    for ending in ("ing", "ed"):
+        if len(word) > len(ending) + 3 and word.endswith(ending):
+            word = word[: -len(ending)]
+            # 'swapp' => 'swap', 'spill' stays
+            if word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            return word
+    if len(word) > 4 and word.endswith("sses"):
+        return word[:-2]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def terms(text: str) -> list:
+    """Index terms of a question or a name, 'Memory_Usage' => ['ram', 'usage']"""
+    words = _WORD.findall(text.lower().replace("_", " "))
+    found = []
+    for word in words:
+        if word in STOP_WORDS:
+            continue
+        term = SYNONYMS.get(word) or SYNONYMS.get(stem(word)) or stem(word)
+        found.append(term)
+    return found
+
+
+class Schema_Selector:
+    """
+    Pick the tables of the schema description a question needs.
+
+    A term index over table names, column names and DESCRIPTIONS is built
+    once per schema. Each table scores the weight of the question's terms
+    it holds, rarer terms counting for more. The best MAX_TABLES tables are
+    kept together with the tables their join keys lead to. Rollup tables
+    only qualify when the question names a time range, and a question
+    matching nothing but KEY_TABLES gets the full schema (select() returns
+    None).
+    """
+
+    MAX_TABLES = 6
+    # Tables every question can join through, matching only these is no match
+    KEY_TABLES = frozenset(("snapshots", "latest_snapshots", "system_information"))
+    MIN_SCORE = 1.0
+    NAME_WEIGHT = 3.0
+    DESCRIPTION_WEIGHT = 2.0
+    COLUMN_WEIGHT = 1.0
+
+    def __init__(self, table_columns: dict, max_tables: int = MAX_TABLES) -> None:
+        # Table => its columns, in prompt order
+        self._table_columns = table_columns
+        self._max_tables = max_tables
+        self._index = {}
+        for table, columns in table_columns.items():
+            self._add(table, terms(table), self.NAME_WEIGHT)
+            description = DESCRIPTIONS.get(self._base(table), "")
+            self._add(table, terms(description), self.DESCRIPTION_WEIGHT)
+            for column in columns:
+                self._add(table, terms(column), self.COLUMN_WEIGHT)
+        # A term every table has ('usage', 'snapshot') tells nothing apart
+        self._idf = {
+            term: math.log(len(table_columns) / len(weights))
+            for term, weights in self._index.items()
+        }
+
+    def _add(self, table: str, found, weight: float):
+        for term in found:
+            weights = self._index.setdefault(term, {})
+            weights[table] = max(weights.get(table, 0.0), weight)
+
+    @staticmethod
+    def _base(table: str) -> str:
+        """latest_ram_usage, ram_usage_hourly => ram_usage"""
+        if table.startswith("top_processes_by_"):
+            return "top_processes"
+        if table.startswith("latest_") and table != "latest_snapshots":
+            table = table[len("latest_"):]
+        for resolution in Schema.RESOLUTIONS:
+            if table.endswith(f"_{resolution}"):
+                return table[: -len(resolution) - 1]
+        return table
+
+    @staticmethod
+    def _resolution(table: str):
+        for resolution in Schema.RESOLUTIONS:
+            if table.endswith(f"_{resolution}"):
+                return resolution
+        return None
+
+    def scores(self, question: str) -> dict:
+        """Table => relevance to the question, tables scoring 0 left out"""
+        asked = set(terms(question))
+        scores = {}
+        # Time ranges only decide which rollups qualify
+        for term in asked - set(_RESOLUTION_TERMS.values()):
+            for table, weight in self._index.get(term, {}).items():
+                resolution = self._resolution(table)
+                if resolution is not None and _RESOLUTION_TERMS[resolution] not in asked:
+                    continue
+                scores[table] = scores.get(table, 0.0) + weight * self._idf[term]
+        return scores
+
+    def _join_tables(self, tables) -> list:
+        """Tables the join keys of `tables` lead to"""
+        joined = []
+        for table in tables:
+            columns = self._table_columns[table]
+            if "Sys_ID" in columns:
+                joined.append("system_information")
+            # History tables are filtered to the current state through it
+            if (
+                "Snapshot_ID" in columns
+                and table not in Schema.PROMPT_FIRST
+                and self._resolution(table) is None
+            ):
+                joined.append("latest_snapshots")
+        return [table for table in joined if table in self._table_columns]
+
+    def select(self, question: str):
+        """Tables to describe for `question` in prompt order, None for all of them"""
+        if self._max_tables <= 0:
+            return None
+        scores = self.scores(question)
+        ranked = sorted(
+            (table for table, score in scores.items() if score >= self.MIN_SCORE),
+            key=lambda table: -scores[table],
+        )[: self._max_tables]
+        if not set(ranked) - self.KEY_TABLES:
+            return None
+        chosen = set(ranked) | set(self._join_tables(ranked))
+        return [table for table in self._table_columns if table in chosen]
+
+    def referenced(self, sql: str) -> set:
+        """Tables of the schema the query reads, columns named like a table are not"""
+        names = {table.lower(): table for table in self._table_columns}
+        return {
+            names[item.split()[0].lower()]
+            for match in _TABLE_REFERENCE.findall(sql)
+            for item in match.split(",")
+            if item.split()[0].lower() in names
+        }
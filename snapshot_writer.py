@@ -0,0 +1,114 @@
+import contextlib
+import os
+import sqlite3
+from latest_tables import Latest_Tables
+from schema import Schema
+
+# Trailing columns of every time-series row, and the snapshots row of a run
+RUN_COLUMNS = ("Snapshot_ID", "Extracted_Time", "Sys_ID")
+
+
+class Snapshot:
+    """Rows collected during one run, grouped by the statement that inserts them"""
+
+    def __init__(self) -> None:
+        self._statements = {}
+
+    @staticmethod
+    def insert_sql(table: str, columns, or_ignore: bool = False) -> str:
+        verb = "INSERT OR IGNORE" if or_ignore else "INSERT"
+        placeholders = ", ".join("?" * len(columns))
+        return f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    def add(self, table: str, columns, values, or_ignore: bool = False):
+        self.add_sql(self.insert_sql(table, columns, or_ignore), values)
+
+    def extend(self, table: str, columns, rows):
+        self.extend_sql(self.insert_sql(table, columns), rows)
+
+    def add_sql(self, sql: str, values):
+        self._statements.setdefault(sql, []).append(tuple(values))
+
+    def extend_sql(self, sql: str, rows):
+        """Statements run in the order they were first added, even with no rows"""
+        self._statements.setdefault(sql, []).extend(tuple(values) for values in rows)
+
+    def merge(self, other: "Snapshot"):
+        """Append the rows of another snapshot, statement by statement"""
+        for sql, rows in other.statements():
+            self.extend_sql(sql, rows)
+
+    def add_run(self, run):
+        """The snapshots row of one collection run"""
+        self.add("snapshots", RUN_COLUMNS, run)
+
+    def runs(self) -> list:
+        """(Snapshot_ID, Extracted_Time, Sys_ID) of every run in the snapshot"""
+        return self._statements.get(self.insert_sql("snapshots", RUN_COLUMNS), [])
+
+    def statements(self):
+        return self._statements.items()
+
+    def __len__(self) -> int:
+        return sum(len(rows) for rows in self._statements.values())
+
+
+class Snapshot_Writer:
+    """
+    Write whole snapshots on a single WAL connection, one transaction each.
+    With a `spool` (a Spool_Writer) every committed snapshot is also
+    appended to it, for ingestion into a fleet database
+    """
+
+    def __init__(self, db_path: str, core_count: int = None, spool=None) -> None:
+        self._db_path = db_path
+        self._core_count = core_count
+        self._spool = spool
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self._db_path, timeout=30)
+            # Only takes effect on a new database, lets retention free pages
+            # with incremental_vacuum instead of a full VACUUM
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            Schema.bootstrap(conn, self._core_count)
+            # A host resized since the pivot view was created
+            Schema.widen_cpu_view(conn, self._core_count or os.cpu_count() or 1)
+            self._conn = conn
+        return self._conn
+
+    def connection(self):
+        """The writer's connection, bootstrapped, for maintenance on the same handle"""
+        return self._connect()
+
+    def write(self, snapshot: Snapshot) -> int:
+        """
+        Insert every row of the snapshot in one transaction, which also moves
+        the latest_* tables to its newest run. Returns the row count
+        """
+        conn = self._connect()
+        with conn:
+            for sql, rows in snapshot.statements():
+                conn.executemany(sql, rows)
+            Latest_Tables.refresh(conn, snapshot.runs())
+            # Spooled before the commit, so a crash or a full disk in between
+            # never loses the record for the fleet. A record spooled again
+            # on a retry is skipped by the ingester as a duplicate
+            if self._spool is not None:
+                self._spool.write(snapshot)
+        return len(snapshot)
+
+    def close(self):
+        if self._conn is not None:
+            with contextlib.suppress(sqlite3.Error):
+                self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
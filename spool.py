@@ -0,0 +1,142 @@
+import base64
+import contextlib
+import json
+import os
+import zlib
+from snapshot_writer import Snapshot
+
+SEGMENT_SUFFIX = ".spool"
+
+
+def segments(spool_dir: str) -> list:
+    """Segment files of a spool directory, oldest first"""
+    try:
+        names = os.listdir(spool_dir)
+    except OSError:
+        return []
+    return sorted(
+        os.path.join(spool_dir, name)
+        for name in names
+        if name.endswith(SEGMENT_SUFFIX) and name[: -len(SEGMENT_SUFFIX)].isdigit()
+    )
+
+
+def segment_start(path: str) -> int:
+    """Snapshot id of the first record of a segment, its file name"""
+    return int(os.path.basename(path)[: -len(SEGMENT_SUFFIX)])
+
+
+def encode(snapshot: Snapshot) -> bytes:
+    statements = [[sql, rows] for sql, rows in snapshot.statements() if rows]
+    payload = json.dumps(statements, separators=(",", ":")).encode()
+    return base64.b64encode(zlib.compress(payload)) + b"\n"
+
+
+def decode(line: bytes) -> Snapshot:
+    snapshot = Snapshot()
+    for sql, rows in json.loads(zlib.decompress(base64.b64decode(line))):
+        snapshot.extend_sql(sql, rows)
+    return snapshot
+
+
+def read_segment(path: str, offset: int = 0):
+    """
+    Yield (offset after the line, Snapshot) for every whole line of a
+    segment from `offset`, the Snapshot is None when the line is unreadable
+    """
+    with open(path, "rb") as segment:
+        segment.seek(offset)
+        for line in segment:
+            if not line.endswith(b"\n"):
+                # Still being appended, or cut short by a crash
+                return
+            offset += len(line)
+            try:
+                snapshot = decode(line)
+            except (ValueError, TypeError, zlib.error):
+                snapshot = None
+            yield offset, snapshot
+
+
+class Spool_Writer:
+    """
+    Append-only local spool of the snapshots a collector wrote, which a
+    fleet database ingests (see Ingester).
+
+    The spool is a directory of segment files named after the first
+    snapshot id they hold, so they sort oldest first. Each line is one
+    snapshot, its statements and rows as zlib compressed JSON in base64,
+    written with one append. A segment is closed once it passes
+    `segment_bytes` or ends on a partial line, and segments older than
+    `keep_days` are deleted when the next one starts.
+    """
+
+    SEGMENT_BYTES = 16 * 1024**2
+    KEEP_DAYS = 7.0
+
+    def __init__(
+        self,
+        spool_dir: str,
+        segment_bytes: int = SEGMENT_BYTES,
+        keep_days: float = KEEP_DAYS,
+    ) -> None:
+        self._spool_dir = spool_dir
+        self._segment_bytes = segment_bytes
+        self._keep = int(keep_days * 86400 * 1000000)
+        self._segment = None
+
+    def _appendable(self, path: str) -> bool:
+        try:
+            with open(path, "rb") as segment:
+                size = segment.seek(0, os.SEEK_END)
+                if size == 0:
+                    return True
+                if size >= self._segment_bytes:
+                    return False
+                segment.seek(size - 1)
+                return segment.read(1) == b"\n"
+        except OSError:
+            return False
+
+    def _prune(self, existing: list, snapshot_id: int):
+        # A segment ends where the next one starts
+        cutoff = snapshot_id - self._keep
+        starts = [segment_start(path) for path in existing[1:]] + [snapshot_id]
+        for path, end in zip(existing, starts):
+            if end < cutoff:
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+
+    def _current_segment(self, snapshot_id: int) -> str:
+        if self._segment is not None and self._appendable(self._segment):
+            return self._segment
+        os.makedirs(self._spool_dir, exist_ok=True)
+        existing = segments(self._spool_dir)
+        if self._segment is None and existing and self._appendable(existing[-1]):
+            # Carry on with the segment of the previous run
+            self._segment = existing[-1]
+        else:
+            self._segment = os.path.join(
+                self._spool_dir, f"{snapshot_id:020d}{SEGMENT_SUFFIX}"
+            )
+            self._prune(existing, snapshot_id)
+        return self._segment
+
+    def write(self, snapshot: Snapshot) -> bool:
+        """Append the snapshot, returns False when it holds no run to key it on"""
+        runs = snapshot.runs()
+        if not runs:
+            # e.g. the timings written after a one-shot collection
+            return False
+        line = memoryview(encode(snapshot))
+        fd = os.open(
+            self._current_segment(runs[0][0]),
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            0o644,
+        )
+        try:
+            while line:
+                line = line[os.write(fd, line) :]
+        finally:
+            os.close(fd)
+        return True
@@ -1,13 +1,20 @@
-import sqlite3
-import contextlib
-import platform
-import cpuinfo
-import socket
-import re
-import uuid
+import sys
+import json
 import psutil
-from datetime import datetime
+import time
 import os
+from schema import Schema
+from snapshot_writer import RUN_COLUMNS, Snapshot, Snapshot_Writer
+from spool import Spool_Writer
+from process_sampler import Process_Sampler
+from process_tracker import Process_Tracker
+from collector_daemon import Collector_Daemon
+from retention import Retention
+from profiler import METRIC_COLUMNS, Profiler
+from host_facts import HOST_FACTS_PATH, Host_Facts
+from probe_scheduler import Probe_Scheduler
+from sampling_policy import Sampling_Policy
+import typer
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 # Path to store the db created
@@ -15,330 +22,368 @@ DB_PATH = os.path.join(script_dir, "os_data.db")
 
 
 class Information_Collector:
-    def __init__(self) -> None:
-        self._cpu_freq = psutil.cpu_freq()
-        self._svem = psutil.virtual_memory()
-        self._swap = psutil.swap_memory()
-        self._sys_id = ":".join(re.findall("..", "%012x" % uuid.getnode()))
+    # Probes in the order their rows are written, with their timeout in
+    # seconds. They all run at once, so a run takes about as long as the
+    # slowest one, usually the cpu_percent window of cpu_usage
+    PROBES = {
+        "system_information": 30.0,
+        "cpu_usage": 5.0,
+        "ram_usage": 5.0,
+        "disk_usage": 10.0,
+        "total_disk_usage": 5.0,
+        "network_usage": 5.0,
+        "task_manager": 60.0,
+    }
+    # Per mount point, a hung network mount is skipped on its own
+    MOUNT_TIMEOUT = 2.0
 
-    def _create_system_information(self):
-        with contextlib.closing(sqlite3.connect(DB_PATH)) as conn:
-            with conn as cur:
-                cur.execute("""
-                CREATE TABLE IF NOT EXISTS system_information
-                (Mac_ID TEXT PRIMARY KEY, System TEXT, Node_Name TEXT, Machine TEXT, 
-                Processor TEXT, Processor_Model TEXT, Physcial_cores INT, 
-                Total_cores INT, Max_Frequency REAL, Min_Frequency REAL, 
-                Total_Memory REAL, Total_Swap_Memory REAL, Ip_Address TEXT);
-                """)
-                conn.commit()
-
-    def get_size(self, bytes, suffix="B"):
-        """
-        Scale bytes to its proper format
-        e.g:
-            1253656 => '1.20MB'
-            1253656678 => '1.17GB'
-        """
-        factor = 1024
-        for unit in ["", "K", "M", "G", "T", "P"]:
-            if bytes < factor:
-                return f"{bytes:.2f}{unit}{suffix}"
-            bytes /= factor
-
-    def insert_system_information(self):
-        self._create_system_information()
-        uname = platform.uname()
-        with contextlib.closing(sqlite3.connect(DB_PATH)) as conn:
-            with conn as cur:
-                exists = cur.execute(
-                    "SELECT 1 FROM system_information WHERE Mac_ID = ?", (self._sys_id,)
-                ).fetchone()
-                if not exists:
-                    cur.execute(
-                        """
-                    INSERT INTO system_information
-                    (Mac_ID, System, Node_Name, Machine, Processor, 
-                    Processor_Model, Physcial_cores,  
-                    Total_cores, Max_Frequency, Min_Frequency, 
-                    Total_Memory, Total_Swap_Memory, Ip_Address)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                        (
-                            self._sys_id,
-                            uname.system,
-                            uname.node,
-                            uname.machine,
-                            uname.processor,
-                            cpuinfo.get_cpu_info().get("brand_raw", "Unknown"),
-                            psutil.cpu_count(logical=False) or 0,
-                            psutil.cpu_count(logical=True) or 0,
-                            f"{self._cpu_freq.max:.2f}Mhz"
-                            if self._cpu_freq
-                            else "0.00Mhz",
-                            f"{self._cpu_freq.min:.2f}Mhz"
-                            if self._cpu_freq
-                            else "0.00Mhz",
-                            self.get_size(self._svem.total) if self._svem else "0B",
-                            self.get_size(self._swap.total) if self._swap else "0B",
-                            socket.gethostbyname(socket.gethostname()),
-                        ),
-                    )
-                    conn.commit()
-
-    def _create_cpu_usage(self):
-        cpu_columns = []
-        for i, _ in enumerate(psutil.cpu_percent(percpu=True, interval=1)):
-            cpu_columns.append((f"Core_{i}", "REAL"))
-        self._columns_definition = ", ".join(
-            [f"{name} {dtype}" for name, dtype in cpu_columns]
+    def __init__(
+        self,
+        resident: bool = False,
+        psutil_module=None,
+        cpu_threshold: float = Process_Tracker.CPU_THRESHOLD,
+        memory_threshold: float = Process_Tracker.MEMORY_THRESHOLD,
+        facts_path: str = HOST_FACTS_PATH,
+        clock=None,
+    ) -> None:
+        # psutil itself, or a stand-in with the same functions (benchmarks)
+        self._psutil = psutil_module or psutil
+        # Epoch seconds of each run, a benchmark's simulated clock or the real one
+        self._clock = clock
+        # A resident collector (daemon mode) is called repeatedly, so its cpu
+        # counters stay primed and static facts are only recorded once
+        self._resident = resident
+        self._cpu_primed = False
+        self._system_information_recorded = False
+        # Percent of cpu, memory and the fullest disk read by the last run,
+        # for the daemon's Sampling_Policy
+        self.readings = {}
+        # Static facts come from a per-boot cache, readings are taken by each probe
+        self._facts = Host_Facts(facts_path, self._psutil).load()
+        self._sys_id = self._facts["sys_id"]
+        # Spans of every probe, drained into collector_metrics with each snapshot
+        self.profiler = Profiler("collector", self._sys_id)
+        self._process_sampler = Process_Sampler(psutil_module=self._psutil)
+        self._process_tracker = Process_Tracker(
+            self._sys_id, cpu_threshold, memory_threshold
         )
-        self._column_names = ", ".join([f"{name}" for name, _ in cpu_columns])
-        with contextlib.closing(sqlite3.connect(DB_PATH)) as conn:
-            with conn as cur:
-                cur.execute(f"""
-                    CREATE TABLE IF NOT EXISTS cpu_usage 
-                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    Current_Frequency REAL, {self._columns_definition}, Total_Cpu_Usage REAL, 
-                    Extracted_Time TEXT DEFAULT (datetime('now')), Sys_ID TEXT, 
-                    FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID))
-                """)
-                conn.commit()
-
-    def _get_process_disk_usage(self):
-        disk_usage = {}
-        for proc in psutil.process_iter(["pid", "name"]):
-            try:
-                process = psutil.Process(proc.info["pid"])
-                open_files = process.open_files()
-                total_disk_usage = 0
-                for file in open_files:
-                    file_path = file.path
-                    total_disk_usage += os.path.getsize(file_path)
-                disk_usage[process.name()] = total_disk_usage
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
-        return disk_usage
-
-    def _create_ram_usage(self):
-        with contextlib.closing(sqlite3.connect(DB_PATH)) as conn:
-            with conn as cur:
-                cur.execute("""
-                CREATE TABLE IF NOT EXISTS ram_usage 
-                (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                Free REAL, Used REAL, Percentage REAL,
-                Swap_Free REAL, Swap_Used REAL, Swap_Percentage REAL, 
-                Extracted_Time TEXT DEFAULT (datetime('now')), Sys_ID TEXT,
-                FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID))
-                """)
-                conn.commit()
-
-    def _create_disk_usage(self):
-        with contextlib.closing(sqlite3.connect(DB_PATH)) as conn:
-            with conn as cur:
-                cur.execute("""
-                CREATE TABLE IF NOT EXISTS disk_usage
-                (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                Device TEXT, Mount_Point TEXT, File_System_Type TEXT ,
-                Total_Size REAL, Used REAL,
-                Free REAL, Percentage REAL, 
-                Extracted_Time TEXT DEFAULT (datetime('now')), Sys_ID TEXT,
-                FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID))
-                """)
-                conn.commit()
-
-    def _create_total_disk_usage(self):
-        with contextlib.closing(sqlite3.connect(DB_PATH)) as conn:
-            with conn as cur:
-                cur.execute("""
-                CREATE TABLE IF NOT EXISTS total_disk_usage
-                (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                Total_Read REAL, Total_Write REAL, Boot_Time TEXT,
-                Extracted_Time TEXT DEFAULT (datetime('now')), Sys_ID TEXT,
-                FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID))
-                """)
-                conn.commit()
+        self._probe_scheduler = Probe_Scheduler()
+        self._mount_scheduler = Probe_Scheduler()
 
-    def _create_task_manager(self):
-        with contextlib.closing(sqlite3.connect(DB_PATH)) as conn:
-            with conn as cur:
-                cur.execute("""
-                CREATE TABLE IF NOT EXISTS task_manager (
-                Process_Name TEXT, PID INTEGER, CPU_Usage REAL, Memory_Usage REAL,
-                Memory_Percentage REAL, Disk_Usage INTEGER, 
-                Network_Sent REAL, Network_Received REAL,
-                Extracted_Time TEXT DEFAULT (datetime('now')), Sys_ID TEXT,
-                FOREIGN KEY (Sys_ID) REFERENCES system_information (Mac_ID))
-                """)
-                conn.commit()
+    def insert_system_information(self, snapshot: Snapshot):
+        facts = self._facts
+        snapshot.add(
+            "system_information",
+            (
+                "Mac_ID",
+                "System",
+                "Node_Name",
+                "Machine",
+                "Processor",
+                "Processor_Model",
+                "Physcial_cores",
+                "Total_cores",
+                "Max_Frequency",
+                "Min_Frequency",
+                "Total_Memory",
+                "Total_Swap_Memory",
+                "Ip_Address",
+            ),
+            (
+                facts["sys_id"],
+                facts["system"],
+                facts["node_name"],
+                facts["machine"],
+                facts["processor"],
+                facts["processor_model"],
+                facts["physical_cores"],
+                facts["total_cores"],
+                facts["max_frequency"],
+                facts["min_frequency"],
+                facts["total_memory"],
+                facts["total_swap_memory"],
+                facts["ip_address"],
+            ),
+            or_ignore=True,
+        )
 
     def _collect_cpu_data(self):
-        cpu_info = {}
-        for i, percentage in enumerate(psutil.cpu_percent(percpu=True, interval=1)):
-            cpu_info[f"Core_{i}"] = f"{percentage}%"
-        return cpu_info
+        # Once primed, cpu_percent measures since the previous sample without blocking
+        interval = None if self._cpu_primed else 1
+        self._cpu_primed = self._resident
+        return self._psutil.cpu_percent(percpu=True, interval=interval)
 
-    def cpu_usage(self):
-        self._create_cpu_usage()
-        cpu_info = self._collect_cpu_data()
-        values = len(self._columns_definition.split(",")) * "?,"
-        with contextlib.closing(sqlite3.connect(DB_PATH)) as conn:
-            with conn as cur:
-                sql = f"""
-                    INSERT INTO cpu_usage (Current_Frequency, {self._column_names}, Total_Cpu_Usage, Sys_ID) 
-                    VALUES (?, {', '.join(['?'] * len(cpu_info))}, ?, ?)
-                """
-                values = (
-                    f"{self._cpu_freq.current:.2f}Mhz",
-                    *cpu_info.values(),
-                    f"{psutil.cpu_percent()}%",
-                    self._sys_id,
-                )
-                cur.execute(sql, values)
-                conn.commit()
+    def cpu_usage(self, snapshot: Snapshot):
+        cores = self._collect_cpu_data()
+        cpu_freq = self._psutil.cpu_freq()
+        self.readings["cpu"] = self._psutil.cpu_percent()
+        snapshot.add(
+            "cpu_usage",
+            ("Current_Frequency", "Total_Cpu_Usage", *RUN_COLUMNS),
+            (
+                cpu_freq.current if cpu_freq else 0.0,
+                self.readings["cpu"],
+                *self._run,
+            ),
+        )
+        # One row of parameters however many cores, after the summary row
+        snapshot.add_sql(
+            Schema.INSERT_CPU_CORES,
+            (json.dumps(cores), self._run[0], self._run[2]),
+        )
 
-    def ram_usage(self):
-        self._create_ram_usage()
-        with contextlib.closing(sqlite3.connect(DB_PATH)) as conn:
-            with conn as cur:
-                cur.execute(
-                    """
-                INSERT INTO ram_usage (Free , Used , Percentage ,
-                Swap_Free , Swap_Used , Swap_Percentage , Sys_ID) VALUES 
-                (?, ?, ?, ?, ?, ?, ?)""",
-                    (
-                        f"{self.get_size(self._svem.available)}",
-                        f"{self.get_size(self._svem.used)}",
-                        f"{self._svem.percent}%",
-                        f"{self.get_size(self._swap.free)}",
-                        f"{self.get_size(self._swap.used)}",
-                        f"{self._swap.percent}%",
-                        self._sys_id,
-                    ),
-                )
-                conn.commit()
+    def ram_usage(self, snapshot: Snapshot):
+        # Read when the row is added, not when the collector was built
+        svem = self._psutil.virtual_memory()
+        swap = self._psutil.swap_memory()
+        self.readings["memory"] = svem.percent
+        snapshot.add(
+            "ram_usage",
+            (
+                "Free",
+                "Used",
+                "Percentage",
+                "Swap_Free",
+                "Swap_Used",
+                "Swap_Percentage",
+                *RUN_COLUMNS,
+            ),
+            (
+                svem.available,
+                svem.used,
+                svem.percent,
+                swap.free,
+                swap.used,
+                swap.percent,
+                *self._run,
+            ),
+        )
 
     def _collect_disk_data(self):
+        partitions = self._psutil.disk_partitions()
+        finished = self._mount_scheduler.run(
+            {
+                partition.mountpoint: (
+                    lambda mountpoint=partition.mountpoint: self._psutil.disk_usage(
+                        mountpoint
+                    ),
+                    self.MOUNT_TIMEOUT,
+                )
+                for partition in partitions
+            }
+        )
         disk_data = []
-        partitions = psutil.disk_partitions()
         for partition in partitions:
-            disk_dict = {}
-            disk_dict["device"] = partition.device
-            disk_dict["mountpoint"] = partition.mountpoint
-            disk_dict["filesystem"] = partition.fstype
-            try:
-                usage = psutil.disk_usage(partition.mountpoint)
-            except PermissionError:
+            call = finished.get(partition.mountpoint)
+            # Hung, unreadable or gone since disk_partitions(), skip the mount
+            if call is None or call.error is not None:
                 continue
-            disk_dict["total"] = self.get_size(usage.total)
-            disk_dict["used"] = self.get_size(usage.used)
-            disk_dict["free"] = self.get_size(usage.free)
-            disk_dict["percent"] = f"{usage.percent}%"
-            disk_data.append(disk_dict)
+            usage = call.result
+            disk_data.append(
+                {
+                    "device": partition.device,
+                    "mountpoint": partition.mountpoint,
+                    "filesystem": partition.fstype,
+                    "total": usage.total,
+                    "used": usage.used,
+                    "free": usage.free,
+                    "percent": usage.percent,
+                }
+            )
         return disk_data
 
-    def disk_usage(self):
-        self._create_disk_usage()
-        disk_datas = self._collect_disk_data()
-        for disk_data in disk_datas:
-            with contextlib.closing(sqlite3.connect(DB_PATH)) as conn:
-                with conn as cur:
-                    sql = """
-                    INSERT INTO disk_usage (Device , Mount_Point, 
-                    File_System_Type, Total_Size , Used,
-                    Free , Percentage, Sys_ID ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
-                    values = (*disk_data.values(), self._sys_id)
-                    cur.execute(sql, values)
-                    conn.commit()
+    def disk_usage(self, snapshot: Snapshot):
+        disk_data = self._collect_disk_data()
+        if disk_data:
+            self.readings["disk"] = max(disk["percent"] for disk in disk_data)
+        snapshot.extend(
+            "disk_usage",
+            (
+                "Device",
+                "Mount_Point",
+                "File_System_Type",
+                "Total_Size",
+                "Used",
+                "Free",
+                "Percentage",
+                *RUN_COLUMNS,
+            ),
+            ((*disk.values(), *self._run) for disk in disk_data),
+        )
 
-    def total_disk_usage(self):
-        self._create_total_disk_usage()
-        disk_io = psutil.disk_io_counters()
-        boot_time_timestamp = psutil.boot_time()
-        bt = datetime.fromtimestamp(boot_time_timestamp)
-        boot_time = f"{bt.year}/{bt.month}/{bt.day} {bt.hour}:{bt.minute}:{bt.second}"
-        with contextlib.closing(sqlite3.connect(DB_PATH)) as conn:
-            with conn as cur:
-                exists = cur.execute(
-                    "SELECT 1 FROM total_disk_usage WHERE Boot_Time = ?", (boot_time,)
-                ).fetchone()
-                if not exists:
-                    cur.execute(
-                        """INSERT INTO total_disk_usage (Total_Read, 
-                    Total_Write, Boot_Time, Sys_ID) VALUES (?, ?, ?, ?)""",
-                        (
-                            self.get_size(disk_io.read_bytes),
-                            self.get_size(disk_io.write_bytes),
-                            boot_time,
-                            self._sys_id,
-                        ),
-                    )
-                    conn.commit()
+    def total_disk_usage(self, snapshot: Snapshot):
+        disk_io = self._psutil.disk_io_counters()
+        boot_time = self._facts["boot_time"]
+        # Only one row per boot, checked inside the write transaction
+        snapshot.add_sql(
+            """INSERT INTO total_disk_usage (Total_Read, Total_Write, Boot_Time,
+            Snapshot_ID, Extracted_Time, Sys_ID)
+            SELECT ?, ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM total_disk_usage
+            WHERE Sys_ID = ? AND Boot_Time = ?)""",
+            (
+                disk_io.read_bytes,
+                disk_io.write_bytes,
+                boot_time,
+                *self._run,
+                self._sys_id,
+                boot_time,
+            ),
+        )
+
+    def network_usage(self, snapshot: Snapshot):
+        # System-wide counters, per process network stats are not available
+        net_io = self._psutil.net_io_counters(pernic=False)
+        snapshot.add(
+            "network_usage",
+            ("Bytes_Sent", "Bytes_Received", *RUN_COLUMNS),
+            (net_io.bytes_sent, net_io.bytes_recv, *self._run),
+        )
 
-    def task_manager(self):
-        self._create_task_manager()
-        for proc in psutil.process_iter(attrs=["pid", "name"]):
-            try:
-                # Fetch process info
-                process_name = proc.info["name"]
-                process_id = proc.info["pid"]
-                process = psutil.Process(process_id)
+    def task_manager(self, snapshot: Snapshot):
+        # Only processes that appeared, exited or changed are written, the
+        # task_manager view fills in every snapshot in between
+        self._process_tracker.add(
+            snapshot, self._process_sampler.sample(), self._run
+        )
 
-                # CPU usage percentage
-                cpu_usage = process.cpu_percent(interval=0.1)
+    def load_process_state(self, conn):
+        """Continue the change-only process rows already in the database"""
+        self._process_tracker.load(conn)
 
-                # Memory (RAM) usage in bytes and percentage
-                mem_info = process.memory_info()
-                mem_usage = mem_info.rss  # Resident Set Size (physical memory)
-                mem_usage_percent = process.memory_percent()
+    def _probe(self, name: str, snapshot: Snapshot):
+        probe = getattr(
+            self,
+            "insert_system_information" if name == "system_information" else name,
+        )
+        with self.profiler.span(name):
+            probe(snapshot)
 
-                # Disk usage (Read/Write)
-                disk_usage = self._get_process_disk_usage().get(process_name, 0)
+    def collect(self, snapshot: Snapshot = None) -> Snapshot:
+        """Run every probe and return the rows they produced, nothing is written yet"""
+        if snapshot is None:
+            snapshot = Snapshot()
+        # Every row of this run shares one snapshot id, increasing with time
+        if self._clock is None:
+            snapshot_id = time.time_ns() // 1000
+        else:
+            snapshot_id = int(self._clock() * 1000000)
+        self._run = (snapshot_id, snapshot_id // 1000000, self._sys_id)
+        self.profiler.snapshot_id = snapshot_id
+        self.readings = {}
+        span = self.profiler.span
+        with span("collect"):
+            snapshot.add_run(self._run)
+            probes = [
+                name
+                for name in self.PROBES
+                if name != "system_information"
+                or not self._system_information_recorded
+            ]
+            # Each probe fills its own snapshot, merged below in PROBES order
+            parts = {name: Snapshot() for name in probes}
+            finished = self._probe_scheduler.run(
+                {
+                    name: (
+                        lambda name=name: self._probe(name, parts[name]),
+                        self.PROBES[name],
+                    )
+                    for name in probes
+                }
+            )
+            # A probe that failed is skipped like one that timed out, the
+            # rows of the others are still written
+            failed = [
+                name for name, call in finished.items() if call.error is not None
+            ]
+            succeeded = [
+                name for name in probes if name in finished and name not in failed
+            ]
+            for name in succeeded:
+                snapshot.merge(parts[name])
+            if "system_information" in succeeded:
+                self._system_information_recorded = self._resident
+            # A timed out or failed task_manager run is dropped, the next one
+            # diffs against the rows actually written before it
+            if "task_manager" in succeeded:
+                self._process_tracker.commit()
+        for name in self._probe_scheduler.timed_out:
+            self.profiler.record(f"{name}_timeout", self.PROBES[name] * 1000)
+        # Still hung from an earlier run, so not started at all
+        for name in self._probe_scheduler.skipped:
+            self.profiler.record(f"{name}_skipped", 0.0)
+        for name in failed:
+            print(f"{name}: {finished[name].error}", file=sys.stderr)
+            self.profiler.record(f"{name}_error", 0.0)
+        self.record_metrics(snapshot)
+        return snapshot
 
-                # Network usage (Sent/Received) - system-wide stats
-                # Individual process network stats are not available
-                net_io = psutil.net_io_counters(pernic=False)
-                bytes_sent = net_io.bytes_sent
-                bytes_received = net_io.bytes_recv
+    def record_metrics(self, snapshot: Snapshot) -> Snapshot:
+        """Add the pending spans to the snapshot as collector_metrics rows"""
+        snapshot.extend("collector_metrics", METRIC_COLUMNS, self.profiler.drain())
+        return snapshot
 
-                with contextlib.closing(sqlite3.connect(DB_PATH)) as conn:
-                    with conn as cur:
-                        cur.execute(
-                            """INSERT INTO task_manager (
-                        Process_Name, PID, CPU_Usage, Memory_Usage,
-                        Memory_Percentage, Disk_Usage, 
-                        Network_Sent, Network_Received, Sys_ID)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                            (
-                                process_name,
-                                process_id,
-                                f"{cpu_usage}%",
-                                f"{mem_usage / (1024 ** 2):.2f} MB%",
-                                f"{mem_usage_percent:.2f}%",
-                                f"{disk_usage} bytes",
-                                f"{bytes_sent / (1024 ** 2):.2f} MB",
-                                f"{bytes_received / (1024 ** 2):.2f} MB",
-                                self._sys_id,
-                            ),
-                        )
-                        conn.commit()
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                # Skip processes that no longer exist or cannot be accessed
-                continue
+
+def collect(
+    daemon: bool = False,
+    interval: float = 10.0,
+    flush_every: int = 6,
+    profile: bool = False,
+    spool: str = "",
+    adaptive: bool = False,
+    busy_threshold: str = "",
+    idle_threshold: str = "",
+):
+    """
+    Collect one snapshot, or keep sampling every --interval seconds with
+    --daemon. --profile prints how long each stage of every run took,
+    --spool also appends every snapshot to that spool directory and
+    --adaptive samples faster while the host is busy and slower while idle,
+    --busy-threshold and --idle-threshold (like cpu=70,disk=95) move the
+    percentages it switches at
+    """
+    if adaptive and not daemon:
+        raise ValueError("--adaptive only applies with --daemon")
+    if (busy_threshold or idle_threshold) and not adaptive:
+        raise ValueError(
+            "--busy-threshold and --idle-threshold only apply with --adaptive"
+        )
+    spool_writer = Spool_Writer(spool) if spool else None
+    if not daemon:
+        collector = Information_Collector()
+        with Snapshot_Writer(DB_PATH, spool=spool_writer) as writer:
+            collector.load_process_state(writer.connection())
+            snapshot = collector.collect()
+            with collector.profiler.span("write"):
+                writer.write(snapshot)
+            with collector.profiler.span("retention"):
+                Retention(writer.connection()).apply()
+            if profile:
+                print(collector.profiler.report(), file=sys.stderr)
+            writer.write(collector.record_metrics(Snapshot()))
+        return
+    Collector_Daemon(
+        Information_Collector(resident=True),
+        DB_PATH,
+        interval=interval,
+        flush_every=flush_every,
+        spool=spool_writer,
+        policy=(
+            Sampling_Policy(
+                interval,
+                busy_thresholds=Sampling_Policy.thresholds(
+                    busy_threshold, Sampling_Policy.BUSY_THRESHOLDS
+                ),
+                idle_thresholds=Sampling_Policy.thresholds(
+                    idle_threshold, Sampling_Policy.IDLE_THRESHOLDS
+                ),
+            )
+            if adaptive
+            else None
+        ),
+        profile=profile,
+    ).run()
 
 
 if __name__ == "__main__":
-    # Creating the instance of the Information Collector class
-    j = Information_Collector()
-    # Extraction all the system information
-    j.insert_system_information()
-    # Extracting Cpu Usage
-    j.cpu_usage()
-    # Extracting Ram Usage
-    j.ram_usage()
-    # Extracting Disk Usage
-    j.disk_usage()
-    # Extracting the total disk usage
-    j.total_disk_usage()
-    # Extracting all the process and usage
-    j.task_manager()
+    typer.run(collect)